@@ -1,4 +1,5 @@
 import os
+import glob
 import dash
 import json
 import datetime
@@ -21,6 +22,7 @@ GRAPH_METRICS = [
     ("load_factor_graph", "load_factor", "Load Factor", "Load Factor vs. Processed Items"),
     ("avg_query_time_graph", "avg_query_time", "Average Query Time (seconds)", "Avg Query Time vs. Processed Items"),
     ("memory_usage_graph", "memory_usage", "Memory Usage (bytes)", "Memory Usage vs. Processed Items"),
+    ("snapshot_time_graph", "snapshot_time", "Snapshot Time (seconds)", "Snapshot Time vs. Processed Items"),
 ]
 
 PERCENTILE_GRAPHS = [
@@ -33,7 +35,13 @@ ALGORITHMS = ["CountMinSketch",
               "ConservativeCountMinSketch",
               "CountMeanMinSketch",
               "CountSketch",
-              "SlidingCountMinSketch"]
+              "SlidingCountMinSketch",
+              "ExpCountMinSketch",
+              "ForwardDecayCountMinSketch",
+              "DyadicCountMinSketch"]
+
+# Algorithms that count integers only.
+INTEGER_ALGORITHMS = ("DyadicCountMinSketch",)
 
 
 app.layout = html.Div([
@@ -61,6 +69,10 @@ app.layout = html.Div([
         html.Label("Depth"),
         dcc.Input(id='depth-input', type='number', value=5, min=1),
         html.Br(),
+
+        html.Label("Memory Budget (bytes, replaces width and depth)"),
+        dcc.Input(id='budget-input', type='number', min=1),
+        html.Br(),
         html.Br(),
 
         html.Label("Select a Dataset"),
@@ -128,7 +140,7 @@ def generate_line_graph(x, y, name, ylabel, title):
 
 def generate_metric_graph(results, metric, ylabel, title):
     x = [entry["processed_items"] for entry in results]
-    y = [entry[metric] for entry in results]
+    y = [entry.get(metric, 0.0) for entry in results]
     return generate_line_graph(x, y, metric, ylabel, title)
 
 
@@ -152,11 +164,96 @@ def generate_percentile_graph(results, category):
     return fig
 
 
-def get_result_path(algorithm, dataset, width, depth, timestamp):
-    dir_path = f"../experiments/{dataset}/{algorithm}/w{width}_d{depth}/{timestamp}/results.json"
+def generate_row_occupancy_graph(results):
+    entries = [entry for entry in results if "row_occupancy" in entry]
+    x = [entry["processed_items"] for entry in entries]
+    depth = len(entries[-1]["row_occupancy"]) if entries else 0
+
+    fig = go.Figure()
+    for row in range(depth):
+        y = [entry["row_occupancy"][row] for entry in entries]
+        fig.add_trace(go.Scatter(x=x, y=y, mode='lines+markers', name=f"Row {row}"))
+
+    fig.update_layout(
+        title="Row Occupancy Over Time",
+        xaxis_title="Number of Processed Items",
+        yaxis_title="Fraction of Non-Zero Counters",
+        template="plotly_dark",
+        height=400
+    )
+    return fig
+
+
+def generate_distinct_count_graph(results):
+    entries = [entry for entry in results if "distinct" in entry]
+    x = [entry["processed_items"] for entry in entries]
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=x, y=[entry["distinct"]["distinct_estimate"] for entry in entries],
+                             mode='lines+markers', name="HyperLogLog Estimate"))
+    exact = [entry for entry in entries if "distinct_count" in entry["distinct"]]
+    if exact:
+        fig.add_trace(go.Scatter(x=[entry["processed_items"] for entry in exact],
+                                 y=[entry["distinct"]["distinct_count"] for entry in exact],
+                                 mode='lines', name="Exact"))
+
+    fig.update_layout(
+        title="Distinct Items Over Time",
+        xaxis_title="Number of Processed Items",
+        yaxis_title="Distinct Items",
+        template="plotly_dark",
+        height=400
+    )
+    return fig
+
+
+def generate_stream_rate_graph(results):
+    entries = [entry for entry in results if "stream" in entry]
+    x = [entry["processed_items"] for entry in entries]
+
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=x, y=[entry["stream"]["achieved_rate"] for entry in entries],
+                             mode='lines+markers', name="Achieved Rate"))
+    targets = [entry for entry in entries if "target_rate" in entry["stream"]]
+    if targets:
+        fig.add_trace(go.Scatter(x=[entry["processed_items"] for entry in targets],
+                                 y=[entry["stream"]["target_rate"] for entry in targets],
+                                 mode='lines', name="Target Rate"))
+    fig.add_trace(go.Scatter(x=x, y=[entry["stream"]["lag"] for entry in entries],
+                             mode='lines', name="Lag (seconds)", yaxis="y2"))
+
+    fig.update_layout(
+        title="Stream Rate Over Time",
+        xaxis_title="Number of Processed Items",
+        yaxis_title="Items per Second",
+        yaxis2=dict(title="Lag (seconds)", overlaying="y", side="right"),
+        template="plotly_dark",
+        height=400
+    )
+    return fig
+
+
+def get_result_path(algorithm, dataset, width, depth, timestamp, budget=None):
+    # With a memory budget the simulation picks width and depth, so the path is a pattern
+    shape = "w*_d*" if budget else f"w{width}_d{depth}"
+    dir_path = f"../experiments/{dataset}/{algorithm}/{shape}/{timestamp}/results.json"
     return dir_path
 
 
+def stream_args(algorithm, dataset):
+    """
+    Sketches of integers only read the text datasets as integer token IDs.
+    """
+    if algorithm in INTEGER_ALGORITHMS and dataset != "synthetic":
+        return ["--cache-keys", "ids"]
+    return []
+
+
+def resolve_result_path(path):
+    matches = glob.glob(path)
+    return matches[0] if matches else path
+
+
 @app.callback(
     Output('interval-component', 'disabled'),
     Output('latest-results-store', 'data'),
@@ -167,9 +264,10 @@ def get_result_path(algorithm, dataset, width, depth, timestamp):
     State('dataset-dropdown', 'value'),
     State('width-input', 'value'),
     State('depth-input', 'value'),
+    State('budget-input', 'value'),
     prevent_initial_call='initial_duplicate'
 )
-def run_experiment(n_clicks, algo1, algo2, dataset, width, depth):
+def run_experiment(n_clicks, algo1, algo2, dataset, width, depth, budget):
     if n_clicks == 0:
         raise dash.exceptions.PreventUpdate
 
@@ -177,25 +275,26 @@ def run_experiment(n_clicks, algo1, algo2, dataset, width, depth):
     timestamp1 = now.strftime("%Y-%m-%d_%H-%M-%S")
     timestamp2 = (now + datetime.timedelta(seconds=1)).strftime("%Y-%m-%d_%H-%M-%S") if algo1 == algo2 else timestamp1
 
+    size_args = ["--memory-budget", str(budget)] if budget else ["--width", str(width), "--depth", str(depth)]
     proc1 = subprocess.Popen([
         "python3", "../simulation/simulation.py",
         "--algorithm", algo1,
         "--dataset", dataset,
-        "--width", str(width),
-        "--depth", str(depth),
+        *size_args,
+        *stream_args(algo1, dataset),
         "--timestamp", timestamp1
     ])
     proc2 = subprocess.Popen([
         "python3", "../simulation/simulation.py",
         "--algorithm", algo2,
         "--dataset", dataset,
-        "--width", str(width),
-        "--depth", str(depth),
+        *size_args,
+        *stream_args(algo2, dataset),
         "--timestamp", timestamp2
     ])
 
-    results1 = get_result_path(algo1, dataset, width, depth, timestamp1)
-    results2 = get_result_path(algo2, dataset, width, depth, timestamp2)
+    results1 = get_result_path(algo1, dataset, width, depth, timestamp1, budget)
+    results2 = get_result_path(algo2, dataset, width, depth, timestamp2, budget)
 
     return False, {
         algo1: {"path": results1, "pid": proc1.pid},
@@ -214,7 +313,7 @@ def update_graphs(n_intervals, results_paths):
 
     data = {}
     for label, info in results_paths.items():
-        path = info["path"] if isinstance(info, dict) else info
+        path = resolve_result_path(info["path"] if isinstance(info, dict) else info)
         if os.path.exists(path):
             loaded = load_results(path)
             if loaded:
@@ -250,6 +349,42 @@ def update_graphs(n_intervals, results_paths):
                 ))
         children.append(html.Div(row))
 
+    # Graphs for per-row occupancy
+    row = []
+    for label in results_paths:
+        if label in data:
+            fig = generate_row_occupancy_graph(data[label])
+            fig.update_layout(title=f"Row Occupancy [{label}]")
+            row.append(html.Div(
+                dcc.Graph(id=f"row_occupancy_graph-{label}", figure=fig),
+                style={"width": "50%", "display": "inline-block"}
+            ))
+    children.append(html.Div(row))
+
+    # Graphs for the distinct-count estimate, when the sketches track one
+    row = []
+    for label in results_paths:
+        if label in data and any("distinct" in entry for entry in data[label]):
+            fig = generate_distinct_count_graph(data[label])
+            fig.update_layout(title=f"Distinct Items [{label}]")
+            row.append(html.Div(
+                dcc.Graph(id=f"distinct_count_graph-{label}", figure=fig),
+                style={"width": "50%", "display": "inline-block"}
+            ))
+    children.append(html.Div(row))
+
+    # Graphs for the achieved stream rate and the lag behind the target rate
+    row = []
+    for label in results_paths:
+        if label in data and any("stream" in entry for entry in data[label]):
+            fig = generate_stream_rate_graph(data[label])
+            fig.update_layout(title=f"Stream Rate [{label}]")
+            row.append(html.Div(
+                dcc.Graph(id=f"stream_rate_graph-{label}", figure=fig),
+                style={"width": "50%", "display": "inline-block"}
+            ))
+    children.append(html.Div(row))
+
     return children
 
 
@@ -13,7 +13,33 @@ import numpy as np
 import heapq
 
 
-def evaluate_accuracy(cms, ground_truth):
+def evaluate_top_k(predicted, ground_truth, k):
+    """
+    Compares the top-k candidates reported by a sketch with the true top k.
+
+    Items tied with the k-th largest true count all belong to the true top k.
+
+    Args:
+        predicted: List of (item, estimate) pairs reported by the sketch.
+        ground_truth: A dictionary with ground truth counts.
+        k: Number of heavy hitters requested.
+
+    Returns:
+        A dictionary with 'top_k_precision' (share of reported items that are true heavy
+        hitters) and 'top_k_recall' (share of the k heavy hitters that were reported).
+    """
+    k = min(k, len(ground_truth))
+    if not predicted or not k:
+        return {'top_k_precision': 0.0, 'top_k_recall': 0.0}
+    threshold = heapq.nlargest(k, ground_truth.values())[-1]
+    hits = sum(1 for item, _ in predicted if ground_truth.get(item, 0) >= threshold)
+    return {
+        'top_k_precision': hits / len(predicted),
+        'top_k_recall': min(hits, k) / k,
+    }
+
+
+def evaluate_accuracy(cms, ground_truth, top_k=None):
     """
     Evaluates the accuracy of a given Count-Min Sketch instance.
 
@@ -21,8 +47,10 @@ def evaluate_accuracy(cms, ground_truth):
     Pass a copied CMS and ground_truth instances instead of the live ones.
 
     Args:
-        cms: A CountMinSketch instance.
+        cms: A CountMinSketch instance. Items are queried in one batch through `query_many`.
         ground_truth: A dictionary with ground truth counts.
+        top_k: If set, the sketch's `get_top_k()` candidates are also scored against the
+            true top k (see `evaluate_top_k`).
 
     Returns:
         A dictionary containing the following:
@@ -32,6 +60,7 @@ def evaluate_accuracy(cms, ground_truth):
             - 'overestimation_percentage': Overestimation percentage
             - 'percentiles': Dict with error percentiles (50th, 90th, 95th, 100th)
             - 'overestimated_items': List of (item, error), sorted by error desc
+            - 'top_k_precision', 'top_k_recall': Only when `top_k` is set
     """
     if not cms or not ground_truth:
         return "\nNo data to evaluate"
@@ -47,8 +76,10 @@ def evaluate_accuracy(cms, ground_truth):
     underestimations = []
     correct_count = 0
 
-    for item in test_items:
-        error = cms[item] - ground_truth[item]
+    estimates = np.asarray(cms.query_many(test_items)).tolist()
+
+    for item, estimate in zip(test_items, estimates):
+        error = estimate - ground_truth[item]
         errors.append(error)
 
         if error == 0:
@@ -102,7 +133,7 @@ def evaluate_accuracy(cms, ground_truth):
             "100th": np.percentile(abs_combined, 100)
         }
 
-    return {
+    accuracy = {
         'overestimation_percentage': overestimation_percentage,
         'underestimation_percentage': underestimation_percentage,
         'exact_match_percentage': exact_match_percentage,
@@ -115,6 +146,9 @@ def evaluate_accuracy(cms, ground_truth):
         'top_20_overestimations': top_20_overestimations,
         'top_20_underestimations': top_20_underestimations
     }
+    if top_k:
+        accuracy.update(evaluate_top_k(cms.get_top_k(), ground_truth, top_k))
+    return accuracy
 
 
 def print_accuracy_evaluation(accuracy):
@@ -154,6 +188,10 @@ def print_accuracy_evaluation(accuracy):
         for percentile, value in combined_percentiles.items():
             print(f"{percentile}: {value:.2f}")
 
+    if 'top_k_precision' in accuracy:
+        print(f"\nTop-k Precision: {accuracy['top_k_precision'] * 100:.2f}%")
+        print(f"Top-k Recall: {accuracy['top_k_recall'] * 100:.2f}%")
+
     print("\nTop Overestimations:")
     for item, error in overestimations[:10]:
         print(f"{item}: +{error}")
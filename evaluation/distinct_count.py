@@ -0,0 +1,44 @@
+"""
+distinct_count.py
+
+This module evaluates the distinct-count estimate of a sketch created with
+`distinct_precision` (see summarization_algorithms/hyperloglog.py).
+
+Usage:
+    - Pass the sketch and, when it is known, the true number of distinct items
+      (e.g. len(ground_truth) for a whole-stream ground truth).
+"""
+
+
+def evaluate_distinct_count(cms, true_count=None):
+    """
+    Evaluates the distinct-count estimate of a sketch.
+
+    Args:
+        cms: A sketch, with or without a distinct-count estimator.
+        true_count: The exact number of distinct items, or None when it is not tracked.
+
+    Returns:
+        A dictionary containing the following, or None if the sketch does not count distinct items:
+            - 'distinct_estimate': Estimated number of distinct items
+            - 'distinct_memory_usage': Bytes held by the estimator
+            - 'distinct_count': Exact number of distinct items (only with `true_count`)
+            - 'distinct_relative_error': |estimate - true| / true (only with `true_count`)
+    """
+    if cms.distinct is None:
+        return None
+    estimate = cms.distinct_count()
+    result = {
+        'distinct_estimate': estimate,
+        'distinct_memory_usage': cms.distinct.get_memory_usage(),
+    }
+    if true_count is not None:
+        result['distinct_count'] = true_count
+        result['distinct_relative_error'] = abs(estimate - true_count) / true_count if true_count else 0.0
+    return result
+
+
+def print_distinct_count_evaluation(distinct):
+    print(f"Distinct Count Estimate: {distinct['distinct_estimate']:.1f}")
+    if 'distinct_relative_error' in distinct:
+        print(f"Distinct Count Relative Error: {distinct['distinct_relative_error'] * 100:.3f}%")
@@ -1,5 +1,5 @@
 def evaluate_memory_usage(cms):
-    return cms.counters.nbytes
+    return cms.get_memory_usage()
 
 
 def print_memory_usage(total_size):
@@ -0,0 +1,72 @@
+"""
+range_queries.py
+
+This module evaluates the range queries of a sketch that supports them
+(DyadicCountMinSketch) against the exact counts of an integer stream.
+
+Usage:
+    - Pass a sketch with a `range_query(low, high)` method and a dictionary of
+      ground truth counts keyed by integer values.
+"""
+import numbers
+import random
+import time
+import numpy as np
+
+
+def evaluate_range_queries(cms, ground_truth, num_queries=200, seed=0):
+    """
+    Evaluates the accuracy and latency of random range queries.
+
+    Query bounds are drawn from the values present in the ground truth, so ranges cover
+    both the dense head and the sparse tail of the distribution. A ground truth with keys
+    that are not integers raises ValueError.
+
+    Args:
+        cms: A sketch with a `range_query(low, high)` method.
+        ground_truth: A dictionary with ground truth counts keyed by integer values.
+        num_queries: Number of random ranges to query.
+        seed: Seed of the random range generator.
+
+    Returns:
+        A dictionary containing the following, or None if there is nothing to evaluate:
+            - 'range_avg_error': Average absolute error of the range counts
+            - 'range_avg_error_percentage': Average error relative to the true range count
+            - 'range_max_error': Largest absolute error
+            - 'range_avg_query_time': Average time of one range query in seconds
+    """
+    if not ground_truth or not hasattr(cms, "range_query"):
+        return None
+    if not all(isinstance(value, numbers.Integral) for value in ground_truth):
+        raise ValueError("Range queries need a ground truth keyed by integers; "
+                         "stream text datasets with cache_keys=\"ids\".")
+
+    values = np.array(sorted(ground_truth), dtype=np.int64)
+    prefix = np.concatenate(([0], np.cumsum([ground_truth[v] for v in values.tolist()])))
+    rng = random.Random(seed)
+    ranges = [sorted((rng.choice(values.tolist()), rng.choice(values.tolist()))) for _ in range(num_queries)]
+
+    start_time = time.perf_counter()
+    estimates = [cms.range_query(low, high) for low, high in ranges]
+    avg_query_time = (time.perf_counter() - start_time) / num_queries
+
+    errors = []
+    error_percentages = []
+    for (low, high), estimate in zip(ranges, estimates):
+        true_count = prefix[np.searchsorted(values, high, side="right")] - prefix[np.searchsorted(values, low)]
+        errors.append(abs(estimate - true_count))
+        error_percentages.append(abs(estimate - true_count) / true_count * 100)
+
+    return {
+        'range_avg_error': sum(errors) / num_queries,
+        'range_avg_error_percentage': sum(error_percentages) / num_queries,
+        'range_max_error': max(errors),
+        'range_avg_query_time': avg_query_time,
+    }
+
+
+def print_range_query_evaluation(range_accuracy):
+    print(f"Range Query Average Error: {range_accuracy['range_avg_error']:.3f}")
+    print(f"Range Query Average Error Percentage: {range_accuracy['range_avg_error_percentage']:.2f}%")
+    print(f"Range Query Max Error: {range_accuracy['range_max_error']}")
+    print(f"Average range query time: {range_accuracy['range_avg_query_time']:.12f} seconds")
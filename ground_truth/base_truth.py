@@ -1,4 +1,5 @@
 import abc
+import numpy as np
 
 
 class BaseTruth(abc.ABC):
@@ -6,6 +7,14 @@ class BaseTruth(abc.ABC):
     def add(self, item):
         pass
 
+    def add_many(self, items):
+        """
+        Add a batch of items in stream order. numpy arrays are added as Python objects,
+        so their items count as the same keys as in `add`.
+        """
+        for item in (items.tolist() if isinstance(items, np.ndarray) else items):
+            self.add(item)
+
     @abc.abstractmethod
     def get_all(self):
         pass
@@ -0,0 +1,50 @@
+import math
+from ground_truth.base_truth import BaseTruth
+
+# Renormalize before any weight exceeds e^RENORMALIZE_EXPONENT, as ForwardDecayCountMinSketch does.
+RENORMALIZE_EXPONENT = 256.0
+PRUNE_BELOW = 1e-12
+
+
+class DecayedTruth(BaseTruth):
+    """
+    Exact exponentially decayed counts: the k-th arrival happens at time k and an arrival
+    at time t counts exp(-ln(2) * (T - t) / half_life) at time T. Uses the same forward
+    decay as ForwardDecayCountMinSketch, so each add costs O(1).
+    """
+    def __init__(self, half_life=10000, min_count=1.0):
+        self.half_life = half_life
+        self.min_count = min_count
+        self.decay_rate = math.log(2) / half_life
+        self.time = 0
+        self.landmark = 0
+        self.weights = {}
+
+    def _renormalize(self):
+        # Items that have decayed to nothing are dropped so the dict does not grow without bound.
+        scale = math.exp(-self.decay_rate * (self.time - self.landmark))
+        self.weights = {item: weight * scale for item, weight in self.weights.items() if weight * scale > PRUNE_BELOW}
+        self.landmark = self.time
+
+    def add(self, item):
+        self.time += 1
+        if self.decay_rate * (self.time - self.landmark) > RENORMALIZE_EXPONENT:
+            self._renormalize()
+        self.weights[item] = self.weights.get(item, 0.0) + math.exp(self.decay_rate * (self.time - self.landmark))
+
+    def _scale(self):
+        return math.exp(-self.decay_rate * (self.time - self.landmark))
+
+    def query(self, item):
+        return self.weights.get(item, 0.0) * self._scale()
+
+    def get_top_k(self, k):
+        return sorted(self.get_all().items(), key=lambda x: -x[1])[:k]
+
+    def get_all(self):
+        """
+        Return the decayed counts of the items whose count is at least `min_count`; items
+        that have decayed below it are left out of the evaluation.
+        """
+        scale = self._scale()
+        return {item: weight * scale for item, weight in self.weights.items() if weight * scale >= self.min_count}
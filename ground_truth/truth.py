@@ -1,3 +1,5 @@
+from collections import Counter
+import numpy as np
 from ground_truth.base_truth import BaseTruth
 
 
@@ -8,6 +10,17 @@ class Truth(BaseTruth):
     def add(self, item):
         self.counts[item] = self.counts.get(item, 0) + 1
 
+    def add_many(self, items):
+        if isinstance(items, np.ndarray) and items.dtype != object:
+            values, counts = np.unique(items, return_counts=True)
+            self.merge(dict(zip(values.tolist(), counts.tolist())))
+        else:
+            self.merge(Counter(items.tolist() if isinstance(items, np.ndarray) else items))
+
+    def merge(self, counts):
+        for item, count in counts.items():
+            self.counts[item] = self.counts.get(item, 0) + count
+
     def query(self, item):
         return self.counts.get(item, 0)
 
@@ -0,0 +1,350 @@
+"""
+async_stream_simulator.py
+Live stream source: newline-delimited tokens from sockets, a FIFO or stdin, read with asyncio.
+
+Sources (the `source` argument):
+    - "tcp://host:port": TCP server; any number of producers may connect at once.
+      Port 0 picks a free port, available in `address` once the source has started.
+    - "unix:///path/to/socket": Unix domain socket server, same as TCP.
+    - "fifo:///path/to/fifo": named pipe. Any number of writers may share it; the stream
+      ends when the last writer closes it.
+    - "stdin" (or "-"): standard input; the stream ends at EOF.
+
+The event loop runs in a background thread. Every connection reads large blocks, splits
+them into tokens at the bytes level (whitespace-separated, like the .txt datasets; a
+token is never split across blocks) and queues them in micro-batches of up to
+`micro_batch_size` tokens. The queue holds at most `max_buffered_items` tokens; when it
+is full the source either
+    - "block"s: the connection stops reading until there is room, so the socket or pipe
+      fills and the producers are slowed down (backpressure), or
+    - "drop"s the micro-batch and counts its tokens as dropped.
+
+`simulate_batches` and `simulate_stream` hand the queued micro-batches to the sketch as
+they arrive. `stream_stats` reports what was received, delivered, dropped and blocked,
+and the ingest lag: the time between a micro-batch being read and being handed over.
+
+Usage:
+    source = AsyncStreamSimulator("tcp://127.0.0.1:9999")
+    for batch in source.simulate_batches():
+        cms.add_many(batch)
+    # from another thread, or a signal handler: source.stop()
+"""
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+from input_stream.stream_simulator_base import StreamSimulator, object_array
+
+OVERFLOW_POLICIES = ("block", "drop")
+READ_SIZE = 1 << 16
+# Longest run of bytes without whitespace kept waiting for the end of its token.
+MAX_TOKEN_LENGTH = 1 << 20
+
+
+def parse_source(source):
+    """
+    Return (kind, target) for a source string: ("tcp", (host, port)), ("unix", path),
+    ("fifo", path) or ("stdin", None).
+    """
+    if source in ("stdin", "-"):
+        return "stdin", None
+    parts = urlsplit(source)
+    if parts.scheme == "tcp":
+        if parts.port is None:
+            raise ValueError(f"TCP sources need a port: {source}")
+        return "tcp", (parts.hostname or "127.0.0.1", parts.port)
+    if parts.scheme in ("unix", "fifo"):
+        path = parts.netloc + parts.path
+        if not path:
+            raise ValueError(f"{parts.scheme} sources need a path: {source}")
+        return parts.scheme, path
+    raise ValueError(f"Unknown stream source: {source}")
+
+
+class AsyncStreamSimulator(StreamSimulator):
+    """
+    Stream source reading newline-delimited tokens from a TCP or Unix domain socket,
+    a FIFO or stdin, with bounded buffering.
+    """
+    def __init__(self, source, max_buffered_items=1 << 16, overflow="block", micro_batch_size=1024,
+                 drain_timeout=5.0, **kwargs):
+        """
+        Args:
+            source: Where to read from (see the module docstring).
+            max_buffered_items: Tokens that may wait in the queue for the consumer.
+            overflow: What a connection does when the queue is full: "block" or "drop".
+            micro_batch_size: Largest number of tokens queued, and handed over, at once.
+            drain_timeout: Seconds `stop` waits for open connections to close before
+                cancelling them.
+        """
+        kwargs.setdefault("max_throughput", True)
+        super().__init__(micro_batch_size=micro_batch_size, **kwargs)
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        if max_buffered_items < 1:
+            raise ValueError("max_buffered_items must be positive.")
+        self.source = source
+        self.kind, self.address = parse_source(source)
+        self.max_buffered_items = max_buffered_items
+        self.overflow = overflow
+        self.drain_timeout = drain_timeout
+        self._thread = None
+        self._loop = None
+        self._ready = threading.Event()
+        self._error = None
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.connections = 0
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.blocked_time = 0.0
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._total_lag = 0.0
+        self._lagged_batches = 0
+
+    # --- event loop thread ------------------------------------------------------------
+
+    def start(self):
+        """
+        Start listening (or reading) in a background thread. Called by the first
+        `simulate_*` call; call it directly to learn the bound `address` first.
+        """
+        if self._thread is not None:
+            return
+        self._reset_counters()
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name=f"stream-source-{self.kind}", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            error, self._error = self._error, None
+            self._thread.join()
+            self._thread = None
+            raise error
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._serve())
+        except asyncio.CancelledError:
+            pass
+        except Exception as error:
+            self._error = error
+        finally:
+            self._ready.set()
+            self._loop.close()
+
+    async def _serve(self):
+        self._queue = asyncio.Queue(maxsize=max(1, math.ceil(self.max_buffered_items / self.micro_batch_size)))
+        self._stopping = asyncio.Event()
+        self._handlers = set()
+        self._main = asyncio.current_task()
+        server = None
+        if self.kind == "tcp":
+            server = await asyncio.start_server(self._handle_connection, *self.address, limit=READ_SIZE)
+            self.address = server.sockets[0].getsockname()[:2]
+        elif self.kind == "unix":
+            server = await asyncio.start_unix_server(self._handle_connection, self.address, limit=READ_SIZE)
+        else:
+            self._handlers.add(asyncio.create_task(self._read_pipe()))
+        self._ready.set()
+
+        try:
+            if server is not None:
+                await self._stopping.wait()
+                server.close()
+                if self._handlers:
+                    _, pending = await asyncio.wait(self._handlers, timeout=self.drain_timeout)
+                    for task in pending:
+                        task.cancel()
+                await server.wait_closed()
+            else:
+                stop = asyncio.create_task(self._stopping.wait())
+                await asyncio.wait(self._handlers | {stop}, return_when=asyncio.FIRST_COMPLETED)
+                for task in self._handlers | {stop}:
+                    task.cancel()
+        except Exception as error:
+            self._error = error
+        finally:
+            if self.kind == "unix" and os.path.exists(self.address):
+                os.unlink(self.address)
+        # Keep the loop running until the consumer has taken everything, end marker included.
+        await self._queue.put(None)
+        await self._queue.join()
+
+    async def _handle_connection(self, reader, writer):
+        self.connections += 1
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            await self._read_tokens(reader)
+        except ConnectionError:
+            pass  # a producer that goes away only ends its own connection
+        finally:
+            writer.close()
+
+    async def _read_pipe(self):
+        try:
+            await self._read_pipe_tokens()
+        except Exception as error:
+            self._error = error
+
+    async def _read_pipe_tokens(self):
+        loop = asyncio.get_running_loop()
+        if self.kind == "stdin":
+            pipe = sys.stdin.buffer
+        else:
+            # Opening a FIFO blocks until a writer opens it.
+            pipe = await loop.run_in_executor(None, open, self.address, "rb", 0)
+        reader = asyncio.StreamReader(limit=READ_SIZE)
+        transport, _ = await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+        self.connections += 1
+        try:
+            await self._read_tokens(reader)
+        finally:
+            transport.close()
+
+    async def _read_tokens(self, reader):
+        carry = b""
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                break
+            arrival = time.perf_counter()
+            data = carry + data
+            cut = max(data.rfind(b"\n"), data.rfind(b" ")) + 1
+            if cut == 0 and len(data) > MAX_TOKEN_LENGTH:
+                cut = len(data)
+            carry = data[cut:]
+            await self._put_tokens(data[:cut].split(), arrival)
+        await self._put_tokens(carry.split(), time.perf_counter())
+
+    async def _put_tokens(self, tokens, arrival):
+        for start in range(0, len(tokens), self.micro_batch_size):
+            batch = tokens[start:start + self.micro_batch_size]
+            self.received += len(batch)
+            if not self._queue.full():
+                self._queue.put_nowait((arrival, batch))
+            elif self.overflow == "drop":
+                self.dropped += len(batch)
+            else:
+                self.blocked += 1
+                blocked_at = time.perf_counter()
+                await self._queue.put((arrival, batch))
+                self.blocked_time += time.perf_counter() - blocked_at
+
+    # --- consumer side ----------------------------------------------------------------
+
+    def stop(self):
+        """
+        Stop accepting connections; producers not yet accepted are refused. The stream
+        ends once the open connections close (or after `drain_timeout`) and the queue is
+        empty. Pipes and stdin stop reading at once.
+        """
+        if self._loop is not None and not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._stopping.set)
+            except RuntimeError:
+                pass
+        if self.kind == "fifo":
+            self._release_fifo_open()
+
+    def _release_fifo_open(self):
+        # A reader still blocked in open() is released by opening the FIFO for writing.
+        try:
+            os.close(os.open(self.address, os.O_WRONLY | os.O_NONBLOCK))
+        except OSError:
+            pass
+
+    def close(self):
+        """
+        Stop the source without draining: open connections are cancelled.
+        """
+        if self._thread is None:
+            return
+        if not self._loop.is_closed():
+            try:
+                self._loop.call_soon_threadsafe(self._main.cancel)
+            except RuntimeError:
+                pass
+        if self.kind == "fifo":
+            self._release_fifo_open()
+        self._thread.join()
+        self._thread = None
+
+    async def _get(self):
+        item = await self._queue.get()
+        self._queue.task_done()
+        return item
+
+    def _next_batch(self):
+        """
+        Wait for the next micro-batch. Returns its tokens, or None at the end of the stream.
+        """
+        item = asyncio.run_coroutine_threadsafe(self._get(), self._loop).result()
+        if item is None:
+            return None
+        arrival, tokens = item
+        self.lag = time.perf_counter() - arrival
+        self.max_lag = max(self.max_lag, self.lag)
+        self._total_lag += self.lag
+        self._lagged_batches += 1
+        self.delivered += len(tokens)
+        return tokens
+
+    def _batches(self):
+        self.start()
+        try:
+            while True:
+                tokens = self._next_batch()
+                if tokens is None:
+                    break
+                yield tokens
+        finally:
+            self.close()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def simulate_batches(self, batch_size=None):
+        """
+        Yield object arrays of bytes tokens as micro-batches arrive, split to at most
+        `batch_size` tokens. The stream ends after `stop`, or at the end of a pipe.
+        """
+        batch_size = batch_size or self.micro_batch_size
+        for tokens in self._pace_batches(self._batches()):
+            for start in range(0, len(tokens), batch_size):
+                yield object_array(tokens[start:start + batch_size])
+
+    def simulate_stream(self):
+        # Tokens are handed over as their micro-batch arrives, not regrouped, so a quiet
+        # stream is not held back waiting for a full micro-batch.
+        for tokens in self._pace_batches(self._batches()):
+            yield from tokens
+
+    def stream_stats(self):
+        """
+        Return the rate counters of the base class together with the ingest counters:
+        connections, tokens received, delivered and dropped, how many micro-batches
+        blocked on a full queue and for how long, and the last, max and mean ingest lag.
+        """
+        stats = super().stream_stats()
+        stats.update({
+            "connections": self.connections,
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+            "blocked_time": self.blocked_time,
+            "lag": self.lag,
+            "max_lag": self.max_lag,
+            "mean_lag": self._total_lag / self._lagged_batches if self._lagged_batches else 0.0,
+        })
+        return stats
@@ -0,0 +1,182 @@
+"""
+dataset_cache.py
+Dictionary-encoded cache of a tokenized dataset, for repeat experiments.
+
+Tokenizing FIFA.csv or uchoice-Kosarak.txt is the same work on every run. This module
+does it once: every distinct token gets a dense integer ID, in order of first appearance,
+and the dataset is stored as
+    - <name>.<key>.ids.npy: the token-ID stream (uint32), opened with mmap on load;
+    - <name>.<key>.vocab: the tokens, one per line, line i holding the token of ID i;
+    - <name>.<key>.json: how the cache was built. It is written last, so a cache
+      without it is incomplete and is ignored.
+The files go to a ".cache" directory next to the dataset. The key hashes the absolute
+path of the dataset, its mtime and size, the field, the tokenizer and TOKENIZER_VERSION,
+so editing the dataset or changing how it is tokenized gives a new cache. Every file is
+written under a unique temporary name and moved into place with os.replace, so builds of
+the same cache running at the same time do not interfere: the last one to finish wins.
+
+Tokens are split on whitespace, so they never contain a newline and the vocabulary is a
+plain newline-separated file. Tokens of the "mmap" tokenizer are bytes and are stored as
+they are; str tokens are stored in UTF-8.
+
+Usage:
+    python -m input_stream.dataset_cache ../datasets/FIFA.csv --field Tweet
+    cache = load_dataset_cache("../datasets/FIFA.csv", "Tweet", "csv")  # None when not built
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+
+# Bump when the tokenizers change what they yield, so existing caches are rebuilt.
+TOKENIZER_VERSION = 1
+
+CACHE_DIR_NAME = ".cache"
+ID_DTYPE = np.uint32
+BUILD_CHUNK = 1 << 20
+
+
+class DatasetCache:
+    """
+    A dictionary-encoded dataset: the token-ID stream and the vocabulary.
+    """
+    def __init__(self, ids, vocabulary, metadata):
+        self.ids = ids
+        self.vocabulary = vocabulary
+        self.metadata = metadata
+
+    def __len__(self):
+        return len(self.ids)
+
+    def tokens(self, ids):
+        """
+        Return the tokens of an array of IDs as an object array.
+        """
+        return self.vocabulary[ids]
+
+
+def cache_key(dataset_path, field_name, tokenizer):
+    """
+    Return the key of the cache of a dataset read with `tokenizer` ("csv", "mmap" or "lines").
+    """
+    stat = os.stat(dataset_path)
+    description = json.dumps([os.path.abspath(dataset_path), stat.st_mtime_ns, stat.st_size,
+                              field_name or "", tokenizer, TOKENIZER_VERSION])
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_paths(dataset_path, field_name, tokenizer, cache_dir=None):
+    """
+    Return the paths of the ID stream, the vocabulary and the metadata of the cache.
+    """
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(dataset_path)), CACHE_DIR_NAME)
+    prefix = os.path.join(cache_dir, f"{os.path.basename(dataset_path)}.{cache_key(dataset_path, field_name, tokenizer)}")
+    return prefix + ".ids.npy", prefix + ".vocab", prefix + ".json"
+
+
+def load_dataset_cache(dataset_path, field_name, tokenizer, cache_dir=None):
+    """
+    Return the DatasetCache of a dataset, or None when it has not been built for the
+    current file, field and tokenizer.
+    """
+    ids_path, vocabulary_path, metadata_path = cache_paths(dataset_path, field_name, tokenizer, cache_dir)
+    if not os.path.exists(metadata_path):
+        return None
+    with open(metadata_path, "r") as f:
+        metadata = json.load(f)
+    with open(vocabulary_path, "rb") as f:
+        lines = f.read().split(b"\n")[:metadata["vocabulary_size"]]
+    vocabulary = np.empty(len(lines), dtype=object)
+    vocabulary[:] = lines if metadata["token_type"] == "bytes" else [line.decode("utf-8") for line in lines]
+    return DatasetCache(np.load(ids_path, mmap_mode="r"), vocabulary, metadata)
+
+
+def _temp_path(path):
+    """
+    Create an empty file with a unique name next to `path` and return its name.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".",
+                                     suffix=".tmp")
+    os.close(fd)
+    os.chmod(temp_path, 0o644)  # mkstemp creates files readable by the owner only
+    return temp_path
+
+
+def build_dataset_cache(dataset_path, field_name, tokens, tokenizer, cache_dir=None):
+    """
+    Encode the iterable of `tokens` read from a dataset and write its cache. Returns the
+    DatasetCache. The ID stream is written in chunks, so memory holds the vocabulary and
+    one chunk of IDs.
+    """
+    ids_path, vocabulary_path, metadata_path = cache_paths(dataset_path, field_name, tokenizer, cache_dir)
+    os.makedirs(os.path.dirname(ids_path), exist_ok=True)
+    raw_path, ids_part, vocabulary_part, metadata_part = temp_paths = [
+        _temp_path(path) for path in (ids_path, ids_path, vocabulary_path, metadata_path)]
+    try:
+        vocabulary = {}
+        length = 0
+        with open(raw_path, "wb") as raw:
+            chunk = []
+            for token in tokens:
+                chunk.append(vocabulary.setdefault(token, len(vocabulary)))
+                if len(chunk) == BUILD_CHUNK:
+                    np.array(chunk, dtype=np.int64).astype(ID_DTYPE).tofile(raw)
+                    length += len(chunk)
+                    chunk = []
+            np.array(chunk, dtype=np.int64).astype(ID_DTYPE).tofile(raw)
+            length += len(chunk)
+        token_type = "bytes" if vocabulary and isinstance(next(iter(vocabulary)), bytes) else "str"
+        if len(vocabulary) > np.iinfo(ID_DTYPE).max:
+            raise ValueError(f"{dataset_path} has too many distinct tokens for {np.dtype(ID_DTYPE)} IDs.")
+
+        # Prepend the .npy header to the raw IDs, copying one chunk at a time.
+        ids = np.lib.format.open_memmap(ids_part, mode="w+", dtype=ID_DTYPE, shape=(length,))
+        if length:
+            raw = np.memmap(raw_path, dtype=ID_DTYPE, mode="r", shape=(length,))
+            for start in range(0, length, BUILD_CHUNK):
+                ids[start:start + BUILD_CHUNK] = raw[start:start + BUILD_CHUNK]
+            del raw
+        ids.flush()
+        del ids
+
+        with open(vocabulary_part, "wb") as f:
+            f.write(b"\n".join(token if token_type == "bytes" else token.encode("utf-8") for token in vocabulary))
+        metadata = {
+            "dataset_path": os.path.abspath(dataset_path),
+            "field": field_name,
+            "tokenizer": tokenizer,
+            "tokenizer_version": TOKENIZER_VERSION,
+            "token_type": token_type,
+            "length": length,
+            "vocabulary_size": len(vocabulary),
+        }
+        with open(metadata_part, "w") as f:
+            json.dump(metadata, f, indent=4)
+        # The metadata goes last: a cache is complete once its metadata is in place.
+        os.replace(ids_part, ids_path)
+        os.replace(vocabulary_part, vocabulary_path)
+        os.replace(metadata_part, metadata_path)
+    finally:
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return load_dataset_cache(dataset_path, field_name, tokenizer, cache_dir)
+
+
+if __name__ == '__main__':
+    from input_stream.dataset_stream_simulator import DatasetStreamSimulator
+
+    parser = argparse.ArgumentParser(description="Build the dictionary-encoded cache of a dataset.")
+    parser.add_argument('dataset', help='Path of the .csv or .txt dataset')
+    parser.add_argument('--field', help='CSV field holding the text')
+    parser.add_argument('--txt-tokenizer', default="mmap", help='Tokenizer of .txt datasets (mmap or lines)')
+    parser.add_argument('--cache-dir', help='Directory of the cache files')
+    args = parser.parse_args()
+
+    simulator = DatasetStreamSimulator(args.dataset, args.field, txt_tokenizer=args.txt_tokenizer,
+                                       cache_dir=args.cache_dir)
+    cache = simulator.build_cache()
+    print(f"Cached {len(cache)} tokens, {len(cache.vocabulary)} distinct, "
+          f"in {cache_paths(args.dataset, args.field, simulator.tokenizer_name, args.cache_dir)[0]}")
@@ -1,20 +1,76 @@
 import csv
 import os
-import time
-from input_stream.stream_simulator_base import StreamSimulator
+import numpy as np
+from input_stream.dataset_cache import build_dataset_cache, load_dataset_cache
+from input_stream.mmap_tokenizer import iter_token_chunks, iter_tokens
+from input_stream.stream_simulator_base import StreamSimulator, chunked, object_array
+
+TXT_TOKENIZERS = ("mmap", "lines")
+CACHE_KEYS = ("tokens", "ids")
 
 
 class DatasetStreamSimulator(StreamSimulator):
     """
-    Simulates a real-time data stream from a CSV dataset.
+    Simulates a real-time data stream from a CSV dataset, or from the whitespace-separated
+    tokens of a .txt dataset.
+
+    .txt datasets are read with `txt_tokenizer`: "mmap" memory-maps the file and yields
+    bytes tokens (see mmap_tokenizer.py); "lines" reads it line by line and yields str tokens.
+
+    With `dataset_cache` the stream is read from the dictionary-encoded cache of the dataset
+    when it has been built (see dataset_cache.py), instead of being parsed again. The cache
+    yields the same tokens, or with `cache_keys="ids"` their integer IDs; asking for IDs
+    builds the cache when it is missing.
     """
-    def __init__(self, dataset_path, field_name, sleep_time=0.01):
-        super().__init__(sleep_time)
+    def __init__(self, dataset_path, field_name, sleep_time=0.01, txt_tokenizer="mmap", dataset_cache=True,
+                 cache_dir=None, cache_keys="tokens", **kwargs):
+        super().__init__(sleep_time, **kwargs)
+        if txt_tokenizer not in TXT_TOKENIZERS:
+            raise ValueError(f"Unknown txt tokenizer: {txt_tokenizer}")
+        if cache_keys not in CACHE_KEYS:
+            raise ValueError(f"Unknown cache keys: {cache_keys}")
         self.dataset_path = dataset_path
         self.field_name = field_name
+        self.txt_tokenizer = txt_tokenizer
+        self.dataset_cache = dataset_cache
+        self.cache_dir = cache_dir
+        self.cache_keys = cache_keys
         self.file_ext = os.path.splitext(dataset_path)[1].lower()
 
-    def simulate_stream(self):
+    @property
+    def tokenizer_name(self):
+        return "csv" if self.file_ext == ".csv" else self.txt_tokenizer
+
+    def build_cache(self):
+        """
+        Tokenize the dataset and write its dictionary-encoded cache. Returns the DatasetCache.
+        """
+        return build_dataset_cache(self.dataset_path, self.field_name, self._tokens(), self.tokenizer_name,
+                                   self.cache_dir)
+
+    def load_cache(self):
+        """
+        Return the DatasetCache of the dataset, or None when it has not been built.
+        """
+        return load_dataset_cache(self.dataset_path, self.field_name, self.tokenizer_name, self.cache_dir)
+
+    def _cache(self):
+        """
+        Return the DatasetCache to read the stream from, or None to parse the dataset.
+        """
+        if not (self.dataset_cache or self.cache_keys == "ids"):
+            return None
+        cache = self.load_cache()
+        if cache is None and self.cache_keys == "ids":
+            cache = self.build_cache()
+        return cache
+
+    def _cached_batches(self, cache, batch_size):
+        for start in range(0, len(cache), batch_size):
+            ids = cache.ids[start:start + batch_size]
+            yield np.asarray(ids, dtype=np.int64) if self.cache_keys == "ids" else cache.tokens(ids)
+
+    def _tokens(self):
         if self.file_ext == ".csv":
             return self._stream_from_csv()
         elif self.file_ext == ".txt":
@@ -22,6 +78,42 @@ class DatasetStreamSimulator(StreamSimulator):
         else:
             raise ValueError(f"Unsupported file type: {self.file_ext}")
 
+    def simulate_stream(self):
+        cache = self._cache()
+        if cache is not None:
+            batches = self._cached_batches(cache, self.micro_batch_size)
+            return self._pace(item for batch in batches for item in batch.tolist())
+        return self._pace(self._tokens())
+
+    def simulate_batches(self, batch_size=None):
+        """
+        Simulate the stream in chunks: object arrays of up to `batch_size` tokens
+        (`micro_batch_size` by default), or int64 arrays of token IDs with `cache_keys="ids"`.
+        """
+        batch_size = batch_size or self.micro_batch_size
+        cache = self._cache()
+        if cache is not None:
+            return self._pace_batches(self._cached_batches(cache, batch_size))
+        if self.file_ext == ".txt" and self.txt_tokenizer == "mmap":
+            return self._pace_batches(self._batches_from_mmap(batch_size))
+        chunks = chunked(self._tokens(), batch_size)
+        return self._pace_batches(object_array(chunk) for chunk in chunks)
+
+    def _batches_from_mmap(self, batch_size):
+        # Each chunk of the file becomes one array, yielded in slices that carry over
+        # between chunks so that every batch but the last holds batch_size tokens.
+        carry = None
+        for tokens in iter_token_chunks(self.dataset_path):
+            tokens = object_array(tokens)
+            if carry is not None:
+                tokens = np.concatenate((carry, tokens))
+            full = len(tokens) - len(tokens) % batch_size
+            for start in range(0, full, batch_size):
+                yield tokens[start:start + batch_size]
+            carry = tokens[full:]
+        if carry is not None and len(carry):
+            yield carry
+
     def _stream_from_csv(self):
         with open(self.dataset_path, "r", encoding="utf-8") as file:
             reader = csv.DictReader(file)
@@ -32,12 +124,13 @@ class DatasetStreamSimulator(StreamSimulator):
                 if data:
                     for word in data.split():
                         yield word
-                        time.sleep(self.sleep_time)
 
     def _stream_from_txt(self):
+        if self.txt_tokenizer == "mmap":
+            yield from iter_tokens(self.dataset_path)
+            return
         with open(self.dataset_path, "r", encoding="utf-8") as file:
             for line in file:
                 tokens = line.strip().split()
                 for token in tokens:
                     yield token
-                    time.sleep(self.sleep_time)
@@ -0,0 +1,62 @@
+"""
+mmap_tokenizer.py
+Whitespace tokenizer for large text datasets that works on bytes.
+
+Reading a file line by line, splitting each line and decoding every token to str builds
+several Python objects per token before the sketch sees it. This tokenizer memory-maps
+the file and splits it at the bytes level, `chunk_size` bytes at a time, so:
+    - tokens are bytes and are never decoded; the hash layer uses bytes as they are
+      (see key_bytes in hash_family.py), so b"123" and "123" hash to the same positions;
+    - memory stays around one chunk whatever the size of the file;
+    - each chunk is split by one call to bytes.split, in C.
+
+Tokens are separated by ASCII whitespace (space, \\t, \\n, \\r, \\v, \\f), which for
+ASCII files is what str.split does. Chunk boundaries are moved forward to the next
+whitespace byte so that no token is cut in two.
+
+Usage:
+    for token in iter_tokens("datasets/uchoice-Kosarak.txt"):
+        ...
+    for tokens in iter_token_chunks(path):   # lists of bytes tokens, one per chunk
+        ...
+"""
+import mmap
+import os
+import re
+
+DEFAULT_CHUNK_SIZE = 1 << 22
+
+_WHITESPACE = re.compile(rb"[ \t\n\r\x0b\x0c]")
+
+
+def iter_token_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the whitespace-separated tokens of the file at `path` as lists of bytes, one list
+    per chunk of about `chunk_size` bytes.
+    """
+    if chunk_size <= 0:
+        raise ValueError("The chunk size must be positive.")
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        size = len(data)
+        start = 0
+        while start < size:
+            end = start + chunk_size
+            if end < size:
+                boundary = _WHITESPACE.search(data, end)
+                end = boundary.start() if boundary else size
+            else:
+                end = size
+            tokens = data[start:end].split()
+            if tokens:
+                yield tokens
+            start = end
+
+
+def iter_tokens(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield the whitespace-separated tokens of the file at `path` one at a time, as bytes.
+    """
+    for tokens in iter_token_chunks(path, chunk_size):
+        yield from tokens
@@ -1,4 +1,3 @@
-import time
 import numpy as np
 from input_stream.stream_simulator_base import StreamSimulator
 
@@ -7,8 +6,8 @@ class RandomStreamSimulator(StreamSimulator):
     """
     Simulates a simple data stream by generating items at a controlled rate.
     """
-    def __init__(self, sleep_time=0.00001, stream_size=500000, zipf_param=1.3):
-        super().__init__(sleep_time)
+    def __init__(self, sleep_time=0.00001, stream_size=500000, zipf_param=1.3, **kwargs):
+        super().__init__(sleep_time, **kwargs)
         self.stream_size = stream_size
         self.zipf_param = zipf_param
 
@@ -19,6 +18,15 @@ class RandomStreamSimulator(StreamSimulator):
             One item at a time from the generated stream.
         """
         data_stream = np.random.zipf(a=self.zipf_param, size=self.stream_size).tolist()
-        for item in data_stream:
-            yield item
-            time.sleep(self.sleep_time)
+        return self._pace(data_stream)
+
+    def simulate_batches(self, batch_size=None):
+        """
+        Simulate the stream in chunks.
+        Yields:
+            int64 arrays of up to `batch_size` items (`micro_batch_size` by default).
+        """
+        batch_size = batch_size or self.micro_batch_size
+        data_stream = np.random.zipf(a=self.zipf_param, size=self.stream_size)
+        return self._pace_batches(data_stream[start:start + batch_size]
+                                  for start in range(0, self.stream_size, batch_size))
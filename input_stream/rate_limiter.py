@@ -0,0 +1,106 @@
+"""
+rate_limiter.py
+Token-bucket pacing of simulated streams.
+
+Sleeping after every item holds a stream to the OS timer granularity (tens of microseconds
+at best), so per-item sleeps of 0.0001 s cap a run at a few thousand items per second no
+matter how cheap the sketch is. A TokenBucket instead releases items in micro-batches: the
+bucket fills at `rate` tokens per second, a micro-batch of n items waits for n tokens, and
+one sleep covers the whole batch.
+
+RateMeter keeps the numbers used to compare runs:
+    - achieved_rate: items released per second since the stream started.
+    - lag: how many seconds the stream is behind the target schedule (items / rate),
+      i.e. how long the consumer has kept the stream from releasing on time.
+"""
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket that refills at `rate` tokens per second up to `capacity` tokens.
+    """
+    def __init__(self, rate, capacity=None, clock=time.perf_counter, sleep=time.sleep):
+        """
+        Args:
+            rate: Tokens (items) per second.
+            capacity: Largest burst released without waiting (defaults to one second of tokens).
+            clock, sleep: Time source and sleep function, replaceable in tests.
+        """
+        if rate <= 0:
+            raise ValueError("The rate must be positive.")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = self.capacity
+        self._last = clock()
+
+    def _refill(self, cap=True):
+        now = self.clock()
+        self.tokens += (now - self._last) * self.rate
+        if cap:
+            self.tokens = min(self.tokens, self.capacity)
+        self._last = now
+
+    def acquire(self, n=1):
+        """
+        Take `n` tokens, sleeping until they are available. Batches larger than the
+        capacity are allowed; they wait for the missing tokens. Returns the time slept.
+        """
+        self._refill()
+        waited = 0.0
+        if self.tokens < n:
+            waited = (n - self.tokens) / self.rate
+            self.sleep(waited)
+            self._refill(cap=False)
+        # A short sleep leaves a small debt that the next batch pays back.
+        self.tokens -= n
+        return waited
+
+
+class RateMeter:
+    """
+    Counts released items and measures the achieved rate and the lag behind `rate`.
+    """
+    def __init__(self, rate=None, clock=time.perf_counter):
+        self.rate = rate
+        self.clock = clock
+        self.start = clock()
+        self.items = 0
+        self.sleep_time = 0.0
+        self.max_lag = 0.0
+
+    def elapsed(self):
+        return self.clock() - self.start
+
+    def lag(self):
+        """
+        Seconds the stream is behind the target schedule (0 without a target rate).
+        """
+        if self.rate is None:
+            return 0.0
+        return max(0.0, self.elapsed() - self.items / self.rate)
+
+    def record(self, n, waited=0.0):
+        """
+        Record the release of `n` items after sleeping `waited` seconds.
+        """
+        self.max_lag = max(self.max_lag, self.lag())
+        self.items += n
+        self.sleep_time += waited
+
+    def stats(self):
+        """
+        Return a dictionary with the stream counters, the achieved rate and the lag.
+        """
+        elapsed = self.elapsed()
+        return {
+            "items": self.items,
+            "elapsed": elapsed,
+            "target_rate": self.rate,
+            "achieved_rate": self.items / elapsed if elapsed > 0 else 0.0,
+            "lag": self.lag(),
+            "max_lag": self.max_lag,
+            "sleep_time": self.sleep_time,
+        }
@@ -1,18 +1,98 @@
 import abc
+import itertools
+import math
+import numpy as np
+from input_stream.rate_limiter import RateMeter, TokenBucket
+
+# Micro-batches are sized so the limiter sleeps about once per PACING_TICK seconds, and a
+# stream may get BURST_TIME seconds ahead of a slow consumer's schedule to catch up.
+PACING_TICK = 0.001
+BURST_TIME = 0.01
+MAX_THROUGHPUT_MICRO_BATCH = 4096
 
 
 class StreamSimulator(abc.ABC):
     """
     Abstract base class for simulating data streams.
     """
-    def __init__(self, sleep_time=0.01):
+    def __init__(self, sleep_time=0.01, rate=None, max_throughput=False, micro_batch_size=None, burst=None):
         """
         Initialize the stream simulator.
 
         Args:
-            sleep_time: Time delay between yielding each item.
+            sleep_time: Target delay between items, i.e. a target rate of 1 / sleep_time items
+                per second (no limit when 0). Ignored when `rate` is given.
+            rate: Target rate in items per second.
+            max_throughput: Release items as fast as they are consumed, without sleeping.
+            micro_batch_size: Items released per wait of the rate limiter (by default about
+                one millisecond of items at the target rate).
+            burst: Items the limiter may release at once to catch up after a slow consumer
+                (defaults to BURST_TIME seconds of items).
         """
         self.sleep_time = sleep_time
+        if max_throughput:
+            rate = None
+        elif rate is None and sleep_time:
+            rate = 1 / sleep_time
+        if rate is not None and rate <= 0:
+            raise ValueError("The stream rate must be positive.")
+        self.rate = rate
+        if micro_batch_size is None:
+            micro_batch_size = math.ceil(rate * PACING_TICK) if rate is not None else MAX_THROUGHPUT_MICRO_BATCH
+        self.micro_batch_size = max(1, int(micro_batch_size))
+        self.burst = burst
+        self.meter = RateMeter(rate)
+
+    @property
+    def max_throughput(self):
+        return self.rate is None
+
+    def _start_pacing(self):
+        """
+        Reset the rate meter and return the token bucket of a new stream (None at max throughput).
+        """
+        self.meter = RateMeter(self.rate)
+        if self.rate is None:
+            return None
+        burst = self.burst or math.ceil(self.rate * BURST_TIME)
+        return TokenBucket(self.rate, max(burst, self.micro_batch_size))
+
+    def _pace_batches(self, batches):
+        """
+        Yield `batches` at the target rate, waiting once per batch.
+        """
+        bucket = self._start_pacing()
+        for batch in batches:
+            if len(batch) == 0:
+                continue
+            waited = bucket.acquire(len(batch)) if bucket is not None else 0.0
+            self.meter.record(len(batch), waited)
+            yield batch
+
+    def _pace(self, items):
+        """
+        Yield `items` one at a time, released in micro-batches at the target rate.
+        """
+        for chunk in self._pace_batches(chunked(items, self.micro_batch_size)):
+            yield from chunk
+
+    def simulate_batches(self, batch_size=None):
+        """
+        Simulate the stream in chunks: yield numpy arrays of up to `batch_size` items
+        (`micro_batch_size` by default), in stream order, at the target rate.
+        This default chunks `simulate_stream` into object arrays; subclasses override it
+        to build the arrays without going through one Python object per item.
+        """
+        for chunk in chunked(self.simulate_stream(), batch_size or self.micro_batch_size):
+            yield object_array(chunk)
+
+    def stream_stats(self):
+        """
+        Return the counters of the current stream: items released, elapsed time, target and
+        achieved rates (items per second), lag behind the target schedule and time slept,
+        in seconds (see rate_limiter.py).
+        """
+        return self.meter.stats()
 
     @abc.abstractmethod
     def simulate_stream(self):
@@ -21,3 +101,24 @@ class StreamSimulator(abc.ABC):
         Should yield one item at a time.
         """
         pass
+
+
+def chunked(items, size):
+    """
+    Yield lists of up to `size` consecutive items.
+    """
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def object_array(items):
+    """
+    Return a one-dimensional object array holding `items` as they are.
+    """
+    array = np.empty(len(items), dtype=object)
+    array[:] = items
+    return array
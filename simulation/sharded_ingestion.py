@@ -0,0 +1,132 @@
+"""
+sharded_ingestion.py
+Multi-process ingestion for mergeable sketches.
+
+Each batch of items is split into one contiguous shard per worker process. Every worker
+keeps its own sketch, built once from the sketch factory, and adds its shards to it
+without replying, so the workers, the parent's exact counts and the stream reader all run
+at the same time. At a checkpoint `sync` collects the worker sketches, merges them into the
+global sketch (counters, totalCount and distinct-count registers) and resets them, so the
+counter arrays cross process boundaries once per worker per checkpoint rather than once
+per shard. At every checkpoint the global sketch holds exactly what a single process would
+have built (approximately so for ConservativeCountMinSketch, whose merge is approximate).
+
+The ground truth is updated in the parent with `add_many` while the workers sketch.
+
+Usage:
+    factory = functools.partial(get_algorithm, "CountMinSketch", 10000, 5)
+    with ShardedIngestor(factory, workers=4) as ingestor:
+        ingestor.ingest(batch, ground_truth)
+        ingestor.sync(cms)  # before reading cms
+"""
+import multiprocessing
+import traceback
+
+_ADD, _COLLECT = "add", "collect"
+
+
+def _worker_main(sketch_factory, connection):
+    """
+    Worker process: add the shards it receives to its sketch and, when asked, send the
+    sketch back and start over. Errors are reported at the next collect.
+    """
+    sketch = sketch_factory()
+    error = None
+    while True:
+        message = connection.recv()
+        if message is None:
+            return
+        kind, items = message
+        if kind == _ADD:
+            if error is None:
+                try:
+                    sketch.add_many(items)
+                except Exception:
+                    error = traceback.format_exc()
+        elif error is not None:
+            connection.send((None, error))
+            error = None
+            sketch.reset()
+        else:
+            connection.send((sketch, None))
+            sketch.reset()
+
+
+class ShardedIngestor:
+    """
+    Spreads batch updates of a mergeable sketch over worker processes.
+    """
+    def __init__(self, sketch_factory, workers=None):
+        """
+        Args:
+            sketch_factory: Picklable callable returning an empty sketch, configured the
+                same way as the sketch that results are merged into.
+            workers: Number of worker processes (defaults to the number of CPUs).
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        sketch = sketch_factory()
+        if not sketch.mergeable:
+            raise ValueError(f"{sketch.__class__.__name__} cannot be merged, "
+                             f"so it cannot be ingested in shards.")
+        self._pending = []  # batches added since the last sync, for the heavy-hitter candidates
+        self._connections = []
+        self._processes = []
+        for _ in range(self.workers):
+            parent_end, child_end = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_worker_main, args=(sketch_factory, child_end), daemon=True)
+            process.start()
+            child_end.close()
+            self._connections.append(parent_end)
+            self._processes.append(process)
+
+    def ingest(self, items, ground_truth):
+        """
+        Send the shards of `items` to the workers and add `items` to `ground_truth`.
+        The global sketch only sees them after the next `sync`.
+        """
+        shard_size = -(-len(items) // self.workers)
+        for connection, start in zip(self._connections, range(0, len(items), shard_size)):
+            connection.send((_ADD, items[start:start + shard_size]))
+        ground_truth.add_many(items)
+        self._pending.append(items)
+
+    def sync(self, cms):
+        """
+        Merge everything ingested since the last sync into `cms`. The heavy-hitter
+        candidates of `cms`, if any, are refreshed once for all those items.
+        """
+        for connection in self._connections:
+            connection.send((_COLLECT, None))
+        errors = []
+        for connection in self._connections:
+            sketch, error = connection.recv()
+            if error is not None:
+                errors.append(error)
+            elif not errors:
+                cms.merge(sketch)
+        if errors:
+            raise RuntimeError(f"A sharded ingestion worker failed:\n{errors[0]}")
+        if cms.heavy_hitters is not None:
+            for items in self._pending:
+                cms.update_heavy_hitters(items)
+        self._pending = []
+
+    def close(self):
+        """
+        Stop the worker processes. Items not yet synced are discarded.
+        """
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -4,15 +4,24 @@ import datetime
 from evaluation.memory_usage import evaluate_memory_usage
 from evaluation.avg_query_time import evaluate_avg_query_time
 from evaluation.accuracy import evaluate_accuracy
+from evaluation.range_queries import evaluate_range_queries
+from evaluation.distinct_count import evaluate_distinct_count
+from ground_truth.decayed_truth import DecayedTruth
 from ground_truth.decaying_truth import DecayingTruth
 from ground_truth.truth import Truth
+from summarization_algorithms.hash_family import get_hash_family
+from summarization_algorithms.kernels import KERNEL_BACKENDS, set_default_kernels
 from visualization.visualization import visualize
-import copy
+import time
 import argparse
+import signal
+import functools
+import itertools
 
 
 def evaluate(cms, ground_truth):
-    accuracy = evaluate_accuracy(cms, ground_truth)
+    top_k = cms.heavy_hitters.capacity if cms.heavy_hitters is not None else None
+    accuracy = evaluate_accuracy(cms, ground_truth, top_k=top_k)
     avg_query_time = evaluate_avg_query_time(cms, ground_truth)
     memory_usage = evaluate_memory_usage(cms)
     load_factor = cms.get_load_factor()
@@ -20,7 +29,9 @@ def evaluate(cms, ground_truth):
     return accuracy, avg_query_time, memory_usage, load_factor
 
 
-def record_metrics(results_file, items_processed, accuracy, avg_query_time, memory_usage, load_factor):
+def record_metrics(results_file, items_processed, accuracy, avg_query_time, memory_usage, load_factor,
+                   cache_stats=None, snapshot_time=0.0, row_occupancy=None, occupancy_histogram=None,
+                   range_accuracy=None, phase=None, distinct=None, stream=None):
     result = {
         "processed_items": int(items_processed),
         "avg_error": float(accuracy["avg_error"]),
@@ -31,6 +42,7 @@ def record_metrics(results_file, items_processed, accuracy, avg_query_time, memo
         "avg_query_time": float(avg_query_time),
         "memory_usage": float(memory_usage),
         "load_factor": float(load_factor),
+        "snapshot_time": float(snapshot_time),
         "percentiles": {
             "overestimation": {
                 "50th": float(accuracy.get("overestimation_percentiles", {}).get("50th", 0.0)),
@@ -52,6 +64,23 @@ def record_metrics(results_file, items_processed, accuracy, avg_query_time, memo
             }
         }
     }
+    if phase is not None:
+        result["phase"] = phase
+    if "top_k_precision" in accuracy:
+        result["top_k_precision"] = float(accuracy["top_k_precision"])
+        result["top_k_recall"] = float(accuracy["top_k_recall"])
+    if stream is not None:
+        result["stream"] = {key: float(value) for key, value in stream.items() if value is not None}
+    if distinct is not None:
+        result["distinct"] = {key: float(value) for key, value in distinct.items()}
+    if range_accuracy is not None:
+        result["range_query"] = {key: float(value) for key, value in range_accuracy.items()}
+    if row_occupancy is not None:
+        result["row_occupancy"] = [float(x) for x in row_occupancy]
+    if occupancy_histogram is not None:
+        result["occupancy_histogram"] = [[int(x) for x in row] for row in occupancy_histogram]
+    if cache_stats:
+        result["cache"] = cache_stats
     try:
         with open(results_file, "r") as f:
             existing_results = json.load(f)
@@ -62,50 +91,177 @@ def record_metrics(results_file, items_processed, accuracy, avg_query_time, memo
         json.dump(existing_results, f, indent=4)
 
 
-def get_algorithm(algorithm, width, depth):
+def get_algorithm(algorithm, width, depth, window_size=None, **kwargs):
     if algorithm == "CountMinSketch":
         from summarization_algorithms.count_min_sketch import CountMinSketch
-        cms = CountMinSketch(width=width, depth=depth)
+        cms = CountMinSketch(width=width, depth=depth, **kwargs)
     elif algorithm == "ConservativeCountMinSketch":
         from summarization_algorithms.conservative_count_min_sketch import ConservativeCountMinSketch
-        cms = ConservativeCountMinSketch(width=width, depth=depth)
+        cms = ConservativeCountMinSketch(width=width, depth=depth, **kwargs)
     elif algorithm == "CountMeanMinSketch":
         from summarization_algorithms.count_mean_min_sketch import CountMeanMinSketch
-        cms = CountMeanMinSketch(width=width, depth=depth)
+        cms = CountMeanMinSketch(width=width, depth=depth, **kwargs)
     elif algorithm == "CountSketch":
         from summarization_algorithms.count_sketch import CountSketch
-        cms = CountSketch(width=width, depth=depth)
+        cms = CountSketch(width=width, depth=depth, **kwargs)
     elif algorithm == "SlidingCountMinSketch":
         from summarization_algorithms.sliding_count_min_sketch import SlidingCountMinSketch
-        cms = SlidingCountMinSketch(width=width, depth=depth)
+        cms = SlidingCountMinSketch(width=width, depth=depth, window_size=window_size, **kwargs)
+    elif algorithm == "ExpCountMinSketch":
+        from summarization_algorithms.exp_count_min_sketch import ExpCountMinSketch
+        kwargs.setdefault("counter_size", 32)
+        cms = ExpCountMinSketch(width=width, depth=depth, window_size=window_size or width * depth, **kwargs)
+    elif algorithm == "ForwardDecayCountMinSketch":
+        from summarization_algorithms.forward_decay_count_min_sketch import ForwardDecayCountMinSketch
+        cms = ForwardDecayCountMinSketch(width=width, depth=depth, half_life=window_size or width * depth, **kwargs)
+    elif algorithm == "DyadicCountMinSketch":
+        from summarization_algorithms.dyadic_count_min_sketch import DyadicCountMinSketch
+        cms = DyadicCountMinSketch(width=width, depth=depth, **kwargs)
     else:
         raise ValueError(f"Unknown algorithm: {algorithm}")
     return cms
 
 
+WINDOWED_ALGORITHMS = ("SlidingCountMinSketch", "ExpCountMinSketch", "ForwardDecayCountMinSketch")
+
+
 def get_truth_class(config):
-    if config["algorithm"] == "SlidingCountMinSketch":
-        return DecayingTruth(window_size=config["width"]*config["depth"])
+    if config["algorithm"] == "ForwardDecayCountMinSketch":
+        return DecayedTruth(half_life=config.get("window_size") or config["width"]*config["depth"])
+    if config["algorithm"] in WINDOWED_ALGORITHMS:
+        return DecayingTruth(window_size=config.get("window_size") or config["width"]*config["depth"])
     return Truth()
 
 
-def get_stream_simulator(config):
+def check_sharded_ingestion(config):
+    """
+    Raise ValueError unless config["algorithm"] can be ingested by several worker processes:
+    the sketch must be mergeable and its ground truth must not be windowed.
+    """
+    from summarization_algorithms.sizing import sketch_class
+    algorithm = config["algorithm"]
+    if algorithm in WINDOWED_ALGORITHMS or not sketch_class(algorithm).mergeable:
+        raise ValueError(f"{algorithm} cannot be merged across shards; run it with workers=1.")
+
+
+def check_integer_stream(config):
+    """
+    Raise ValueError when config["algorithm"] counts integers only (DyadicCountMinSketch)
+    but the stream yields text: only the synthetic stream and datasets read as integer IDs
+    (cache_keys="ids") qualify.
+    """
+    if config["algorithm"] != "DyadicCountMinSketch":
+        return
+    if config.get("stream_source") or (config["dataset_name"] != "synthetic" and config.get("cache_keys") != "ids"):
+        raise ValueError("DyadicCountMinSketch counts integers; use the synthetic stream or "
+                         "read the dataset as integer IDs with --cache-keys ids.")
+
 
+def get_stream_simulator(config):
+    pacing = {
+        "rate": config.get("stream_rate"),
+        "max_throughput": config.get("max_throughput", False),
+        "micro_batch_size": config.get("micro_batch_size"),
+    }
+    if config.get("stream_source"):
+        from input_stream.async_stream_simulator import AsyncStreamSimulator
+        return AsyncStreamSimulator(config["stream_source"], max_buffered_items=config.get("source_buffer", 65536),
+                                    overflow=config.get("source_overflow", "block"))
     if config["dataset_name"] == "synthetic":
         from input_stream.random_stream_simulator import RandomStreamSimulator
-        return RandomStreamSimulator(sleep_time=config["sleep_time"])
+        return RandomStreamSimulator(sleep_time=config["sleep_time"], **pacing)
     else:
         from input_stream.dataset_stream_simulator import DatasetStreamSimulator
         return DatasetStreamSimulator(
             dataset_path=f"../datasets/{config['dataset_name']}",
             field_name=config["field"],
-            sleep_time=config["sleep_time"]
+            sleep_time=config["sleep_time"],
+            txt_tokenizer=config.get("txt_tokenizer", "mmap"),
+            dataset_cache=config.get("dataset_cache", True),
+            cache_keys=config.get("cache_keys", "tokens"),
+            **pacing
         )
 
 
-def eval_and_record(cms, ground_truth, file_path):
-    accuracy, query_speed, memory_usage, load_factor = evaluate(copy.deepcopy(cms), ground_truth.get_all())
-    record_metrics(file_path, cms.totalCount, accuracy, query_speed, memory_usage, load_factor)
+def get_dimensions_for_budget(config, sketch_options):
+    """
+    Return the (width, depth) of config["algorithm"] that fits in config["memory_budget"]
+    bytes with the lowest error on the first items of the stream (see sizing.py). A live
+    source cannot be read twice, so it is calibrated on the synthetic Zipf sample instead.
+    """
+    from summarization_algorithms.sizing import calibrate_dimensions
+    sample = None
+    if not config.get("stream_source"):
+        calibration_stream = get_stream_simulator(dict(config, max_throughput=True)).simulate_stream()
+        sample = list(itertools.islice(calibration_stream, config.get("calibration_sample_size", 5000)))
+        calibration_stream.close()
+    factory = functools.partial(get_algorithm, config["algorithm"], **sketch_options)
+    width, depth, _ = calibrate_dimensions(config["memory_budget"], factory, sample, config.get("stream_length"))
+    return width, depth
+
+
+def ingest_batch(cms, ground_truth, batch, ingestor=None, sync=True):
+    """
+    Add `batch` to the sketch and the ground truth. With a sharded `ingestor` the sketch is
+    only brought up to date when `sync` is True, i.e. before it is evaluated.
+    """
+    if ingestor is not None:
+        ingestor.ingest(batch, ground_truth)
+        if sync:
+            ingestor.sync(cms)
+        return
+    cms.add_many(batch)
+    ground_truth.add_many(batch)
+
+
+def buffer_items(items, size):
+    """
+    Group a stream of single items into lists of `size` items (the last one may be shorter).
+    """
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def split_at_checkpoints(batches, eval_interval):
+    """
+    Split a stream of batches so that checkpoints land exactly every `eval_interval` items.
+    Yields (part, at_checkpoint) where `at_checkpoint` is True when the part ends on a
+    multiple of `eval_interval`.
+    """
+    pending = 0
+    for batch in batches:
+        start = 0
+        while start < len(batch):
+            part = batch[start:start + eval_interval - pending]
+            start += len(part)
+            pending = (pending + len(part)) % eval_interval
+            yield part, pending == 0
+
+
+def save_snapshot(cms, path):
+    tmp_path = path + ".tmp"
+    cms.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def eval_and_record(cms, ground_truth, file_path, stream_stats=None):
+    start_time = time.perf_counter()
+    snapshot = cms.snapshot()
+    snapshot_time = time.perf_counter() - start_time
+    truth = ground_truth.get_all()
+    accuracy, query_speed, memory_usage, load_factor = evaluate(snapshot, truth)
+    # Windowed ground truths only know the distinct items of the window, not of the stream.
+    distinct = evaluate_distinct_count(snapshot, len(truth) if isinstance(ground_truth, Truth) else None)
+    record_metrics(file_path, cms.totalCount, accuracy, query_speed, memory_usage, load_factor,
+                   cache_stats=snapshot.cache_stats(), snapshot_time=snapshot_time,
+                   row_occupancy=snapshot.get_row_occupancy(),
+                   occupancy_histogram=snapshot.get_occupancy_histogram(),
+                   range_accuracy=evaluate_range_queries(snapshot, truth), phase=snapshot.phase,
+                   distinct=distinct, stream=stream_stats)
 
 
 if __name__ == '__main__':
@@ -118,45 +274,160 @@ if __name__ == '__main__':
     parser.add_argument('--width', type=int, help='Width parameter for CMS')
     parser.add_argument('--depth', type=int, help='Depth parameter for CMS')
     parser.add_argument('--timestamp', required=False)
+    parser.add_argument('--hash-family', help='Hash family to use (sha256, double, multiply_shift)')
+    parser.add_argument('--workers', type=int, help='Number of ingestion processes (mergeable sketches only)')
+    parser.add_argument('--window-size', type=int, help='Window length of sliding-window sketches, or half-life of decayed ones')
+    parser.add_argument('--memory-budget', type=int, help='Memory budget in bytes; replaces --width and --depth')
+    parser.add_argument('--rate', type=float, help='Target stream rate in items per second')
+    parser.add_argument('--max-throughput', action='store_true', help='Stream items without rate limiting')
+    parser.add_argument('--batched', action='store_true', help='Feed chunks of the stream to bulk updates')
+    parser.add_argument('--batch-size', type=int, help='Items per chunk in batched mode')
+    parser.add_argument('--build-cache', action='store_true',
+                        help='Build the dictionary-encoded cache of the dataset if it is missing')
+    parser.add_argument('--cache-keys', choices=("tokens", "ids"), help='Stream cached tokens or their integer IDs')
+    parser.add_argument('--source', help='Live source of newline-delimited tokens: tcp://host:port, '
+                                         'unix:///path, fifo:///path or stdin')
+    parser.add_argument('--kernels', choices=("auto",) + KERNEL_BACKENDS, help='Backend of the sketch hot loops')
     args = parser.parse_args()
 
     if args.width is not None:
         CONFIG['width'] = args.width
     if args.depth is not None:
         CONFIG['depth'] = args.depth
+    if args.hash_family is not None:
+        CONFIG['hash_family'] = args.hash_family
+    if args.workers is not None:
+        CONFIG['workers'] = args.workers
+    if args.window_size is not None:
+        CONFIG['window_size'] = args.window_size
+    if args.memory_budget is not None:
+        CONFIG['memory_budget'] = args.memory_budget
+    if args.rate is not None:
+        CONFIG['stream_rate'] = args.rate
+    if args.max_throughput:
+        CONFIG['max_throughput'] = True
+    if args.batched:
+        CONFIG['batched'] = True
+    if args.batch_size is not None:
+        CONFIG['batch_size'] = args.batch_size
+    if args.kernels is not None:
+        CONFIG['kernels'] = args.kernels
+    if args.cache_keys is not None:
+        CONFIG['cache_keys'] = args.cache_keys
+    if args.source is not None:
+        CONFIG['stream_source'] = args.source
+    CONFIG['algorithm'] = args.algorithm
 
     WIDTH = CONFIG["width"]
     DEPTH = CONFIG["depth"]
     ALGORITHM = args.algorithm
     EVAL_INTERVAL = CONFIG["eval_interval"]
     VIS_INTERVAL = CONFIG["vis_interval"]
+    WORKERS = CONFIG.get("workers", 1)
     if args.dataset:
         CONFIG['dataset_name'] = args.dataset
     DATASET_NAME = CONFIG["dataset_name"]
+    if WORKERS > 1:
+        check_sharded_ingestion(CONFIG)
+    check_integer_stream(CONFIG)
 
     stream_simulator = get_stream_simulator(CONFIG)
-    cms = get_algorithm(ALGORITHM, WIDTH, DEPTH)
+    if CONFIG.get("stream_source"):
+        # Ctrl-C ends a live stream cleanly, so the last checkpoint is still recorded.
+        signal.signal(signal.SIGINT, lambda signum, frame: stream_simulator.stop())
+    if args.build_cache and hasattr(stream_simulator, "build_cache") and stream_simulator.load_cache() is None:
+        cache = stream_simulator.build_cache()
+        print(f"Cached {len(cache)} tokens of {DATASET_NAME}, {len(cache.vocabulary)} distinct")
+    set_default_kernels(CONFIG.get("kernels", "auto"))
+    HASH_FAMILY = get_hash_family(CONFIG.get("hash_family", "sha256"), CONFIG.get("hash_seed", 0))
+    SKETCH_OPTIONS = {
+        "hash_family": HASH_FAMILY,
+        "cache_size": CONFIG.get("hash_cache_size", 0),
+        "cache_policy": CONFIG.get("hash_cache_policy", "lru"),
+        "counter_dtype": CONFIG.get("counter_dtype", "int64"),
+        "overflow": CONFIG.get("overflow", "widen"),
+        "window_size": CONFIG.get("window_size"),
+        "distinct_precision": CONFIG.get("distinct_precision", 0),
+        "kernels": CONFIG.get("kernels", "auto"),
+    }
+    if ALGORITHM == "DyadicCountMinSketch":
+        SKETCH_OPTIONS["universe_bits"] = CONFIG.get("universe_bits", 32)
+    if CONFIG.get("memory_budget"):
+        from summarization_algorithms.sizing import counter_dtype_for, sketch_class
+        if CONFIG.get("stream_length"):
+            SKETCH_OPTIONS["counter_dtype"] = counter_dtype_for(CONFIG["stream_length"],
+                                                                signed=sketch_class(ALGORITHM).signed_counters)
+        WIDTH, DEPTH = get_dimensions_for_budget(CONFIG, SKETCH_OPTIONS)
+        CONFIG['width'], CONFIG['depth'] = WIDTH, DEPTH
+        print(f"Memory budget of {CONFIG['memory_budget']} bytes: width={WIDTH}, depth={DEPTH}, "
+              f"counter dtype {SKETCH_OPTIONS['counter_dtype']}")
+    if CONFIG.get("adaptive", False) and ALGORITHM not in WINDOWED_ALGORITHMS:
+        from summarization_algorithms.adaptive_sketch import AdaptiveSketch
+        cms = AdaptiveSketch(WIDTH, DEPTH,
+                             sketch_factory=functools.partial(get_algorithm, ALGORITHM, WIDTH, DEPTH,
+                                                              **dict(SKETCH_OPTIONS, distinct_precision=0),
+                                                              shared_memory=CONFIG.get("shared_memory", False)),
+                             max_distinct=CONFIG.get("adaptive_max_distinct"),
+                             memory_budget=CONFIG.get("adaptive_memory_budget"),
+                             hash_family=HASH_FAMILY, counter_dtype=SKETCH_OPTIONS["counter_dtype"],
+                             top_k=CONFIG.get("top_k", 0), distinct_precision=SKETCH_OPTIONS["distinct_precision"])
+    else:
+        cms = get_algorithm(ALGORITHM, WIDTH, DEPTH, **SKETCH_OPTIONS, shared_memory=CONFIG.get("shared_memory", False),
+                            top_k=CONFIG.get("top_k", 0))
+    if cms.shared_memory_name:
+        print(f"Sketch counters are shared as '{cms.shared_memory_name}'")
     ground_truth = get_truth_class(CONFIG)
 
+    ingestor = None
+    if WORKERS > 1:
+        from simulation.sharded_ingestion import ShardedIngestor
+        ingestor = ShardedIngestor(functools.partial(get_algorithm, ALGORITHM, WIDTH, DEPTH, **SKETCH_OPTIONS),
+                                   workers=WORKERS)
+
     timestamp = args.timestamp or datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     RESULTS_DIR = f"../experiments/{DATASET_NAME}/{ALGORITHM}/w{cms.width}_d{cms.depth}/{timestamp}"
     os.makedirs(RESULTS_DIR, exist_ok=True)
     RESULTS_FILE = os.path.join(RESULTS_DIR, "results.json")
     PLOTS_DIR = RESULTS_DIR
+    SNAPSHOT_FILE = os.path.join(RESULTS_DIR, "sketch.bin") if CONFIG.get("save_snapshots", False) else None
 
     if not os.path.exists(RESULTS_FILE):
         with open(RESULTS_FILE, "w") as f:
             json.dump([], f)
 
-    for item in stream_simulator.simulate_stream():
-        cms.add(item)
-        ground_truth.add(item)
+    if CONFIG.get("batched", False):
+        # Chunks of the stream go straight into the bulk updates, split at the checkpoints.
+        batches = stream_simulator.simulate_batches(CONFIG.get("batch_size"))
+    else:
+        # Items are buffered up to the next checkpoint and inserted with one batch update.
+        batches = buffer_items(stream_simulator.simulate_stream(), EVAL_INTERVAL)
+    processed_before = cms.totalCount
+    for part, at_checkpoint in split_at_checkpoints(batches, EVAL_INTERVAL):
+        ingest_batch(cms, ground_truth, part, ingestor, sync=at_checkpoint)
 
-        if cms.totalCount % EVAL_INTERVAL == 0:
-            eval_and_record(cms, ground_truth, RESULTS_FILE)
+        if at_checkpoint:
+            eval_and_record(cms, ground_truth, RESULTS_FILE, stream_simulator.stream_stats())
+            if SNAPSHOT_FILE:
+                save_snapshot(cms, SNAPSHOT_FILE)
 
-        if cms.totalCount % VIS_INTERVAL == 0:
-            visualize(RESULTS_FILE, PLOTS_DIR)
+            if cms.totalCount // VIS_INTERVAL > processed_before // VIS_INTERVAL:
+                visualize(RESULTS_FILE, PLOTS_DIR)
+            processed_before = cms.totalCount
 
-    eval_and_record(cms, ground_truth, RESULTS_FILE)
+    if ingestor is not None:
+        ingestor.sync(cms)
+        ingestor.close()
+    stream_stats = stream_simulator.stream_stats()
+    eval_and_record(cms, ground_truth, RESULTS_FILE, stream_stats)
+    if SNAPSHOT_FILE:
+        save_snapshot(cms, SNAPSHOT_FILE)
     visualize(RESULTS_FILE, PLOTS_DIR)
+    target = f"{stream_stats['target_rate']:.0f} items/s" if stream_stats["target_rate"] else "max throughput"
+    print(f"Stream: {stream_stats['items']} items in {stream_stats['elapsed']:.2f} s, "
+          f"{stream_stats['achieved_rate']:.0f} items/s (target {target}), "
+          f"lag {stream_stats['lag']:.3f} s (max {stream_stats['max_lag']:.3f} s)")
+    if "dropped" in stream_stats:
+        print(f"Source: {stream_stats['connections']} connections, {stream_stats['received']} items received, "
+              f"{stream_stats['dropped']} dropped, {stream_stats['blocked']} micro-batches blocked "
+              f"for {stream_stats['blocked_time']:.3f} s")
+    cms.close_shared_memory()
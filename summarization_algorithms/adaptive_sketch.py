@@ -0,0 +1,234 @@
+"""
+adaptive_sketch.py
+Exact counting that switches to a sketch once a budget is exceeded.
+
+Short streams and small vocabularies fit in a plain dictionary that uses less memory than
+a full counter array and answers every query exactly. AdaptiveSketch starts in the
+"exact" phase, counting in a dict, and moves to the "sketch" phase once the number of
+distinct keys exceeds `max_distinct` or the estimated size of the dict exceeds
+`memory_budget` (by default the size of the sketch's counter array). The accumulated
+(key, count) pairs are then inserted into the sketch with one `add_many` call.
+
+The wrapped sketch must be mergeable: its state cannot depend on arrival order, since the
+exact phase does not keep it.
+
+Usage:
+    cms = AdaptiveSketch(10000, 5, max_distinct=5000)
+    cms = AdaptiveSketch(10000, 5, sketch_factory=lambda: CountSketch(10000, 5))
+"""
+import copy
+import functools
+import sys
+import numpy as np
+from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
+
+EXACT = "exact"
+SKETCH = "sketch"
+
+_INT_SIZE = sys.getsizeof(1 << 40)
+
+
+class AdaptiveSketch(CountMinSketchBase):
+    """
+    Counts exactly until a distinct-key or memory budget is exceeded, then migrates to a sketch.
+    """
+    mergeable = True
+
+    def __init__(self, width, depth, sketch_factory=None, max_distinct=None, memory_budget=None, **kwargs):
+        """
+        Args:
+            width, depth: Shape of the sketch built at migration.
+            sketch_factory: Callable returning the empty sketch to migrate to. Defaults to a
+                CountMinSketch of this width and depth built with the remaining keyword arguments.
+            max_distinct: Migrate once more distinct keys than this have been seen.
+            memory_budget: Migrate once the exact counts take more bytes than this. Defaults
+                to the size of a width x depth counter array of the configured dtype.
+        Other keyword arguments (hash family, counter dtype, top_k, ...) are passed to the base class.
+        """
+        super().__init__(width, depth, **kwargs)
+        if sketch_factory is None:
+            from summarization_algorithms.count_min_sketch import CountMinSketch
+            options = {key: value for key, value in kwargs.items() if key not in ("top_k", "distinct_precision")}
+            sketch_factory = functools.partial(CountMinSketch, width, depth, **options)
+        self.sketch_factory = sketch_factory
+        self.max_distinct = max_distinct
+        self.memory_budget = memory_budget if memory_budget is not None else width * depth * self.counter_dtype.itemsize
+        self.phase = EXACT
+        self.sketch = None
+        self.exact = {}
+        self._key_bytes = 0
+
+    @property
+    def shared_memory_name(self):
+        return self.sketch.shared_memory_name if self.sketch is not None else None
+
+    def close_shared_memory(self, unlink=True):
+        if self.sketch is not None:
+            self.sketch.close_shared_memory(unlink)
+
+    def _exact_memory(self):
+        """
+        Estimate the bytes held by the exact counts: the dict table, the keys and the counts.
+        """
+        return sys.getsizeof(self.exact) + self._key_bytes + len(self.exact) * _INT_SIZE
+
+    def _over_budget(self):
+        if self.max_distinct is not None and len(self.exact) > self.max_distinct:
+            return True
+        return self._exact_memory() > self.memory_budget
+
+    def _count_exact(self, item, count):
+        if item not in self.exact:
+            self.exact[item] = 0
+            self._key_bytes += sys.getsizeof(item)
+        self.exact[item] += count
+
+    def migrate(self):
+        """
+        Move the exact counts into a new sketch with one batch insert and switch to the sketch phase.
+        """
+        if self.phase == SKETCH:
+            return
+        sketch = self.sketch_factory()
+        if not sketch.mergeable:
+            raise ValueError(f"{sketch.__class__.__name__} depends on arrival order; "
+                             f"AdaptiveSketch can only migrate to mergeable sketches.")
+        if self.exact:
+            sketch.add_many(list(self.exact), list(self.exact.values()))
+        self.sketch = sketch
+        self.phase = SKETCH
+        self.exact = {}
+        self._key_bytes = 0
+
+    def add(self, item, count=1):
+        self.totalCount += count
+        if self.phase == SKETCH:
+            self.sketch.add(item, count)
+        else:
+            self._count_exact(item, count)
+            if self._over_budget():
+                self.migrate()
+        self.update_heavy_hitters((item,))
+        self.update_distinct((item,))
+
+    def add_many(self, items, counts=None):
+        """
+        Add a batch of items. In the exact phase the whole batch is counted before the
+        budget is checked, so a batch migrates at most once.
+        """
+        if self.phase == SKETCH:
+            self.sketch.add_many(items, counts)
+            self.totalCount += int(np.sum(counts)) if counts is not None else len(items)
+        else:
+            counts = self._batch_counts(counts, len(items)).tolist()
+            self.totalCount += sum(counts)
+            for item, count in zip(items, counts):
+                self._count_exact(item, count)
+            if self._over_budget():
+                self.migrate()
+        self.update_heavy_hitters(items)
+        self.update_distinct(items)
+
+    def query(self, item):
+        if self.phase == SKETCH:
+            return self.sketch.query(item)
+        return self.exact.get(item, 0)
+
+    def query_many(self, items):
+        if self.phase == SKETCH:
+            return self.sketch.query_many(items)
+        return np.array([self.exact.get(item, 0) for item in items], dtype=np.int64)
+
+    def reset(self):
+        """
+        Drop all counts and go back to the exact phase.
+        """
+        self.close_shared_memory()
+        self.phase = EXACT
+        self.sketch = None
+        self.exact = {}
+        self._key_bytes = 0
+        self.totalCount = 0
+        if self.heavy_hitters is not None:
+            self.heavy_hitters.reset()
+        if self.distinct is not None:
+            self.distinct.reset()
+
+    def get_load_factor(self):
+        """
+        Return the load factor of the sketch, or 0 while counting exactly.
+        """
+        return self.sketch.get_load_factor() if self.phase == SKETCH else 0.0
+
+    def get_row_occupancy(self):
+        return self.sketch.get_row_occupancy() if self.phase == SKETCH else np.zeros(self.depth)
+
+    def get_occupancy_histogram(self):
+        if self.phase == SKETCH:
+            return self.sketch.get_occupancy_histogram()
+        return np.full((self.depth, 1), self.width, dtype=np.int64)
+
+    def cache_stats(self):
+        return self.sketch.cache_stats() if self.phase == SKETCH else {}
+
+    def get_memory_usage(self):
+        """
+        Return the bytes held by the sketch, or the estimated size of the exact counts.
+        """
+        return self.sketch.get_memory_usage() if self.phase == SKETCH else self._exact_memory()
+
+    def _check_mergeable(self, other):
+        """
+        Another AdaptiveSketch must match this one; any other sketch is checked by the
+        wrapped sketch when it is merged.
+        """
+        if isinstance(other, AdaptiveSketch):
+            super()._check_mergeable(other)
+
+    def _combine_counters(self, other, sign):
+        if isinstance(other, AdaptiveSketch) and other.phase == EXACT:
+            if self.phase == EXACT:
+                for item, count in other.exact.items():
+                    self._count_exact(item, sign * count)
+                if self._over_budget():
+                    self.migrate()
+            else:
+                self.sketch.add_many(list(other.exact), [sign * count for count in other.exact.values()])
+            return
+        self.migrate()
+        other_sketch = other.sketch if isinstance(other, AdaptiveSketch) else other
+        if sign > 0:
+            self.sketch.merge(other_sketch)
+        else:
+            self.sketch.subtract(other_sketch)
+
+    def snapshot(self):
+        """
+        Return a frozen, query-only copy: a copy of the exact counts or a snapshot of the sketch.
+        """
+        snapshot = copy.copy(self)
+        if self.phase == SKETCH:
+            snapshot.sketch = self.sketch.snapshot()
+        else:
+            snapshot.exact = dict(self.exact)
+        snapshot.heavy_hitters = copy.deepcopy(self.heavy_hitters)
+        snapshot.distinct = copy.deepcopy(self.distinct)
+        snapshot._frozen = True
+        return snapshot
+
+    def save(self, path, compression=None):
+        """
+        Save the wrapped sketch. Exact counts have no binary format of their own, so before
+        the migration the sketch they would migrate to is built and saved; this sketch keeps
+        counting exactly.
+        """
+        if self.phase == SKETCH:
+            self.sketch.save(path, compression=compression)
+            return
+        sketch = self.sketch_factory()
+        try:
+            if self.exact:
+                sketch.add_many(list(self.exact), list(self.exact.values()))
+            sketch.save(path, compression=compression)
+        finally:
+            sketch.close_shared_memory()
@@ -4,59 +4,91 @@ Conservative update Count-Min Sketch implementation.
 """
 from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
 import numpy as np
-import hashlib
 
 
 class ConservativeCountMinSketch(CountMinSketchBase):
     """
     Conservative Count-Min Sketch implementation.
+
+    Merging is approximate: the summed counters still never underestimate, but they can be
+    larger than those of a single sketch fed both streams, because conservative update
+    depends on the order of the interleaved stream. Subtraction is not supported.
     """
-    def __init__(self, width, depth):
-        """
-        Initialize sketch with width and depth.
-        """
-        super().__init__(width, depth)
-        self.counters = np.zeros((self.depth, self.width), dtype=int)
+    mergeable = True
 
-    def _hash(self, x):
+    def __init__(self, width, depth, **kwargs):
         """
-        Generate multiple hash values for a given input item using SHA-256
+        Initialize sketch with width and depth.
+        Keyword arguments (hash family, hash cache, counter dtype) are passed to the base class.
         """
-        base = str(x)
-        for i in range(self.depth):
-            h = hashlib.sha256((base + str(i)).encode('utf-8'))
-            yield int(h.hexdigest(), 16) % self.width
+        super().__init__(width, depth, **kwargs)
+        self.counters = self._allocate_counters((self.depth, self.width))
 
     def add(self, item, count=1):
         """
         Add the item with frequency `count` using conservative update.
         Only increment positions that hold the current minimum estimate.
         """
-        indices = list(self._hash(item))
-        current_vals = [self.counters[i][idx] for i, idx in enumerate(indices)]
-        current_min = min(current_vals)
-
-        for i, idx in enumerate(indices):
-            self.counters[i][idx] = max(self.counters[i][idx], current_min + count)
+        position = (np.arange(self.depth), self._hash_update(item))
+        current_vals = self.counters[position].astype(np.int64)
+        with self._write_section():
+            self._store_counters(position, np.maximum(current_vals, current_vals.min() + count))
+            self.totalCount += count
+        self.update_heavy_hitters((item,))
 
-        self.totalCount += count
+    def add_many(self, items, counts=None):
+        """
+        Add a batch of items using conservative update.
+        Hashing is done for the whole batch at once; the updates themselves are applied
+        in stream order because each one depends on the minimum left by the previous ones.
+        """
+        indices = self._hash_many_update(items)
+        counts = self._batch_counts(counts, indices.shape[1])
+        cells = (np.arange(self.depth)[:, None], indices)
+        occupied_before = self._cells_occupied(cells)
+        self._check_writable()
+        with self._write_section():
+            if self.counters.dtype == np.int64:
+                self.kernels.conservative_add(self.counters, indices, counts)
+            else:
+                # Run the updates on int64 and write them back once: capping or widening at the
+                # end gives the same counters as doing it after every item.
+                work = self.counters.astype(np.int64)
+                self.kernels.conservative_add(work, indices, counts)
+                self._write_counters(cells, work[cells])
+            self._update_occupancy(cells, occupied_before)
+            self.totalCount += int(counts.sum())
+        self.update_heavy_hitters(items)
 
     def query(self, item):
         """
         Return an estimation of the amount of times `item` has ocurred.
         The returned value always overestimates the real value.
         """
-        return min(table[i] for table, i in zip(self.counters, self._hash(item)))
+        return int(min(table[i] for table, i in zip(self.counters, self._hash(item))))
+
+    def query_many(self, items):
+        """
+        Return the estimates of a batch of items as a numpy array.
+        """
+        return self.kernels.min_query(self.counters, self._hash_many(items))
+
+    def subtract(self, other):
+        """
+        Not supported: conservative counters are not linear, so the difference could underestimate.
+        """
+        raise NotImplementedError("ConservativeCountMinSketch does not support subtraction.")
 
     def reset(self):
         """
         Reset the sketch by clearing all tables and setting the count to 0.
         """
-        self.totalCount = 0
-        self.counters.fill(0)
+        with self._write_section():
+            self.totalCount = 0
+            self._clear_counters()
 
     def get_load_factor(self):
         """
         Return the load factor: maximum number of non-zero counters in any row, divided by width.
         """
-        return max(sum(1 for cell in row if cell > 0) for row in self.counters) / self.width
+        return int(self._row_nonzero.max()) / self.width
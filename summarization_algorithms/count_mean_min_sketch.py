@@ -4,72 +4,126 @@ Count-Mean-Min Sketch implementation.
 """
 from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
 import numpy as np
-import hashlib
 
 
 class CountMeanMinSketch(CountMinSketchBase):
     """
     Implementation of Count-Mean-Min Sketch, a variation of Count-Min Sketch with noise adjustment.
     """
-    def __init__(self, width, depth):
+    mergeable = True
+
+    def __init__(self, width, depth, **kwargs):
         """
         Initialize sketch with given width and depth.
+        Keyword arguments (hash family, hash cache, counter dtype) are passed to the base class.
         """
-        super().__init__(width, depth)
-        self.counters = np.zeros((self.depth, self.width), dtype=int)
+        super().__init__(width, depth, **kwargs)
+        self.counters = self._allocate_counters((self.depth, self.width))
+        self.row_sums = np.zeros(self.depth, dtype=np.int64)
         self.totalCount = 0
 
-    def _hash(self, x):
+    def add(self, item, count=1):
         """
-        Generate multiple hash values using SHA-256 with added seed for depth variation.
+        Add the element 'item' to the sketch 'count' times.
         """
-        base = str(x)
-        for i in range(self.depth):
-            h = hashlib.sha256((base + str(i)).encode('utf-8'))
-            yield int(h.hexdigest(), 16) % self.width
+        indices = self._hash_update(item)
+        with self._write_section():
+            self._add_to_rows((np.arange(self.depth), indices), count, count, unique=True)
+            self.totalCount += count
+        self.update_heavy_hitters((item,))
 
-    def add(self, item, count=1):
+    def add_many(self, items, counts=None):
         """
-        Add the element 'item' to the sketch 'count' times.
+        Add a batch of items, optionally with per-item counts, in a single vectorized update.
         """
-        self.totalCount += count
-        for row, idx in zip(self.counters, self._hash(item)):
-            row[idx] += count
+        indices = self._hash_many_update(items)
+        counts = self._batch_counts(counts, indices.shape[1])
+        rows = np.arange(self.depth)[:, None]
+        with self._write_section():
+            self._add_to_rows((rows, indices), counts, int(counts.sum()))
+            self.totalCount += int(counts.sum())
+        self.update_heavy_hitters(items)
 
-    def _estimate_error(self, row_idx, col_idx):
+    def _add_to_rows(self, index, delta, row_delta, unique=False):
         """
-        Estimate the average noise in a particular row (excluding target cell).
+        Add `delta` to the counters at `index` and `row_delta` to every row sum.
+        Saturating narrow counters may drop part of an update, so in that case the row sums
+        are updated with the change actually written to the touched cells.
         """
-        row = self.counters[row_idx]
-        target_value = row[col_idx]
-        row_sum = np.sum(row)
-        noise = (row_sum - target_value) / (self.width - 1) if self.width > 1 else 0
-        return noise
+        if self.overflow != "saturate" or self.counters.dtype == np.int64:
+            self._add_to_counters(index, delta, unique=unique)
+            self.row_sums += row_delta
+            return
+        rows, cols = np.broadcast_arrays(*index)
+        cells = np.unique(rows.ravel() * self.width + cols.ravel())
+        before = self.counters.reshape(-1)[cells].astype(np.int64)
+        self._add_to_counters(index, delta, unique=unique)
+        after = self.counters.reshape(-1)[cells].astype(np.int64)
+        np.add.at(self.row_sums, cells // self.width, after - before)
+
+    def _corrected_estimates(self, raw):
+        """
+        Return the Count-Mean-Min estimates for raw counter values of shape (depth, n),
+        using the running row sums: O(depth) per item.
+        """
+        raw = raw.astype(np.int64)
+        noise = (self.row_sums[:, None] - raw) / (self.width - 1) if self.width > 1 else 0
+        estimates = np.median(raw - noise, axis=0)
+        return np.maximum(0, np.minimum(estimates, raw.min(axis=0)))
 
     def query(self, item):
         """
         Return a corrected frequency estimate using the Count-Mean-Min algorithm.
         """
-        estimates = []
-        raw_values = []
+        raw = self.counters[np.arange(self.depth), self._hash(item)]
+        return float(self._corrected_estimates(raw[:, None])[0])
 
-        for i, (row, idx) in enumerate(zip(self.counters, self._hash(item))):
-            raw = row[idx]
-            noise = self._estimate_error(i, idx)
-            estimates.append(raw - noise)
-            raw_values.append(raw)
+    def query_many(self, items):
+        """
+        Return corrected Count-Mean-Min estimates of a batch of items as a numpy array.
+        """
+        indices = self._hash_many(items)
+        rows = np.arange(self.depth)[:, None]
+        return self._corrected_estimates(self.counters[rows, indices])
+
+    def _combine_counters(self, other, sign):
+        super()._combine_counters(other, sign)
+        self._recount_row_sums()
+
+    def _summary_arrays(self):
+        return dict(super()._summary_arrays(), row_sums=self.row_sums)
+
+    def _restore_state(self, arrays, scalars):
+        arrays = dict(arrays)
+        row_sums = arrays.pop("row_sums", None)
+        super()._restore_state(arrays, scalars)
+        if row_sums is None:
+            self._recount_row_sums()
+        else:
+            self.row_sums = np.array(row_sums, dtype=np.int64)
 
-        return max(0, min(np.median(estimates), min(raw_values)))
+    def _recount_row_sums(self):
+        """
+        Recompute the row sums from the whole counter array.
+        """
+        self.row_sums = self.counters.sum(axis=1, dtype=np.int64)
+
+    def snapshot(self):
+        snapshot = super().snapshot()
+        snapshot.row_sums = self.row_sums.copy()
+        return snapshot
 
     def reset(self):
         """
         Reset the sketch to its initial state.
         """
-        self.totalCount = 0
-        self.counters.fill(0)
+        with self._write_section():
+            self.totalCount = 0
+            self._clear_counters()
+            self.row_sums.fill(0)
 
     def get_load_factor(self):
         """
         Return the load factor: maximum number of non-zero counters in any row, divided by width.
         """
-        return max(np.count_nonzero(row) for row in self.counters) / self.width
+        return int(self._row_nonzero.max()) / self.width
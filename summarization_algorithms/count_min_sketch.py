@@ -4,56 +4,70 @@ Regular Count-Min Sketch implementation.
 """
 from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
 import numpy as np
-import hashlib
 
 
 class CountMinSketch(CountMinSketchBase):
     """
     Regular Count-Min Sketch implementation.
     """
-    def __init__(self, width, depth):
+    mergeable = True
+
+    def __init__(self, width, depth, **kwargs):
         """
         Initialize sketch with width and depth.
+        Keyword arguments (hash family, hash cache, counter dtype) are passed to the base class.
         """
-        super().__init__(width, depth)
-        self.counters = np.zeros((self.depth, self.width), dtype=int)
+        super().__init__(width, depth, **kwargs)
+        self.counters = self._allocate_counters((self.depth, self.width))
 
-    def _hash(self, x):
+    def add(self, item, count=1):
         """
-        Generate multiple hash values for a given input item using SHA-256
+        Add the element 'item' as if it had appeared 'count' times
         """
-        base = str(x)
-        for i in range(self.depth):
-            h = hashlib.sha256((base + str(i)).encode('utf-8'))
-            yield int(h.hexdigest(), 16) % self.width
+        indices = self._hash_update(item)
+        with self._write_section():
+            self._add_to_counters((np.arange(self.depth), indices), count, unique=True)
+            self.totalCount += count
+        self.update_heavy_hitters((item,))
 
-    def add(self, item, count=1):
+    def add_many(self, items, counts=None):
         """
-        Add the element 'item' as if it had appeared 'count' times
+        Add a batch of items, optionally with per-item counts, in a single vectorized update.
         """
-        self.totalCount += count
-        for table, i in zip(self.counters, self._hash(item)):
-            table[i] += count
+        indices = self._hash_many_update(items)
+        counts = self._batch_counts(counts, indices.shape[1])
+        rows = np.arange(self.depth)[:, None]
+        with self._write_section():
+            self._add_to_counters((rows, indices), counts)
+            self.totalCount += int(counts.sum())
+        self.update_heavy_hitters(items)
 
     def query(self, item):
         """
         Return an estimation of the amount of times `item` has occurred.
         The returned value always overestimates the real value.
         """
-        return min(table[i] for table, i in zip(self.counters, self._hash(item)))
+        return int(min(table[i] for table, i in zip(self.counters, self._hash(item))))
+
+    def query_many(self, items):
+        """
+        Return the estimates of a batch of items as a numpy array.
+        """
+        return self.kernels.min_query(self.counters, self._hash_many(items))
 
     def reset(self):
         """
         Reset the sketch by clearing all tables and setting the count to 0.
         """
-        self.totalCount = 0
-        self.counters.fill(0)
+        with self._write_section():
+            self.totalCount = 0
+            self._clear_counters()
 
     def get_load_factor(self):
         """
         Return the load factor: maximum number of non-zero counters in any row, divided by width.
         """
-        return max(sum(1 for cell in row if cell > 0) for row in self.counters) / self.width
+        return int(self._row_nonzero.max()) / self.width
 
 
 if __name__ == '__main__':
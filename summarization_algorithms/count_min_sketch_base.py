@@ -6,8 +6,35 @@ This file contains the abstract base class for Count-Min Sketch (CMS) implementa
 
 Subclasses must implement the `add`, `query`, and `reset` methods.
 Subclasses may implement the`__init__` method if additional parameters are needed.
+Subclasses may override `add_many` and `query_many` with vectorized versions.
+Subclasses whose counters can be summed set `mergeable = True` to enable `merge` and `subtract`.
 """
 import abc
+import contextlib
+import copy
+import functools
+import math
+import numpy as np
+from summarization_algorithms.hash_family import SHA256HashFamily, key_bytes
+from summarization_algorithms.hash_cache import make_hash_cache
+from summarization_algorithms.shared_counters import SharedCounters
+from summarization_algorithms.heavy_hitters import TopKTracker
+from summarization_algorithms.hyperloglog import HyperLogLog
+from summarization_algorithms.kernels import get_kernels
+
+COUNTER_DTYPES = tuple(np.dtype(t) for t in (np.uint8, np.uint16, np.uint32, np.int8, np.int16, np.int32, np.int64))
+
+# Next wider type used when counters overflow in "widen" mode.
+WIDER_DTYPES = {
+    np.dtype(np.uint8): np.dtype(np.uint16),
+    np.dtype(np.uint16): np.dtype(np.uint32),
+    np.dtype(np.uint32): np.dtype(np.int64),
+    np.dtype(np.int8): np.dtype(np.int16),
+    np.dtype(np.int16): np.dtype(np.int32),
+    np.dtype(np.int32): np.dtype(np.int64),
+}
+
+OVERFLOW_MODES = ("saturate", "widen")
 
 
 class CountMinSketchBase(abc.ABC):
@@ -15,17 +42,127 @@ class CountMinSketchBase(abc.ABC):
     Abstract base class for Count-Min Sketch implementations.
     Defines the core structure and methods of Count-Min Sketches.
     """
-    def __init__(self, width, depth, *args, **kwargs):
+    mergeable = False  # True for linear sketches whose counter arrays can be added together
+    phase = "sketch"  # AdaptiveSketch reports "exact" until it migrates to a sketch
+    signed_counters = False  # True for sketches whose counters can go negative (Count Sketch)
+
+    def __init__(self, width, depth, *args, hash_family=None, cache_size=0, cache_policy="lru",
+                 counter_dtype=np.int64, overflow="widen", shared_memory=None, top_k=0,
+                 distinct_precision=0, kernels=None, **kwargs):
         """
-        Initialize sketch with width, depth, and seed.
+        Initialize sketch with width, depth, and hash family.
+        The hash family defaults to the reproducible SHA-256 family.
+        With `cache_size > 0` the hash positions of recently seen items are kept in a
+        bounded cache evicted by `cache_policy` ("lru" or "clock").
+        Counter arrays use `counter_dtype`; when a counter leaves its range it is either
+        capped (`overflow="saturate"`) or the whole array is promoted to a wider type
+        (`overflow="widen"`).
+        With `shared_memory` set to True or to a segment name, counter arrays are allocated
+        in shared memory so other processes can attach to them (see shared_counters.py).
+        With `top_k > 0` the sketch keeps its top_k heaviest items (see heavy_hitters.py).
+        With `distinct_precision > 0` it also counts distinct items in a HyperLogLog with
+        2^distinct_precision registers (see hyperloglog.py).
+        `kernels` picks the backend of the hot loops ("python", "numpy", "numba" or "auto";
+        see kernels.py); None uses the default backend.
         Subclasses may require additional parameters.
         """
         self.width = width
         self.depth = depth
+        self._shared = None
+        self.shared_memory = shared_memory
+        self._frozen = False
         self.totalCount = 0
+        self.hash_family = hash_family if hash_family is not None else SHA256HashFamily()
+        self.hash_cache = make_hash_cache(cache_size, cache_policy)
+        self.heavy_hitters = TopKTracker(top_k) if top_k else None
+        self.distinct = HyperLogLog(distinct_precision) if distinct_precision else None
+        self.kernels = get_kernels(kernels)
+
+        self.counter_dtype = np.dtype(counter_dtype)
+        if self.counter_dtype not in COUNTER_DTYPES:
+            raise ValueError(f"Unsupported counter dtype: {self.counter_dtype}")
+        if overflow not in OVERFLOW_MODES:
+            raise ValueError(f"Unknown overflow mode: {overflow}")
+        self.overflow = overflow
+        if shared_memory and overflow == "widen" and self.counter_dtype != np.int64:
+            raise ValueError("Shared memory counters cannot be widened; use overflow=\"saturate\" or int64.")
 
         pass  # Allow subclasses to handle additional parameters as necessary
 
+    @classmethod
+    def dimensions_for_error(cls, epsilon, delta):
+        """
+        Return (width, depth) such that, with probability at least 1 - delta, every estimate
+        is within epsilon * N of the true count: width = ceil(e / epsilon), depth = ceil(ln(1 / delta)).
+        """
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("epsilon and delta must be between 0 and 1.")
+        return math.ceil(math.e / epsilon), max(1, math.ceil(math.log(1 / delta)))
+
+    @classmethod
+    def from_error_bounds(cls, epsilon, delta, stream_length=None, **kwargs):
+        """
+        Create a sketch with the dimensions of `dimensions_for_error`. Unless a counter dtype
+        is given, the narrowest one that can count `stream_length` arrivals is used.
+        """
+        from summarization_algorithms.sizing import counter_dtype_for
+        width, depth = cls.dimensions_for_error(epsilon, delta)
+        kwargs.setdefault("counter_dtype", counter_dtype_for(stream_length, signed=cls.signed_counters))
+        return cls(width, depth, **kwargs)
+
+    @property
+    def totalCount(self):
+        return self._total_count
+
+    @totalCount.setter
+    def totalCount(self, value):
+        if self._frozen:
+            raise RuntimeError("Sketch snapshots are read-only.")
+        self._total_count = value
+        if self._shared is not None:
+            self._shared.publish(value)
+
+    def _write_section(self):
+        """
+        Return a context manager around one update of the counters and totalCount. With
+        shared memory counters it is a seqlock write section (see shared_counters.py), so
+        readers never see a half-applied update.
+        """
+        return self._shared if self._shared is not None else contextlib.nullcontext()
+
+    def _check_writable(self):
+        """
+        Raise before a kernel writes to the counters of a snapshot in place.
+        """
+        if self._frozen:
+            raise RuntimeError("Sketch snapshots are read-only.")
+
+    @property
+    def shared_memory_name(self):
+        """
+        Name of the shared memory segment holding the counters, or None.
+        """
+        return self._shared.name if self._shared is not None else None
+
+    def close_shared_memory(self, unlink=True):
+        """
+        Move the counters back to private memory and release the shared segment.
+        """
+        if self._shared is None:
+            return
+        self.counters = np.array(self.counters)
+        self._shared.close(unlink)
+        self._shared = None
+
+    def __getstate__(self):
+        """
+        Copies and pickles of a sketch get private counters, detached from shared memory.
+        """
+        state = self.__dict__.copy()
+        state["_shared"] = None
+        state["shared_memory"] = None
+        return state
+
     @abc.abstractmethod
     def add(self, item, count=1):
         """
@@ -40,6 +177,473 @@ class CountMinSketchBase(abc.ABC):
         """
         pass
 
+    def add_many(self, items, counts=None):
+        """
+        Add a batch of items to the sketch.
+        `counts` is an optional sequence of frequencies, one per item.
+        The default implementation calls `add` for every item.
+        """
+        with self._write_section():
+            if counts is None:
+                for item in items:
+                    self.add(item)
+            else:
+                for item, count in zip(items, counts):
+                    self.add(item, count)
+
+    def query_many(self, items):
+        """
+        Query the counts of a batch of items.
+        Returns a numpy array of estimates in the same order as `items`.
+        """
+        return np.array([self.query(item) for item in items])
+
+    def _hash(self, x):
+        """
+        Return the list of row indices of `x` given by the hash family.
+        """
+        return self._cached(x, self.hash_family.indices)
+
+    def _hash_many(self, items):
+        """
+        Return a (depth, n) array with the row indices of every item in the batch, computed
+        with the sketch's kernel backend.
+        """
+        return self._cached_many(items, functools.partial(self.hash_family.indices_many, kernels=self.kernels))
+
+    def _hash_update(self, x):
+        """
+        `_hash` for an item being added: also counts it in the distinct-count estimator.
+        """
+        if self.distinct is None:
+            return self._hash(x)
+        return self._hash_many_update([x])[:, 0]
+
+    def _hash_many_update(self, items):
+        """
+        `_hash_many` for a batch being added: also counts it in the distinct-count estimator.
+        When the hash family derives its rows from `keys_many` and there is no hash cache,
+        the rows are computed from the same keys, so the estimator costs no extra hashing.
+        """
+        if self.distinct is None:
+            return self._hash_many(items)
+        keys = self.hash_family.keys_many(items)
+        self.distinct.add_keys(keys)
+        if self.hash_cache is None and self.hash_family.shares_keys:
+            return self._positions_from_keys(keys)
+        return self._hash_many(items)
+
+    def _positions_from_keys(self, keys):
+        """
+        Return what `_hash_many` returns, computed from the hash family keys of the items.
+        """
+        return self.hash_family.indices_from_keys(keys, self.depth, self.width, self.kernels)
+
+    def update_distinct(self, items):
+        """
+        Count `items` in the distinct-count estimator. For sketches that do not hash the
+        items themselves; the others count them through `_hash_many_update`.
+        """
+        if self.distinct is not None:
+            self.distinct.add_keys(self.hash_family.keys_many(items))
+
+    def distinct_count(self):
+        """
+        Return the estimated number of distinct items added.
+        """
+        if self.distinct is None:
+            raise ValueError("The sketch does not count distinct items; create it with distinct_precision > 0.")
+        return self.distinct.estimate()
+
+    @staticmethod
+    def _cache_key(x):
+        """
+        Return the hash cache key of `x`. Items that compare equal may still hash to
+        different positions (1, 1.0 and True; 0.0 and -0.0), so the key holds the type and
+        the bytes the hash families hash rather than the item itself.
+        """
+        return type(x), key_bytes(x)
+
+    def _cached(self, x, compute):
+        """
+        Return `compute(x, depth, width)`, going through the hash cache when there is one.
+        """
+        if self.hash_cache is None:
+            return compute(x, self.depth, self.width)
+        key = self._cache_key(x)
+        value = self.hash_cache.get(key)
+        if value is None:
+            value = compute(x, self.depth, self.width)
+            self.hash_cache.put(key, value)
+        return value
+
+    def _cached_many(self, items, compute_many):
+        """
+        Batch version of `_cached`. `compute_many` returns arrays with the item axis last;
+        only the cache misses are passed to it.
+        """
+        if self.hash_cache is None:
+            return compute_many(items, self.depth, self.width)
+        keys = [self._cache_key(item) for item in items]
+        values = [self.hash_cache.get(key) for key in keys]
+        missing = [j for j, value in enumerate(values) if value is None]
+        if missing:
+            computed = compute_many([items[j] for j in missing], self.depth, self.width)
+            single = not isinstance(computed, tuple)
+            for k, j in enumerate(missing):
+                value = computed[..., k] if single else tuple(part[..., k] for part in computed)
+                self.hash_cache.put(keys[j], value)
+                values[j] = value
+        if values and isinstance(values[0], tuple):
+            return tuple(np.stack(part, axis=-1) for part in zip(*values))
+        return np.stack(values, axis=-1) if values else compute_many(items, self.depth, self.width)
+
+    def cache_stats(self):
+        """
+        Return the hash cache counters, or an empty dictionary when caching is disabled.
+        """
+        return self.hash_cache.stats() if self.hash_cache is not None else {}
+
+    def _batch_counts(self, counts, n):
+        """
+        Return the per-item counts of a batch as an integer numpy array of length n.
+        """
+        if counts is None:
+            return np.ones(n, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.int64)
+        if counts.shape != (n,):
+            raise ValueError(f"Expected {n} counts, got shape {counts.shape}")
+        return counts
+
+    def _allocate_counters(self, shape):
+        """
+        Return a zeroed counter array of the configured dtype, in shared memory if requested.
+        """
+        self._row_nonzero = np.zeros(shape[0], dtype=np.int64)
+        if self.shared_memory:
+            name = self.shared_memory if isinstance(self.shared_memory, str) else None
+            self._shared = SharedCounters.create(shape, self.counter_dtype, name=name)
+            return self._shared.array
+        return np.zeros(shape, dtype=self.counter_dtype)
+
+    def _clear_counters(self):
+        """
+        Zero the counter array, the per-row occupancy, the heavy-hitter candidates and
+        the distinct-count estimator.
+        """
+        self.counters.fill(0)
+        self._row_nonzero.fill(0)
+        if self.heavy_hitters is not None:
+            self.heavy_hitters.reset()
+        if self.distinct is not None:
+            self.distinct.reset()
+
+    def update_heavy_hitters(self, items):
+        """
+        Refresh the heavy-hitter candidates with the current estimates of `items`.
+        Does nothing unless the sketch was created with `top_k`.
+        """
+        if self.heavy_hitters is None:
+            return
+        items = list(dict.fromkeys(items))
+        if len(items) == 1:
+            self.heavy_hitters.update(items[0], self.query(items[0]))
+            return
+        for item, estimate in zip(items, np.asarray(self.query_many(items)).tolist()):
+            self.heavy_hitters.update(item, estimate)
+
+    def get_top_k(self):
+        """
+        Return the heavy-hitter candidates as (item, estimate) pairs, largest first.
+        Costs O(k log k); the key space is never scanned.
+        """
+        if self.heavy_hitters is None:
+            raise ValueError("The sketch does not track heavy hitters; create it with top_k > 0.")
+        return self.heavy_hitters.top_k()
+
+    def _add_to_counters(self, index, delta, unique=False):
+        """
+        Add `delta` to `self.counters[index]`, where `index` is a tuple of index arrays
+        whose first two entries are the row and column of each update.
+        Repeated positions accumulate unless the caller guarantees they are `unique`.
+        int64 counters are updated directly; narrower types are updated in int64 and
+        written back with overflow handling.
+        """
+        cells = index[:2]
+        occupied_before = self._cells_occupied(cells)
+        if self.counters.dtype == np.int64:
+            if unique:
+                self.counters[index] += delta
+            elif len(index) == 2:
+                self._check_writable()
+                rows, cols, deltas = np.broadcast_arrays(index[0], index[1], np.asarray(delta, dtype=np.int64))
+                self.kernels.add(self.counters, rows.ravel(), cols.ravel(), deltas.ravel())
+            else:
+                np.add.at(self.counters, index, delta)
+        else:
+            if not unique:
+                index, delta = self._combine_duplicates(index, delta)
+            self._write_counters(index, self.counters[index].astype(np.int64) + delta)
+        self._update_occupancy(cells, occupied_before)
+
+    def _combine_duplicates(self, index, delta):
+        """
+        Sum the deltas of repeated positions. Returns the unique positions and their totals.
+        """
+        index = np.broadcast_arrays(*index)
+        delta = np.broadcast_to(delta, index[0].shape)
+        flat = np.ravel_multi_index(tuple(i.ravel() for i in index), self.counters.shape)
+        positions, inverse = np.unique(flat, return_inverse=True)
+        totals = np.zeros(len(positions), dtype=np.int64)
+        np.add.at(totals, inverse, delta.ravel())
+        return np.unravel_index(positions, self.counters.shape), totals
+
+    def _store_counters(self, index, values):
+        """
+        Write int64 `values` to `self.counters[index]`, widening or saturating on overflow,
+        and keep the per-row occupancy up to date.
+        """
+        cells = index[:2]
+        occupied_before = self._cells_occupied(cells)
+        self._write_counters(index, values)
+        self._update_occupancy(cells, occupied_before)
+
+    def _write_counters(self, index, values):
+        """
+        Write int64 `values` to `self.counters[index]`, widening or saturating on overflow.
+        """
+        values = np.asarray(values, dtype=np.int64)
+        if values.size and self.counters.dtype != np.int64:
+            low, high = values.min(), values.max()
+            info = np.iinfo(self.counters.dtype)
+            if self.overflow == "widen":
+                while (low < info.min or high > info.max) and self.counters.dtype in WIDER_DTYPES:
+                    self._widen_counters(WIDER_DTYPES[self.counters.dtype])
+                    info = np.iinfo(self.counters.dtype)
+            if low < info.min or high > info.max:
+                values = np.clip(values, info.min, info.max)
+        self.counters[index] = values
+
+    def _cells_occupied(self, cells):
+        """
+        Return whether the counter cells at (rows, columns) `cells` are non-zero.
+        """
+        return self.counters[cells] != 0
+
+    def _occupied_cells(self):
+        """
+        Return a (depth, width) boolean array of the non-zero cells.
+        """
+        return self.counters != 0
+
+    def _cell_values(self):
+        """
+        Return a (depth, width) array with the value held by every cell.
+        """
+        return self.counters
+
+    def _update_occupancy(self, cells, occupied_before):
+        """
+        Update the per-row non-zero counts for the cells at (rows, columns) `cells` that
+        changed between zero and non-zero. Repeated cells are counted once.
+        """
+        occupied_after = self._cells_occupied(cells)
+        changed = occupied_before != occupied_after
+        if not changed.any():
+            return
+        rows, cols = (np.broadcast_to(part, changed.shape)[changed] for part in cells)
+        _, first = np.unique(rows * self.width + cols, return_index=True)
+        np.add.at(self._row_nonzero, rows[first], np.where(occupied_after[changed][first], 1, -1))
+
+    def _recount_occupancy(self):
+        """
+        Recompute the per-row non-zero counts from the whole counter array.
+        """
+        self._row_nonzero = np.count_nonzero(self._occupied_cells(), axis=1).astype(np.int64)
+
+    def get_row_occupancy(self):
+        """
+        Return the fraction of non-zero counters in every row. Costs O(depth).
+        """
+        return self._row_nonzero / self.width
+
+    def get_occupancy_histogram(self):
+        """
+        Return a (depth, bins) array counting, for every row, the cells whose absolute value
+        falls in each power-of-two bucket: bin 0 holds zeros, bin k holds values in [2^(k-1), 2^k).
+        """
+        magnitudes = np.abs(self._cell_values().astype(np.int64))
+        bins = np.zeros(magnitudes.shape, dtype=np.int64)
+        nonzero = magnitudes > 0
+        bins[nonzero] = np.floor(np.log2(magnitudes[nonzero])).astype(np.int64) + 1
+        n_bins = int(bins.max()) + 1
+        return np.stack([np.bincount(row, minlength=n_bins) for row in bins])
+
+    def _widen_counters(self, dtype):
+        """
+        Promote the counter array to `dtype`.
+        """
+        self.counters = self.counters.astype(dtype)
+
+    def merge(self, other):
+        """
+        Add the counters of `other` to this sketch, as if its stream had been added here.
+        Both sketches must have the same type, width, depth, counter dtype and hash family.
+        Returns this sketch.
+        """
+        self._check_mergeable(other)
+        with self._write_section():
+            self._combine_counters(other, 1)
+            self.totalCount += other.totalCount
+        self._refresh_heavy_hitters(other)
+        if self.distinct is not None and other.distinct is not None:
+            self.distinct.merge(other.distinct)
+        return self
+
+    def subtract(self, other):
+        """
+        Subtract the counters of `other` from this sketch, so queries estimate the difference
+        of the two streams. Returns this sketch. The distinct-count estimator cannot
+        forget items and is left unchanged.
+        """
+        self._check_mergeable(other)
+        with self._write_section():
+            self._combine_counters(other, -1)
+            self.totalCount -= other.totalCount
+        self._refresh_heavy_hitters(other)
+        return self
+
+    def _refresh_heavy_hitters(self, other):
+        """
+        Re-estimate the heavy-hitter candidates of both sketches after combining counters.
+        """
+        if self.heavy_hitters is None:
+            return
+        candidates = [item for item, _ in self.heavy_hitters.items()]
+        if other.heavy_hitters is not None:
+            candidates += [item for item, _ in other.heavy_hitters.items()]
+        self.heavy_hitters.reset()
+        self.update_heavy_hitters(candidates)
+
+    def _check_mergeable(self, other):
+        """
+        Raise if `other` cannot be combined with this sketch.
+        """
+        if not self.mergeable:
+            raise NotImplementedError(f"{self.__class__.__name__} does not support merging.")
+        if type(other) is not type(self):
+            raise TypeError(f"Cannot merge {other.__class__.__name__} into {self.__class__.__name__}.")
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError(f"Sketch shapes differ: (width={self.width}, depth={self.depth}) "
+                             f"vs (width={other.width}, depth={other.depth}).")
+        if self.counter_dtype != other.counter_dtype:
+            raise ValueError(f"Counter dtypes differ: {self.counter_dtype} vs {other.counter_dtype}.")
+        if self.hash_family != other.hash_family:
+            raise ValueError(f"Hash families differ: {self.hash_family} vs {other.hash_family}.")
+
+    def _combine_counters(self, other, sign):
+        """
+        Add `sign` times the counters of `other` to this sketch's counters.
+        """
+        if self.counters.dtype == np.int64 and other.counters.dtype == np.int64:
+            if sign > 0:
+                self.counters += other.counters
+            else:
+                self.counters -= other.counters
+        else:
+            self._write_counters(..., self.counters.astype(np.int64) + sign * other.counters.astype(np.int64))
+        self._recount_occupancy()
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __isub__(self, other):
+        return self.subtract(other)
+
+    def __add__(self, other):
+        return copy.deepcopy(self).merge(other)
+
+    def __sub__(self, other):
+        return copy.deepcopy(self).subtract(other)
+
+    def snapshot(self):
+        """
+        Return a frozen, query-only copy of the sketch.
+        Each state array is copied once, contiguously, and marked read-only; the hash family
+        and hash cache are shared with the live sketch. Adding to a snapshot raises.
+        """
+        snapshot = copy.copy(self)
+        for name, array in self._state_arrays().items():
+            frozen = np.array(array)
+            frozen.flags.writeable = False
+            setattr(snapshot, name, frozen)
+        if hasattr(self, "_row_nonzero"):
+            snapshot._row_nonzero = self._row_nonzero.copy()
+        snapshot.heavy_hitters = copy.deepcopy(self.heavy_hitters)
+        snapshot.distinct = copy.deepcopy(self.distinct)
+        snapshot._frozen = True
+        return snapshot
+
+    def save(self, path, compression=None):
+        """
+        Save the sketch to `path` in the binary snapshot format (see serialization.py).
+        `compression` may be None, "zlib" or "zstd".
+        """
+        from summarization_algorithms.serialization import save_sketch
+        save_sketch(self, path, compression=compression)
+
+    @classmethod
+    def load(cls, path, mmap_mode="c"):
+        """
+        Load a sketch saved with `save`. Uncompressed counters are memory-mapped with `mmap_mode`.
+        """
+        from summarization_algorithms.serialization import load_sketch
+        sketch = load_sketch(path, mmap_mode=mmap_mode)
+        if not isinstance(sketch, cls):
+            raise TypeError(f"'{path}' holds a {sketch.__class__.__name__}, not a {cls.__name__}.")
+        return sketch
+
+    def _state_arrays(self):
+        """
+        Return the arrays that make up the sketch state, by attribute name.
+        """
+        return {"counters": self.counters}
+
+    def _state_scalars(self):
+        """
+        Return extra JSON-serializable state besides the arrays and totalCount.
+        """
+        return {}
+
+    def _summary_arrays(self):
+        """
+        Return small arrays derived from the state arrays, by name. They are saved with the
+        sketch so that loading it does not scan (and page in) the whole counter array.
+        """
+        return {"row_nonzero": self._row_nonzero}
+
+    def _restore_state(self, arrays, scalars):
+        """
+        Restore the state returned by `_state_arrays`, `_summary_arrays` and `_state_scalars`.
+        Summaries missing from `arrays` are recomputed from the counters.
+        """
+        arrays = dict(arrays)
+        row_nonzero = arrays.pop("row_nonzero", None)
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        for name, value in scalars.items():
+            setattr(self, name, value)
+        if row_nonzero is None:
+            self._recount_occupancy()
+        else:
+            self._row_nonzero = np.array(row_nonzero, dtype=np.int64)
+
+    def get_memory_usage(self):
+        """
+        Return the number of bytes held by the counter array.
+        """
+        return self.counters.nbytes
+
     @abc.abstractmethod
     def reset(self):
         """
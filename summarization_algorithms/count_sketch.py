@@ -1,7 +1,6 @@
 from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
+import math
 import numpy as np
-import hashlib
-import random
 
 
 class CountSketch(CountMinSketchBase):
@@ -9,39 +8,77 @@ class CountSketch(CountMinSketchBase):
     Fast-AGMS / Count Sketch implementation.
     This sketch provides unbiased frequency estimation.
     """
-    def __init__(self, width, depth):
-        super().__init__(width, depth)
-        self.counters = np.zeros((self.depth, self.width), dtype=int)
+    mergeable = True
+    signed_counters = True
 
-    def _hash_index(self, x):
+    @classmethod
+    def dimensions_for_error(cls, epsilon, delta):
         """
-        Generate multiple hash values for a given input item using SHA-256
+        Return (width, depth) such that, with probability at least 1 - delta, every estimate
+        is within epsilon * ||f||_2 of the true count: width = ceil(3 / epsilon^2), depth = ceil(ln(1 / delta)).
         """
-        base = str(x)
-        for i in range(self.depth):
-            h = hashlib.sha256((base + str(i)).encode('utf-8'))
-            yield int(h.hexdigest(), 16) % self.width
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("epsilon and delta must be between 0 and 1.")
+        return math.ceil(3 / epsilon ** 2), max(1, math.ceil(math.log(1 / delta)))
 
-    def _hash_sign(self, x):
-        base = str(x)
-        for i in range(self.depth):
-            h = hashlib.sha256((base + "_sign" + str(i)).encode('utf-8'))
-            yield 1 if int(h.hexdigest(), 16) % 2 == 0 else -1
+    def __init__(self, width, depth, **kwargs):
+        super().__init__(width, depth, **kwargs)
+        if self.counter_dtype.kind != 'i':
+            raise ValueError("CountSketch needs a signed counter dtype.")
+        self.counters = self._allocate_counters((self.depth, self.width))
+
+    def _hash_signed(self, x):
+        """
+        Return the row indices and signs of `x`, both taken from one call to the hash family.
+        """
+        return self._cached(x, self.hash_family.indices_and_signs)
+
+    def _hash_many(self, items):
+        """
+        Return (depth, n) arrays with the row indices and signs of every item in the batch.
+        """
+        return self._cached_many(items, self.hash_family.indices_and_signs_many)
+
+    def _hash_update(self, x):
+        if self.distinct is None:
+            return self._hash_signed(x)
+        indices, signs = self._hash_many_update([x])
+        return indices[:, 0], signs[:, 0]
+
+    def _positions_from_keys(self, keys):
+        return self.hash_family.indices_and_signs_from_keys(keys, self.depth, self.width)
 
     def add(self, item, count=1):
-        self.totalCount += abs(count)
-        for row, idx, sign in zip(self.counters, self._hash_index(item), self._hash_sign(item)):
-            row[idx] += sign * count
+        indices, signs = self._hash_update(item)
+        with self._write_section():
+            self._add_to_counters((np.arange(self.depth), indices), np.asarray(signs) * count, unique=True)
+            self.totalCount += abs(count)
+        self.update_heavy_hitters((item,))
+
+    def add_many(self, items, counts=None):
+        indices, signs = self._hash_many_update(items)
+        counts = self._batch_counts(counts, indices.shape[1])
+        rows = np.arange(self.depth)[:, None]
+        with self._write_section():
+            self._add_to_counters((rows, indices), signs * counts)
+            self.totalCount += int(np.abs(counts).sum())
+        self.update_heavy_hitters(items)
 
     def query(self, item):
         estimates = []
-        for row, idx, sign in zip(self.counters, self._hash_index(item), self._hash_sign(item)):
-            estimates.append(sign * row[idx])
+        indices, signs = self._hash_signed(item)
+        for row, idx, sign in zip(self.counters, indices, signs):
+            estimates.append(sign * int(row[idx]))
         return int(np.median(estimates))
 
+    def query_many(self, items):
+        indices, signs = self._hash_many(items)
+        return self.kernels.median_query(self.counters, indices, signs).astype(int)
+
     def reset(self):
-        self.totalCount = 0
-        self.counters.fill(0)
+        with self._write_section():
+            self.totalCount = 0
+            self._clear_counters()
 
     def get_load_factor(self):
-        return max(np.count_nonzero(row) for row in self.counters) / self.width
+        return int(self._row_nonzero.max()) / self.width
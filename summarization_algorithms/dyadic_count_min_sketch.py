@@ -0,0 +1,230 @@
+"""
+dyadic_count_min_sketch.py
+Hierarchical (dyadic) Count-Min Sketch for range and quantile queries over integers.
+"""
+import copy
+import numbers
+import numpy as np
+from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
+from summarization_algorithms.count_min_sketch import CountMinSketch
+
+
+class DyadicCountMinSketch(CountMinSketchBase):
+    """
+    One Count-Min Sketch per dyadic level over the integer domain [0, 2^universe_bits).
+    Level l counts the prefixes x >> l, so every range [a, b] is the union of at most two
+    dyadic intervals per level and range, rank and quantile queries cost
+    O(universe_bits * depth). Point queries use level 0 and behave like a CountMinSketch.
+
+    Items must be non-negative integers; values above the domain are counted at its
+    largest value.
+    """
+    mergeable = True
+
+    def __init__(self, width, depth, universe_bits=32, **kwargs):
+        """
+        Initialize one width x depth CountMinSketch per level, levels 0..universe_bits.
+        Hash family, hash cache, counter and kernel options are passed to every level; shared memory
+        is not supported.
+        """
+        if kwargs.get("shared_memory"):
+            raise ValueError("DyadicCountMinSketch does not support shared memory counters.")
+        if not 1 <= universe_bits <= 62:
+            raise ValueError("universe_bits must be between 1 and 62.")
+        cache_size = kwargs.pop("cache_size", 0)
+        cache_policy = kwargs.pop("cache_policy", "lru")
+        super().__init__(width, depth, **kwargs)
+        self.universe_bits = universe_bits
+        self._level_options = {
+            "hash_family": self.hash_family,
+            "cache_size": cache_size,
+            "cache_policy": cache_policy,
+            "counter_dtype": self.counter_dtype,
+            "overflow": self.overflow,
+            "kernels": self.kernels,
+        }
+        self.levels = self._make_levels()
+
+    def _make_levels(self):
+        return [CountMinSketch(self.width, self.depth, **self._level_options)
+                for _ in range(self.universe_bits + 1)]
+
+    @property
+    def max_value(self):
+        return (1 << self.universe_bits) - 1
+
+    def _value(self, item):
+        if not isinstance(item, numbers.Integral):
+            raise ValueError(f"DyadicCountMinSketch only counts non-negative integers, got "
+                             f"{type(item).__name__} {item!r}; stream text datasets with cache_keys=\"ids\".")
+        value = int(item)
+        if value < 0:
+            raise ValueError(f"DyadicCountMinSketch only counts non-negative integers, got {item}.")
+        return min(value, self.max_value)
+
+    def _values(self, items):
+        """
+        Return a batch of items as an int64 array clipped to the domain. Raises ValueError
+        for anything but non-negative integers.
+        """
+        values = np.asarray(items)
+        if values.dtype == object and all(isinstance(item, numbers.Integral) for item in values.ravel().tolist()):
+            values = values.astype(np.int64)
+        if values.size and values.dtype.kind not in "iub":
+            raise ValueError(f"DyadicCountMinSketch only counts non-negative integers, got {values.dtype} "
+                             f"items; stream text datasets with cache_keys=\"ids\".")
+        values = values.astype(np.int64, copy=False).reshape(-1)
+        if values.size and values.min() < 0:
+            raise ValueError("DyadicCountMinSketch only counts non-negative integers.")
+        return np.minimum(values, self.max_value)
+
+    def add(self, item, count=1):
+        """
+        Add the integer `item` `count` times, updating every level.
+        """
+        value = self._value(item)
+        for level, sketch in enumerate(self.levels):
+            sketch.add(value >> level, count)
+        self.totalCount += count
+        self.update_heavy_hitters((item,))
+        self.update_distinct((value,))
+
+    def add_many(self, items, counts=None):
+        """
+        Add a batch of integers: one vectorized CountMinSketch update per level.
+        """
+        values = self._values(items)
+        counts = self._batch_counts(counts, len(values))
+        for level, sketch in enumerate(self.levels):
+            sketch.add_many(values >> level, counts)
+        self.totalCount += int(counts.sum())
+        self.update_heavy_hitters(items)
+        self.update_distinct(values)
+
+    def query(self, item):
+        """
+        Return the estimated count of the integer `item`.
+        """
+        return self.levels[0].query(self._value(item))
+
+    def query_many(self, items):
+        return self.levels[0].query_many(self._values(items))
+
+    def range_query(self, low, high):
+        """
+        Return the estimated number of items with value in [low, high] (inclusive),
+        summing at most two dyadic intervals per level.
+        """
+        low, high = max(int(low), 0), min(int(high), self.max_value)
+        if low > high:
+            return 0
+        total = 0
+        level, start, stop = 0, low, high + 1
+        while start < stop:
+            if start & 1:
+                total += self.levels[level].query(start)
+                start += 1
+            if stop & 1:
+                stop -= 1
+                total += self.levels[level].query(stop)
+            start, stop, level = start >> 1, stop >> 1, level + 1
+        return total
+
+    def rank(self, value):
+        """
+        Return the estimated number of items less than or equal to `value`.
+        """
+        return self.range_query(0, value)
+
+    def quantile(self, q):
+        """
+        Return the smallest value whose estimated rank reaches q * totalCount, for q in [0, 1],
+        walking down the dyadic tree from the root.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("Quantile must be between 0 and 1.")
+        target = q * self.totalCount
+        prefix, below = 0, 0
+        for level in range(self.universe_bits - 1, -1, -1):
+            left = prefix << 1
+            left_count = self.levels[level].query(left)
+            if below + left_count >= target:
+                prefix = left
+            else:
+                below += left_count
+                prefix = left + 1
+        return prefix
+
+    def quantiles(self, qs):
+        return [self.quantile(q) for q in qs]
+
+    def reset(self):
+        """
+        Reset every level and the total count.
+        """
+        for sketch in self.levels:
+            sketch.reset()
+        self.totalCount = 0
+        if self.heavy_hitters is not None:
+            self.heavy_hitters.reset()
+        if self.distinct is not None:
+            self.distinct.reset()
+
+    def get_load_factor(self):
+        """
+        Return the load factor of level 0 (the point-query level).
+        """
+        return self.levels[0].get_load_factor()
+
+    def get_row_occupancy(self):
+        return self.levels[0].get_row_occupancy()
+
+    def get_occupancy_histogram(self):
+        return self.levels[0].get_occupancy_histogram()
+
+    def cache_stats(self):
+        return self.levels[0].cache_stats()
+
+    def get_memory_usage(self):
+        """
+        Return the number of bytes held by the counters of all levels.
+        """
+        return sum(sketch.get_memory_usage() for sketch in self.levels)
+
+    def _check_mergeable(self, other):
+        super()._check_mergeable(other)
+        if self.universe_bits != other.universe_bits:
+            raise ValueError(f"Universe sizes differ: {self.universe_bits} vs {other.universe_bits} bits.")
+
+    def _combine_counters(self, other, sign):
+        for sketch, other_sketch in zip(self.levels, other.levels):
+            sketch._combine_counters(other_sketch, sign)
+
+    def snapshot(self):
+        """
+        Return a frozen, query-only copy made of snapshots of every level.
+        """
+        snapshot = copy.copy(self)
+        snapshot.levels = [sketch.snapshot() for sketch in self.levels]
+        snapshot.heavy_hitters = copy.deepcopy(self.heavy_hitters)
+        snapshot.distinct = copy.deepcopy(self.distinct)
+        snapshot._frozen = True
+        return snapshot
+
+    def _state_arrays(self):
+        return {f"level{level}": sketch.counters for level, sketch in enumerate(self.levels)}
+
+    def _summary_arrays(self):
+        return {f"level{level}_row_nonzero": sketch._row_nonzero for level, sketch in enumerate(self.levels)}
+
+    def _state_scalars(self):
+        return {"universe_bits": self.universe_bits}
+
+    def _restore_state(self, arrays, scalars):
+        self.universe_bits = scalars["universe_bits"]
+        self.levels = self._make_levels()
+        for level, sketch in enumerate(self.levels):
+            state = {"counters": arrays[f"level{level}"]}
+            if f"level{level}_row_nonzero" in arrays:
+                state["row_nonzero"] = arrays[f"level{level}_row_nonzero"]
+            sketch._restore_state(state, {})
@@ -1,99 +1,85 @@
-import hashlib
+import numpy as np
 from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
 
 
-class Bucket:
-    def __init__(self, exponent=-1, start=-1, end=-1):
-        self.exponent = exponent
-        self.start = start
-        self.end = end
-
-
-class Counter:
-    def __init__(self):
-        self.bucket = [Bucket() for _ in range(100)]
-        self.number = -1
-
-
 class ExpCountMinSketch(CountMinSketchBase):
-    def __init__(self, width, depth, window_size=1, counter_size=4):
-        super().__init__(width, depth)
+    """
+    ECM-sketch: a Count-Min Sketch whose cells are exponential histograms over a sliding
+    window of the last `window_size` arrivals.
+
+    Every cell holds at most two buckets of each size 2^e, stored as a ring buffer of `slots`
+    buckets in the arrays `exponent`, `start` and `end` of shape (depth, width, slots).
+    `head` points at the newest bucket of each cell and `length` counts its buckets, so the
+    oldest bucket is at (head + length - 1) % slots. `totals` holds the sum of the bucket
+    sizes of every cell. A bucket expires once its newest arrival (`end`) leaves the window.
+    """
+    def __init__(self, width, depth, window_size=1, counter_size=4, **kwargs):
+        """
+        Initialize the histograms over a window of the last `window_size` arrivals.
+        The histograms are private arrays; shared memory is not supported.
+        """
+        if kwargs.get("shared_memory"):
+            raise ValueError("ExpCountMinSketch does not support shared memory counters.")
+        super().__init__(width, depth, **kwargs)
         self.window_size = window_size
         self.counter_size = counter_size
-        self.counter = [[Counter() for _ in range(self.width)] for _ in range(self.depth)]
-        self.mem_acc = 0
         self.MAX_CNT = (1 << counter_size) - 1
-
-    def _hash(self, x):
+        # Two buckets per size are enough for window_size + 2^(e_max) arrivals.
+        self.slots = 2 * (int(window_size).bit_length() + 2)
+        self.mem_acc = 0
+        self._allocate_histograms()
+
+    def _allocate_histograms(self):
+        shape = (self.depth, self.width)
+        self.exponent = np.zeros(shape + (self.slots,), dtype=np.int8)
+        self.start = np.zeros(shape + (self.slots,), dtype=np.int64)
+        self.end = np.zeros(shape + (self.slots,), dtype=np.int64)
+        self.head = np.zeros(shape, dtype=np.int64)
+        self.length = np.zeros(shape, dtype=np.int64)
+        self.totals = np.zeros(shape, dtype=np.int64)
+
+    def _expire(self, rows, cols, t):
         """
-        Generate multiple hash values for a given input item using SHA-256
+        Drop the expired buckets of the cells at (rows, cols) at time t.
         """
-        base = str(x)
-        for i in range(self.depth):
-            h = hashlib.sha256((base + str(i)).encode('utf-8'))
-            yield int(h.hexdigest(), 16) % self.width
-
-    def _expire_bucket(self, i, j, t):
-        z = self.counter[i][j].number - 1
-        if z >= -1:
-            for q in range(z, -1, -1):
-                if self.counter[i][j].bucket[q].end <= (t - self.window_size):
-                    self.counter[i][j].bucket[q] = Bucket()
-                    self.counter[i][j].number -= 1
-                else:
-                    break
-
-    def _insert_bucket(self, i, j, t):
-        c = self.counter[i][j]
-        z = c.number
-
-        if z == -1:
-            c.bucket[0] = Bucket(0, t, t)
-            c.number = 1
-            return
-
-        p = -1
-        value = 0
-        first = 0
-
+        cutoff = t - self.window_size
         while True:
-            if p + 2 >= 100 or c.bucket[p + 2].exponent != value:
-                # Insert a new bucket of exponent 0
-                for q in range(z + 1, 0, -1):
-                    c.bucket[q] = c.bucket[q - 1]
-                c.bucket[0] = Bucket(0, c.bucket[1].end if z >= 0 else t, t)
-                c.number += 1
-                break
-            else:
-                # Merge two buckets
-                if p == -1:
-                    c.bucket[p + 2].exponent += 1
-                    c.bucket[p + 2].end = c.bucket[p + 1].end
-                    c.bucket[p + 1].start = c.bucket[p + 2].end
-                    c.bucket[p + 1].end = t
-                    for q in range(p + 1, first, -1):
-                        c.bucket[q] = c.bucket[q - 1]
-                    first += 1
-                    c.number -= 1
-                    p += 2
-                    value = c.bucket[p].exponent
-                else:
-                    c.bucket[p + 2].exponent += 1
-                    c.bucket[p + 2].end = c.bucket[p].end
-                    c.bucket[p].start = c.bucket[p + 2].end
-                    c.bucket[p].end = t
-                    for q in range(p, first, -1):
-                        c.bucket[q] = c.bucket[q - 1]
-                    first += 1
-                    c.number -= 1
-                    p += 2
-                    value = c.bucket[p].exponent
-
-        # Final shift of active bucket window
-        if first != 0:
-            new_bucket = [c.bucket[q] for q in range(first, first + c.number)]
-            new_bucket += [Bucket() for _ in range(100 - len(new_bucket))]
-            c.bucket = new_bucket
+            length = self.length[rows, cols]
+            oldest = (self.head[rows, cols] + length - 1) % self.slots
+            expired = (length > 0) & (self.end[rows, cols, oldest] <= cutoff)
+            if not expired.any():
+                return
+            r, c, o = rows[expired], cols[expired], oldest[expired]
+            self.totals[r, c] -= np.left_shift(1, self.exponent[r, c, o].astype(np.int64))
+            self.length[r, c] -= 1
+
+    def _insert(self, i, j, t):
+        """
+        Add a bucket of size 1 for time t to cell (i, j) and merge the two oldest buckets
+        of any size that now has three.
+        """
+        exponent, start, end = self.exponent[i, j], self.start[i, j], self.end[i, j]
+        k = self.slots
+        head = (int(self.head[i, j]) - 1) % k
+        length = int(self.length[i, j]) + 1
+        exponent[head], start[head], end[head] = 0, t, t
+
+        m, e = 0, 0
+        while m + 2 < length and exponent[(head + m + 2) % k] == e:
+            newer, older = (head + m + 1) % k, (head + m + 2) % k
+            exponent[older] = e + 1
+            end[older] = end[newer]
+            # Close the gap left by the newer bucket by moving the newest m + 1 buckets one slot up.
+            source = (head + np.arange(m, -1, -1)) % k
+            for array in (exponent, start, end):
+                array[(source + 1) % k] = array[source]
+            head = (head + 1) % k
+            length -= 1
+            m, e = m + 1, e + 1
+
+        self.head[i, j] = head
+        self.length[i, j] = length
+        self.totals[i, j] += 1
 
     def add(self, item, count=1):
         """
@@ -103,43 +89,94 @@ class ExpCountMinSketch(CountMinSketchBase):
         if count != 1:
             raise NotImplementedError("ECMSketch only supports count=1 per add.")
         t = self.totalCount
-        for i, j in enumerate(self._hash(item)):
-            self._expire_bucket(i, j, t)
-            self._insert_bucket(i, j, t)
+        rows, cols = np.arange(self.depth), np.asarray(self._hash_update(item))
+        self._expire(rows, cols, t)
+        for i, j in zip(rows, cols):
+            self._insert(i, j, t)
             self.mem_acc += 1
         self.totalCount += count
+        self.update_heavy_hitters((item,))
 
-    def _bucket_sum(self, i, j, t):
-        c = self.counter[i][j]
-        if c.number == -1:
-            return 0
-        count = 0
-        for q in range(c.number - 1):
-            count += 2 ** c.bucket[q].exponent
-        count += (2 ** c.bucket[c.number - 1].exponent) // 2
-        return count
+    def _window_counts(self, rows, cols, t):
+        """
+        Return the window estimate of the cells at (rows, columns) at time t without
+        modifying the sketch: every live bucket counts fully except the oldest, which may
+        be partly outside the window and counts half (rounded up, so a live bucket of size
+        one counts one).
+        """
+        cutoff = t - self.window_size
+        head = self.head[rows, cols]
+        length = self.length[rows, cols].copy()
+        totals = self.totals[rows, cols].copy()
+        while True:
+            oldest = (head + length - 1) % self.slots
+            sizes = np.left_shift(1, self.exponent[rows, cols, oldest].astype(np.int64))
+            expired = (length > 0) & (self.end[rows, cols, oldest] <= cutoff)
+            if not expired.any():
+                break
+            totals[expired] -= sizes[expired]
+            length[expired] -= 1
+        return np.where(length > 0, totals - sizes // 2, 0)
 
     def query(self, item, t=None):
         if t is None:
             t = self.totalCount
-        min_val = self.MAX_CNT
-        for i, j in enumerate(self._hash(item)):
-            self._expire_bucket(i, j, t)
-            temp = self._bucket_sum(i, j, t)
-            min_val = min(min_val, temp)
-        return min_val
+        counts = self._window_counts(np.arange(self.depth), np.asarray(self._hash(item)), t)
+        return min(self.MAX_CNT, int(counts.min()))
+
+    def _all_window_counts(self):
+        """
+        Return a (depth, width) array with the window estimate of every cell at the current time.
+        """
+        rows, cols = np.indices((self.depth, self.width))
+        return self._window_counts(rows, cols, self.totalCount)
+
+    def _occupied_cells(self):
+        return self._all_window_counts() != 0
+
+    def _cell_values(self):
+        return self._all_window_counts()
+
+    def get_row_occupancy(self):
+        """
+        Return the fraction of cells with a non-zero window count in every row.
+        """
+        return np.count_nonzero(self._all_window_counts(), axis=1) / self.width
 
     def reset(self):
-        self.counter = [[Counter() for _ in range(self.width)] for _ in range(self.depth)]
+        self._allocate_histograms()
         self.totalCount = 0
         self.mem_acc = 0
+        if self.heavy_hitters is not None:
+            self.heavy_hitters.reset()
+        if self.distinct is not None:
+            self.distinct.reset()
 
     def get_load_factor(self):
         """
         Return the maximum number of non-zero counters in any row divided by width.
         """
-        max_nonzero = 0
-        for row in self.counter:
-            row_nonzero = sum(1 for c in row if c.number > 0)
-            max_nonzero = max(max_nonzero, row_nonzero)
-        return max_nonzero / self.width if self.width else 0
+        return float(self.get_row_occupancy().max()) if self.width else 0
+
+    def get_memory_usage(self):
+        """
+        Return the number of bytes held by the histogram arrays.
+        """
+        return sum(array.nbytes for array in self._state_arrays().values())
+
+    def _state_arrays(self):
+        return {"exponent": self.exponent, "start": self.start, "end": self.end,
+                "head": self.head, "length": self.length, "totals": self.totals}
+
+    def _summary_arrays(self):
+        return {}
+
+    def _state_scalars(self):
+        return {"window_size": self.window_size, "counter_size": self.counter_size,
+                "MAX_CNT": self.MAX_CNT, "slots": self.slots, "mem_acc": self.mem_acc}
+
+    def _restore_state(self, arrays, scalars):
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        for name, value in scalars.items():
+            setattr(self, name, value)
@@ -0,0 +1,142 @@
+"""
+forward_decay_count_min_sketch.py
+Count-Min Sketch with exponential time decay, implemented with forward decay.
+"""
+import math
+import numpy as np
+from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
+
+# Renormalize before any weight exceeds e^RENORMALIZE_EXPONENT, far below the float64 limit (~e^709).
+RENORMALIZE_EXPONENT = 256.0
+
+
+class ForwardDecayCountMinSketch(CountMinSketchBase):
+    """
+    Count-Min Sketch whose counts decay by half every `half_life` arrivals.
+
+    With forward decay an arrival at time t is added with the weight g(t - landmark) =
+    exp(lambda * (t - landmark)), which grows with time instead of shrinking old counters,
+    so decay costs nothing per item. A query at time T divides by g(T - landmark), giving
+    sum(exp(-lambda * (T - t_i))) over the arrivals of the item. When the weights grow
+    too large the counters are rescaled in one vectorized step and the landmark moves to now.
+
+    Time is the arrival number: the k-th arrival (counting from 1) happens at time k, so
+    the newest arrival has weight 1. Counters are float64.
+    """
+    def __init__(self, width, depth, half_life=None, **kwargs):
+        """
+        Initialize sketch with given width and depth and a decay half-life in arrivals
+        (defaults to width * depth). The counter dtype is always float64.
+        """
+        kwargs.pop("counter_dtype", None)
+        super().__init__(width, depth, **kwargs)
+        self.counter_dtype = np.dtype(np.float64)
+        self.half_life = half_life or width * depth
+        self.landmark = 0
+        self.counters = self._allocate_counters((self.depth, self.width))
+
+    @property
+    def decay_rate(self):
+        """
+        The decay constant lambda = ln(2) / half_life.
+        """
+        return math.log(2) / self.half_life
+
+    def _renormalize(self, t):
+        """
+        Move the landmark to time t (at most the end of the update being made), rescaling
+        the counters to the new landmark.
+        """
+        self.counters *= math.exp(-self.decay_rate * (t - self.landmark))
+        self.landmark = t
+        self._recount_occupancy()
+
+    def _block_weights(self, ends, counts):
+        """
+        Return the total forward-decay weight of `counts` consecutive arrivals ending at
+        times `ends`: sum_k exp(lambda * (end - k - landmark)) for k < count, in closed form.
+        """
+        rate = self.decay_rate
+        return np.exp(rate * (ends - self.landmark)) * np.expm1(-rate * counts) / math.expm1(-rate)
+
+    def _max_block(self):
+        """
+        Return how far after the landmark an arrival can be while its weight stays in range.
+        """
+        return max(1, int(RENORMALIZE_EXPONENT / self.decay_rate))
+
+    def add(self, item, count=1):
+        """
+        Add `count` arrivals of `item`.
+        """
+        if count <= 0:
+            return
+        end = self.totalCount + count
+        cells = (np.arange(self.depth), self._hash_update(item))
+        with self._write_section():
+            if end - self.landmark > self._max_block():
+                self._renormalize(end)
+            weight = float(self._block_weights(np.float64(end), np.float64(count)))
+            occupied_before = self._cells_occupied(cells)
+            self.counters[cells] += weight
+            self._update_occupancy(cells, occupied_before)
+            self.totalCount += count
+        self.update_heavy_hitters((item,))
+
+    def add_many(self, items, counts=None):
+        """
+        Add a batch of items in stream order with one vectorized update per renormalization period.
+        """
+        indices = self._hash_many_update(items)
+        counts = self._batch_counts(counts, indices.shape[1])
+        ends = self.totalCount + np.cumsum(counts)
+        rows = np.arange(self.depth)[:, None]
+        first = 0
+        with self._write_section():
+            while first < len(counts):
+                if ends[first] - self.landmark > self._max_block():
+                    self._renormalize(int(ends[first]))
+                last = int(np.searchsorted(ends, self.landmark + self._max_block(), side="right"))
+                chunk = slice(first, last)
+                cells = (rows, indices[:, chunk])
+                occupied_before = self._cells_occupied(cells)
+                np.add.at(self.counters, cells, self._block_weights(ends[chunk], counts[chunk]))
+                self._update_occupancy(cells, occupied_before)
+                first = last
+            self.totalCount += int(counts.sum())
+        self.update_heavy_hitters(items)
+
+    def _scale(self):
+        """
+        Return the factor turning counters into decayed counts at the current time.
+        """
+        return math.exp(-self.decay_rate * (self.totalCount - self.landmark))
+
+    def query(self, item):
+        """
+        Return the estimated decayed count of `item` at the current time.
+        """
+        return float(self.counters[np.arange(self.depth), self._hash(item)].min()) * self._scale()
+
+    def query_many(self, items):
+        indices = self._hash_many(items)
+        rows = np.arange(self.depth)[:, None]
+        return self.counters[rows, indices].min(axis=0) * self._scale()
+
+    def reset(self):
+        """
+        Reset the sketch by clearing all tables, the landmark and the count.
+        """
+        with self._write_section():
+            self.totalCount = 0
+            self.landmark = 0
+            self._clear_counters()
+
+    def get_load_factor(self):
+        """
+        Return the load factor: maximum number of non-zero counters in any row, divided by width.
+        """
+        return int(self._row_nonzero.max()) / self.width
+
+    def _state_scalars(self):
+        return {"half_life": self.half_life, "landmark": int(self.landmark)}
@@ -0,0 +1,160 @@
+"""
+hash_cache.py
+Bounded caches mapping an item to its precomputed hash positions.
+
+On skewed streams the same few thousand keys are hashed over and over, by `add` during
+ingestion and by `query` during evaluation. A sketch created with `cache_size > 0` keeps
+the positions of recently seen keys in one of these caches, so hot keys skip hashing.
+
+Two eviction policies are available:
+    - LRUHashCache: exact least-recently-used order (OrderedDict).
+    - ClockHashCache: CLOCK second-chance approximation of LRU. A hit only sets a bit,
+      which is cheaper than reordering on every access.
+"""
+import abc
+from collections import OrderedDict
+
+
+class HashCache(abc.ABC):
+    """
+    Abstract base class for bounded hash caches.
+    Keeps hit, miss and eviction counters.
+    """
+    policy = None
+
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("Cache capacity must be positive.")
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @abc.abstractmethod
+    def get(self, key):
+        """
+        Return the cached value of `key`, or None on a miss.
+        """
+        pass
+
+    @abc.abstractmethod
+    def put(self, key, value):
+        """
+        Store `value` for `key`, evicting an entry if the cache is full.
+        """
+        pass
+
+    @abc.abstractmethod
+    def __len__(self):
+        pass
+
+    def stats(self):
+        """
+        Return a dictionary with the cache counters and the hit rate.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "cache_policy": self.policy,
+            "cache_capacity": self.capacity,
+            "cache_size": len(self),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_evictions": self.evictions,
+            "cache_hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class LRUHashCache(HashCache):
+    """
+    Least-recently-used cache.
+    """
+    policy = "lru"
+
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class ClockHashCache(HashCache):
+    """
+    CLOCK (second-chance) cache.
+    Entries live in a fixed ring of slots with one reference bit each. The hand sweeps the
+    ring on eviction, clearing set bits, and replaces the first entry whose bit is clear.
+    """
+    policy = "clock"
+
+    def __init__(self, capacity):
+        super().__init__(capacity)
+        self._slots = {}
+        self._keys = [None] * capacity
+        self._values = [None] * capacity
+        self._referenced = [False] * capacity
+        self._hand = 0
+
+    def get(self, key):
+        slot = self._slots.get(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self._referenced[slot] = True
+        self.hits += 1
+        return self._values[slot]
+
+    def put(self, key, value):
+        slot = self._slots.get(key)
+        if slot is None:
+            if len(self._slots) < self.capacity:
+                slot = len(self._slots)
+            else:
+                while self._referenced[self._hand]:
+                    self._referenced[self._hand] = False
+                    self._hand = (self._hand + 1) % self.capacity
+                slot = self._hand
+                del self._slots[self._keys[slot]]
+                self._hand = (slot + 1) % self.capacity
+                self.evictions += 1
+            self._slots[key] = slot
+            self._keys[slot] = key
+        self._values[slot] = value
+        self._referenced[slot] = False
+
+    def __len__(self):
+        return len(self._slots)
+
+
+CACHE_POLICIES = {
+    LRUHashCache.policy: LRUHashCache,
+    ClockHashCache.policy: ClockHashCache,
+}
+
+
+def make_hash_cache(capacity, policy="lru"):
+    """
+    Return a hash cache with the given capacity and policy ("lru" or "clock"),
+    or None when capacity is 0.
+    """
+    if not capacity:
+        return None
+    try:
+        return CACHE_POLICIES[policy](capacity)
+    except KeyError:
+        raise ValueError(f"Unknown cache policy: {policy}")
@@ -0,0 +1,303 @@
+"""
+hash_family.py
+Hash families used by the sketches to map items to counter positions.
+
+Every family turns an item into `depth` row indices in [0, width) and, for sketches
+that need them (Count Sketch), `depth` signs in {+1, -1}. The batch methods return
+(depth, n) numpy arrays so sketches can update or query many items at once.
+
+`keys_many` returns the 64-bit key of every item. Families that derive all rows from one
+such key (`shares_keys`) can also map keys to rows, so a companion structure that needs a
+hash of each item (the HyperLogLog in hyperloglog.py) can reuse the key instead of hashing
+the item again.
+
+Available families:
+    - SHA256HashFamily: one SHA-256 per row. Slow, but reproduces the original sketches
+      bit for bit, so it stays the default.
+    - DoubleHashFamily: Kirsch-Mitzenmacher double hashing. One 64-bit BLAKE2b digest per
+      item; all rows and signs are derived from it with integer arithmetic.
+    - MultiplyShiftHashFamily: seeded multiply-shift hashing. Integer keys are hashed
+      without any digest and whole integer batches are hashed with numpy in one call.
+"""
+import abc
+import hashlib
+import numpy as np
+
+MASK64 = (1 << 64) - 1
+
+
+def key_bytes(x):
+    """
+    Return the bytes that represent item `x` for hashing.
+    Bytes are used as they are, so b"abc" and "abc" hash to the same positions.
+    """
+    if isinstance(x, bytes):
+        return x
+    if isinstance(x, (bytearray, memoryview)):
+        return bytes(x)
+    return str(x).encode('utf-8')
+
+
+def digest64(key, seed=0):
+    """
+    Return a seeded 64-bit BLAKE2b digest of `key` (bytes) as an integer.
+    """
+    h = hashlib.blake2b(key, digest_size=8, key=seed.to_bytes(8, 'little'))
+    return int.from_bytes(h.digest(), 'little')
+
+
+def _mix64(z):
+    """
+    SplitMix64 finalizer. Works on Python ints and on numpy uint64 arrays.
+    """
+    if isinstance(z, np.ndarray):
+        z = z + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+    z = (z + 0x9E3779B97F4A7C15) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+class HashFamily(abc.ABC):
+    """
+    Abstract base class for hash families.
+    Two families are compatible (produce the same positions) when they have the same
+    type and seed.
+    """
+    name = None
+    shares_keys = False  # True when the rows are derived from the keys returned by keys_many
+
+    def __init__(self, seed=0):
+        self.seed = seed
+
+    @abc.abstractmethod
+    def indices(self, item, depth, width):
+        """
+        Return a list with the row indices of `item`.
+        """
+        pass
+
+    @abc.abstractmethod
+    def indices_and_signs(self, item, depth, width):
+        """
+        Return a tuple (indices, signs) of lists for `item`.
+        """
+        pass
+
+    def indices_many(self, items, depth, width, kernels=None):
+        """
+        Return a (depth, n) array with the row indices of every item in the batch.
+        `kernels` is the kernel backend to use where the family has one (see kernels.py);
+        None uses the default backend.
+        """
+        indices = np.empty((depth, len(items)), dtype=np.intp)
+        for j, item in enumerate(items):
+            indices[:, j] = self.indices(item, depth, width)
+        return indices
+
+    def indices_and_signs_many(self, items, depth, width):
+        """
+        Return (depth, n) arrays with the row indices and signs of every item in the batch.
+        """
+        indices = np.empty((depth, len(items)), dtype=np.intp)
+        signs = np.empty((depth, len(items)), dtype=np.int64)
+        for j, item in enumerate(items):
+            indices[:, j], signs[:, j] = self.indices_and_signs(item, depth, width)
+        return indices, signs
+
+    def keys_many(self, items):
+        """
+        Return a uint64 array with a 64-bit key of every item in the batch. For families
+        with `shares_keys` this is the key the row indices are derived from; otherwise it
+        is a separate seeded BLAKE2b digest.
+        """
+        return np.fromiter((digest64(key_bytes(item), self.seed) for item in items),
+                           dtype=np.uint64, count=len(items))
+
+    def indices_from_keys(self, keys, depth, width, kernels=None):
+        """
+        Return the (depth, n) row indices of the items whose `keys_many` keys are `keys`,
+        computed with the `kernels` backend (the default backend when None).
+        Only available when `shares_keys` is True.
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not derive its rows from keys_many.")
+
+    def indices_and_signs_from_keys(self, keys, depth, width):
+        """
+        Return the (depth, n) row indices and signs of the items whose keys are `keys`.
+        Only available when `shares_keys` is True.
+        """
+        raise NotImplementedError(f"{self.__class__.__name__} does not derive its rows from keys_many.")
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.seed == other.seed
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.seed))
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(seed={self.seed})"
+
+
+class SHA256HashFamily(HashFamily):
+    """
+    One SHA-256 digest per row (and one more per row for signs).
+    With seed 0 this matches the hashing the sketches have always used.
+    """
+    name = "sha256"
+
+    def _key(self, item):
+        key = key_bytes(item)
+        if self.seed:
+            key = str(self.seed).encode('utf-8') + b':' + key
+        return key
+
+    def indices(self, item, depth, width):
+        key = self._key(item)
+        return [int.from_bytes(hashlib.sha256(key + str(i).encode('utf-8')).digest(), 'big') % width
+                for i in range(depth)]
+
+    def indices_and_signs(self, item, depth, width):
+        key = self._key(item)
+        signs = [1 if hashlib.sha256(key + b"_sign" + str(i).encode('utf-8')).digest()[-1] % 2 == 0 else -1
+                 for i in range(depth)]
+        return self.indices(item, depth, width), signs
+
+
+class DoubleHashFamily(HashFamily):
+    """
+    Kirsch-Mitzenmacher double hashing: g_i(x) = h1(x) + i * h2(x) mod 2^64.
+    h1 is a 64-bit BLAKE2b digest of the item and h2 is a mix of h1, so each item
+    costs one digest regardless of depth. The row index is g_i mod width and the sign
+    is taken from the top bit of g_i.
+    """
+    name = "double"
+    shares_keys = True
+
+    def _rows(self, h1, depth):
+        h2 = _mix64(h1) | 1
+        return [(h1 + i * h2) & MASK64 for i in range(depth)]
+
+    def indices(self, item, depth, width):
+        return [g % width for g in self._rows(digest64(key_bytes(item), self.seed), depth)]
+
+    def indices_and_signs(self, item, depth, width):
+        rows = self._rows(digest64(key_bytes(item), self.seed), depth)
+        return [g % width for g in rows], [-1 if g >> 63 else 1 for g in rows]
+
+    def _rows_from_keys(self, h1, depth):
+        h2 = _mix64(h1) | np.uint64(1)
+        i = np.arange(depth, dtype=np.uint64)[:, None]
+        return h1[None, :] + i * h2[None, :]
+
+    def indices_many(self, items, depth, width, kernels=None):
+        return self.indices_from_keys(self.keys_many(items), depth, width, kernels)
+
+    def indices_and_signs_many(self, items, depth, width):
+        return self.indices_and_signs_from_keys(self.keys_many(items), depth, width)
+
+    def indices_from_keys(self, keys, depth, width, kernels=None):
+        if kernels is None:
+            from summarization_algorithms.kernels import get_kernels
+            kernels = get_kernels()
+        return kernels.double_hash_indices(keys, depth, width)
+
+    def indices_and_signs_from_keys(self, keys, depth, width):
+        rows = self._rows_from_keys(keys, depth)
+        indices = (rows % np.uint64(width)).astype(np.intp)
+        signs = 1 - 2 * (rows >> np.uint64(63)).astype(np.int64)
+        return indices, signs
+
+
+class MultiplyShiftHashFamily(HashFamily):
+    """
+    Seeded multiply-shift hashing: h_i(x) = (a_i * x + b_i mod 2^64) >> 32.
+    Integer keys are used directly; any other key is first reduced to a 64-bit
+    BLAKE2b digest. The 32-bit hash is mapped to [0, width) with a multiply-high
+    and the sign is taken from bit 31 of a_i * x + b_i.
+    """
+    name = "multiply_shift"
+    shares_keys = True
+
+    def __init__(self, seed=0):
+        super().__init__(seed)
+        self._params = {}
+
+    def _coefficients(self, depth):
+        if depth not in self._params:
+            rng = np.random.default_rng(self.seed)
+            a, b = rng.integers(0, 2 ** 64, size=(2, depth), dtype=np.uint64, endpoint=False)
+            a |= np.uint64(1)
+            self._params[depth] = (a, b, [int(v) for v in a], [int(v) for v in b])
+        return self._params[depth]
+
+    def _int_key(self, item):
+        if isinstance(item, (int, np.integer)) and not isinstance(item, bool):
+            return int(item) & MASK64
+        return digest64(key_bytes(item), self.seed)
+
+    def _rows(self, item, depth):
+        x = self._int_key(item)
+        _, _, a, b = self._coefficients(depth)
+        return [(a_i * x + b_i) & MASK64 for a_i, b_i in zip(a, b)]
+
+    def indices(self, item, depth, width):
+        return [((g >> 32) * width) >> 32 for g in self._rows(item, depth)]
+
+    def indices_and_signs(self, item, depth, width):
+        rows = self._rows(item, depth)
+        return [((g >> 32) * width) >> 32 for g in rows], [-1 if (g >> 31) & 1 else 1 for g in rows]
+
+    def keys_many(self, items):
+        """
+        Return the integer keys of the batch: integers as they are, other items as digests.
+        """
+        keys = np.asarray(items)
+        if keys.dtype.kind in 'iu':
+            return keys.astype(np.uint64)
+        return np.fromiter((self._int_key(item) for item in items), dtype=np.uint64, count=len(items))
+
+    def _rows_from_keys(self, x, depth):
+        a, b, _, _ = self._coefficients(depth)
+        return a[:, None] * x[None, :] + b[:, None]
+
+    def indices_many(self, items, depth, width, kernels=None):
+        return self.indices_from_keys(self.keys_many(items), depth, width, kernels)
+
+    def indices_and_signs_many(self, items, depth, width):
+        return self.indices_and_signs_from_keys(self.keys_many(items), depth, width)
+
+    def indices_from_keys(self, keys, depth, width, kernels=None):
+        if kernels is None:
+            from summarization_algorithms.kernels import get_kernels
+            kernels = get_kernels()
+        a, b, _, _ = self._coefficients(depth)
+        return kernels.multiply_shift_indices(keys, a, b, width)
+
+    def indices_and_signs_from_keys(self, keys, depth, width):
+        rows = self._rows_from_keys(keys, depth)
+        indices = (((rows >> np.uint64(32)) * np.uint64(width)) >> np.uint64(32)).astype(np.intp)
+        signs = 1 - 2 * ((rows >> np.uint64(31)) & np.uint64(1)).astype(np.int64)
+        return indices, signs
+
+
+HASH_FAMILIES = {
+    SHA256HashFamily.name: SHA256HashFamily,
+    DoubleHashFamily.name: DoubleHashFamily,
+    MultiplyShiftHashFamily.name: MultiplyShiftHashFamily,
+}
+
+
+def get_hash_family(name="sha256", seed=0):
+    """
+    Return a hash family instance by name ("sha256", "double" or "multiply_shift").
+    """
+    if isinstance(name, HashFamily):
+        return name
+    try:
+        return HASH_FAMILIES[name](seed=seed)
+    except KeyError:
+        raise ValueError(f"Unknown hash family: {name}")
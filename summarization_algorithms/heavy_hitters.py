@@ -0,0 +1,105 @@
+"""
+heavy_hitters.py
+Top-k heavy-hitter candidates kept next to a sketch.
+
+A sketch created with `top_k=k` keeps the k items with the largest estimates seen so far
+in an indexed min-heap: every add refreshes the added item with its current sketch
+estimate in O(log k), and the smallest candidate is replaced when a larger item arrives.
+Reading the candidates costs O(k) and never touches the key space.
+
+Candidate estimates are refreshed only when the item is added again, so on sketches whose
+estimates can decrease (sliding windows, Count Sketch) they may be stale.
+
+Usage:
+    cms = CountMinSketch(width=10000, depth=5, top_k=20)
+    cms.add_many(stream)
+    cms.get_top_k()  # [(item, estimate), ...] largest first
+"""
+
+
+class TopKTracker:
+    """
+    Indexed min-heap of at most `capacity` (estimate, item) candidates.
+    """
+    def __init__(self, capacity):
+        if capacity <= 0:
+            raise ValueError("Top-k capacity must be positive.")
+        self.capacity = capacity
+        self._heap = []  # [estimate, item] pairs, smallest estimate at the root
+        self._position = {}  # item -> index in _heap
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __contains__(self, item):
+        return item in self._position
+
+    def update(self, item, estimate):
+        """
+        Set the estimate of `item`, adding it if it belongs to the current top k.
+        """
+        index = self._position.get(item)
+        if index is not None:
+            old = self._heap[index][0]
+            self._heap[index][0] = estimate
+            if estimate < old:
+                self._sift_up(index)
+            else:
+                self._sift_down(index)
+        elif len(self._heap) < self.capacity:
+            self._heap.append([estimate, item])
+            self._position[item] = len(self._heap) - 1
+            self._sift_up(len(self._heap) - 1)
+        elif estimate > self._heap[0][0]:
+            del self._position[self._heap[0][1]]
+            self._heap[0] = [estimate, item]
+            self._position[item] = 0
+            self._sift_down(0)
+
+    def min_estimate(self):
+        """
+        Return the smallest candidate estimate, or None when there are no candidates.
+        """
+        return self._heap[0][0] if self._heap else None
+
+    def items(self):
+        """
+        Return the candidates as (item, estimate) pairs, in heap order. Costs O(k).
+        """
+        return [(item, estimate) for estimate, item in self._heap]
+
+    def top_k(self):
+        """
+        Return the candidates as (item, estimate) pairs, largest estimate first.
+        """
+        return sorted(self.items(), key=lambda pair: pair[1], reverse=True)
+
+    def reset(self):
+        self._heap = []
+        self._position = {}
+
+    def _swap(self, i, j):
+        heap = self._heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self._position[heap[i][1]] = i
+        self._position[heap[j][1]] = j
+
+    def _sift_up(self, index):
+        while index > 0:
+            parent = (index - 1) // 2
+            if self._heap[parent][0] <= self._heap[index][0]:
+                break
+            self._swap(index, parent)
+            index = parent
+
+    def _sift_down(self, index):
+        size = len(self._heap)
+        while True:
+            smallest = index
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < size and self._heap[child][0] < self._heap[smallest][0]:
+                    smallest = child
+            if smallest == index:
+                break
+            self._swap(index, smallest)
+            index = smallest
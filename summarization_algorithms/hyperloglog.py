@@ -0,0 +1,207 @@
+"""
+hyperloglog.py
+HyperLogLog distinct-count estimator kept next to a sketch.
+
+A sketch created with `distinct_precision=p` feeds the 64-bit key of every added item
+(the same key its hash family derives the row indices from, see hash_family.py) to a
+HyperLogLog with 2^p registers, so the number of distinct keys can be estimated without
+keeping the exact key set.
+
+At low cardinality the registers are mostly empty, so the estimator starts sparse, in the
+style of HyperLogLog++: it keeps (index, rank) pairs at a higher precision of
+SPARSE_PRECISION bits, which costs a few bytes per distinct key and is estimated by linear
+counting. Once the pairs would take more memory than the 2^p one-byte dense registers, they
+are folded into the dense array.
+
+Usage:
+    cms = CountMinSketch(width=10000, depth=5, hash_family=DoubleHashFamily(), distinct_precision=14)
+    cms.add_many(stream)
+    cms.distinct_count()
+"""
+import numpy as np
+from summarization_algorithms.hash_family import _mix64
+
+SPARSE_PRECISION = 25
+SPARSE_ENTRY_BYTES = 5  # uint32 index + uint8 rank
+
+
+def _bit_length(x):
+    """
+    Return the bit length of every value of a uint64 array.
+    """
+    x = x.copy()
+    length = np.zeros(x.shape, dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        high = x >= np.uint64(1 << shift)
+        length += high * shift
+        x = np.where(high, x >> np.uint64(shift), x)
+    return length + (x > 0)
+
+
+def _rank(rest, bits):
+    """
+    Return the position of the leftmost 1-bit in the `bits`-bit values `rest` (bits + 1 for zero).
+    """
+    return (bits + 1 - _bit_length(rest)).astype(np.uint8)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog with 2^precision registers and a sparse representation at low cardinality.
+    """
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("HyperLogLog precision must be between 4 and 18.")
+        self.precision = precision
+        self.registers = None  # dense uint8 registers, allocated when the sparse pairs grow too large
+        self._sparse_index = None  # sorted sparse indices with the largest rank of each
+        self._sparse_rank = None
+        self._pending = []  # batches of sparse pairs not yet folded into the sorted arrays
+        self._pending_size = 0
+        self._clear_sparse()
+
+    @property
+    def m(self):
+        return 1 << self.precision
+
+    @property
+    def is_sparse(self):
+        return self.registers is None
+
+    def add_keys(self, keys):
+        """
+        Count a batch of 64-bit keys (a uint64 array). Keys are mixed before use, so raw
+        integer keys are fine.
+        """
+        hashes = _mix64(np.asarray(keys, dtype=np.uint64))
+        if self.is_sparse:
+            shift = np.uint64(64 - SPARSE_PRECISION)
+            index = (hashes >> shift).astype(np.uint32)
+            rank = _rank(hashes & np.uint64((1 << (64 - SPARSE_PRECISION)) - 1), 64 - SPARSE_PRECISION)
+            self._pending.append((index, rank))
+            self._pending_size += len(index)
+            if self._pending_size >= max(1024, len(self._sparse_index)):
+                self._flush()
+            return
+        shift = np.uint64(64 - self.precision)
+        index = (hashes >> shift).astype(np.intp)
+        rank = _rank(hashes & np.uint64((1 << (64 - self.precision)) - 1), 64 - self.precision)
+        np.maximum.at(self.registers, index, rank)
+
+    def _sparse_pairs(self):
+        """
+        Return all sparse pairs, sorted and pending, as (index, rank) arrays with repeats.
+        """
+        index = np.concatenate([self._sparse_index] + [part[0] for part in self._pending])
+        rank = np.concatenate([self._sparse_rank] + [part[1] for part in self._pending])
+        return index, rank
+
+    def _clear_sparse(self):
+        self._sparse_index = np.empty(0, dtype=np.uint32)
+        self._sparse_rank = np.empty(0, dtype=np.uint8)
+        self._pending, self._pending_size = [], 0
+
+    def _flush(self):
+        """
+        Fold the pending pairs into the sorted sparse arrays, keeping the largest rank per
+        index, and switch to dense registers once the pairs outgrow them.
+        """
+        if not self._pending:
+            return
+        index, rank = self._sparse_pairs()
+        self._pending, self._pending_size = [], 0
+        if not len(index):
+            return
+        order = np.lexsort((rank, index))
+        index, rank = index[order], rank[order]
+        last = np.append(index[1:] != index[:-1], True)
+        self._sparse_index, self._sparse_rank = index[last], rank[last]
+        if len(self._sparse_index) * SPARSE_ENTRY_BYTES > self.m:
+            self._to_dense()
+
+    def _to_dense(self):
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+        self._fold(*self._sparse_pairs())
+        self._clear_sparse()
+
+    def _fold(self, index, rank):
+        """
+        Fold sparse pairs into the dense registers. A sparse index holds SPARSE_PRECISION -
+        precision more hash bits than a register index; when they are all zero the register
+        rank continues into the sparse rank.
+        """
+        extra = SPARSE_PRECISION - self.precision
+        low = (index & np.uint32((1 << extra) - 1)).astype(np.uint64)
+        rank = np.where(low > 0, _rank(low, extra), extra + rank.astype(np.int64)).astype(np.uint8)
+        np.maximum.at(self.registers, (index >> np.uint32(extra)).astype(np.intp), rank)
+
+    def estimate(self):
+        """
+        Return the estimated number of distinct keys.
+        """
+        if self.is_sparse:
+            self._flush()
+        if self.is_sparse:
+            m = 1 << SPARSE_PRECISION
+            return m * np.log(m / (m - len(self._sparse_index)))
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.ldexp(1.0, -self.registers.astype(np.int64)).sum()
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * np.log(m / zeros)
+        return float(raw)
+
+    def merge(self, other):
+        """
+        Add the keys counted by `other` (same precision) to this estimator. Returns self.
+        """
+        if self.precision != other.precision:
+            raise ValueError(f"HyperLogLog precisions differ: {self.precision} vs {other.precision}.")
+        if other.is_sparse:
+            index, rank = other._sparse_pairs()
+            if self.is_sparse:
+                self._pending.append((index, rank))
+                self._pending_size += len(index)
+                self._flush()
+            else:
+                self._fold(index, rank)
+            return self
+        if self.is_sparse:
+            self._to_dense()
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def reset(self):
+        self.registers = None
+        self._clear_sparse()
+
+    def state_arrays(self):
+        """
+        Return the arrays that make up the estimator, by name: the dense registers, or the
+        sorted sparse pairs while the estimator is sparse.
+        """
+        self._flush()
+        if self.is_sparse:
+            return {"sparse_index": self._sparse_index, "sparse_rank": self._sparse_rank}
+        return {"registers": self.registers}
+
+    def restore_state(self, arrays):
+        """
+        Restore the arrays returned by `state_arrays`.
+        """
+        self.reset()
+        if "registers" in arrays:
+            self.registers = np.array(arrays["registers"], dtype=np.uint8)
+        else:
+            self._sparse_index = np.array(arrays["sparse_index"], dtype=np.uint32)
+            self._sparse_rank = np.array(arrays["sparse_rank"], dtype=np.uint8)
+
+    def get_memory_usage(self):
+        """
+        Return the number of bytes held by the registers or the sparse pairs.
+        """
+        if not self.is_sparse:
+            return self.registers.nbytes
+        return (self._sparse_index.nbytes + self._sparse_rank.nbytes
+                + sum(index.nbytes + rank.nbytes for index, rank in self._pending))
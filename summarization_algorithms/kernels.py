@@ -0,0 +1,503 @@
+"""
+kernels.py
+Interchangeable implementations of the sketches' hot loops.
+
+Conservative update and the sliding-window scan are sequential per item, so numpy can only
+vectorize them across rows and the loop over items stays in the interpreter. This module
+gathers those loops, and the other per-item kernels, behind one interface with three
+backends:
+    - "python": plain loops. Slow; the reference the other backends are checked against.
+    - "numpy": vectorized across rows or items where the kernel allows it.
+    - "numba": the plain loops compiled with numba's JIT. Only available when numba is
+      installed.
+
+Every backend gives bit-identical results; `check_kernels` runs them on random inputs and
+compares. Kernels work in place on int64 counter arrays; sketches with narrower counters
+run them on an int64 copy and write it back with their overflow handling. The sliding
+kernel is the exception: it touches only the scanned and the incremented cells, so it
+works on the counters of any integer dtype directly and saturates at `max_value`.
+
+Kernels:
+    multiply_shift_indices(keys, a, b, width) -> (depth, n) row indices
+    double_hash_indices(keys, depth, width) -> (depth, n) row indices
+    add(counters, rows, cols, deltas): counters[rows[k], cols[k]] += deltas[k]
+    conservative_add(counters, indices, counts): conservative update of each item in order
+    min_query(counters, indices) -> (n,) minimum over the rows
+    median_query(counters, indices, signs) -> (n,) float64 median of the signed counters
+    sliding_add(counters, row_nonzero, indices, counts, total, window_size, max_value): add
+        items to a (depth, width, 2) sliding-window sketch, scanning m / window_size counters
+        per arrival; counters stop growing at max_value
+
+Usage:
+    kernels = get_kernels()          # numba if installed and verified, else numpy
+    kernels = get_kernels("python")
+"""
+import functools
+import warnings
+import numpy as np
+from summarization_algorithms.hash_family import _mix64
+
+MASK64 = (1 << 64) - 1
+
+AUTO = "auto"
+
+# Counts above which the numba sliding kernel hands a batch to the numpy closed form.
+LARGE_COUNT = 64
+
+
+class Kernels:
+    """
+    A named set of kernel functions.
+    """
+    def __init__(self, name, **functions):
+        self.name = name
+        self.functions = functions
+        for kernel, function in functions.items():
+            setattr(self, kernel, function)
+
+    def __repr__(self):
+        return f"Kernels({self.name!r})"
+
+    def __reduce__(self):
+        # Copies and pickles look the backend up again, so compiled functions are never pickled.
+        return get_kernels, (self.name,)
+
+
+# --- python -----------------------------------------------------------------------------
+
+def _py_multiply_shift_indices(keys, a, b, width):
+    indices = np.empty((len(a), len(keys)), dtype=np.intp)
+    for j, x in enumerate(keys.tolist()):
+        for i, (a_i, b_i) in enumerate(zip(a.tolist(), b.tolist())):
+            indices[i, j] = ((((a_i * x + b_i) & MASK64) >> 32) * width) >> 32
+    return indices
+
+
+def _py_double_hash_indices(keys, depth, width):
+    indices = np.empty((depth, len(keys)), dtype=np.intp)
+    h2s = (_mix64(keys) | np.uint64(1)).tolist()
+    for j, (h1, h2) in enumerate(zip(keys.tolist(), h2s)):
+        for i in range(depth):
+            indices[i, j] = ((h1 + i * h2) & MASK64) % width
+    return indices
+
+
+def _py_add(counters, rows, cols, deltas):
+    for row, col, delta in zip(rows.tolist(), cols.tolist(), deltas.tolist()):
+        counters[row, col] += delta
+
+
+def _py_conservative_add(counters, indices, counts):
+    depth = counters.shape[0]
+    for j, count in enumerate(counts.tolist()):
+        cols = indices[:, j].tolist()
+        target = min(int(counters[i, cols[i]]) for i in range(depth)) + count
+        for i in range(depth):
+            if counters[i, cols[i]] < target:
+                counters[i, cols[i]] = target
+
+
+def _py_min_query(counters, indices):
+    depth, n = indices.shape
+    result = np.empty(n, dtype=counters.dtype)
+    for j in range(n):
+        result[j] = min(counters[i, indices[i, j]] for i in range(depth))
+    return result
+
+
+def _py_median_query(counters, indices, signs):
+    depth, n = indices.shape
+    result = np.empty(n, dtype=np.float64)
+    for j in range(n):
+        values = sorted(int(signs[i, j]) * int(counters[i, indices[i, j]]) for i in range(depth))
+        middle = depth // 2
+        result[j] = values[middle] if depth % 2 else (float(values[middle - 1]) + float(values[middle])) * 0.5
+    return result
+
+
+def _py_sliding_add(counters, row_nonzero, indices, counts, total, window_size, max_value):
+    depth, width = counters.shape[:2]
+    m = depth * width
+    flat = counters.reshape(m, 2)
+    t = total
+    for j, count in enumerate(counts.tolist()):
+        for _ in range(count):
+            for step in range(t * m // window_size, (t + 1) * m // window_size):
+                slot = step % m
+                was_occupied = flat[slot, 0] != 0 or flat[slot, 1] != 0
+                flat[slot, 1] = flat[slot, 0]
+                flat[slot, 0] = 0
+                if was_occupied and flat[slot, 1] == 0:
+                    row_nonzero[slot // width] -= 1
+            t += 1
+            for i in range(depth):
+                slot = i * width + indices[i, j]
+                if flat[slot, 0] == 0 and flat[slot, 1] == 0:
+                    row_nonzero[i] += 1
+                if flat[slot, 0] < max_value:
+                    flat[slot, 0] += 1
+
+
+# --- numpy ------------------------------------------------------------------------------
+
+def _np_multiply_shift_indices(keys, a, b, width):
+    rows = a[:, None] * keys[None, :] + b[:, None]
+    return (((rows >> np.uint64(32)) * np.uint64(width)) >> np.uint64(32)).astype(np.intp)
+
+
+def _np_double_hash_indices(keys, depth, width):
+    h2 = _mix64(keys) | np.uint64(1)
+    i = np.arange(depth, dtype=np.uint64)[:, None]
+    return ((keys[None, :] + i * h2[None, :]) % np.uint64(width)).astype(np.intp)
+
+
+def _np_add(counters, rows, cols, deltas):
+    np.add.at(counters, (rows, cols), deltas)
+
+
+def _np_conservative_add(counters, indices, counts):
+    rows = np.arange(counters.shape[0])
+    for cols, count in zip(indices.T, counts.tolist()):
+        current = counters[rows, cols]
+        counters[rows, cols] = np.maximum(current, current.min() + count)
+
+
+def _np_min_query(counters, indices):
+    return counters[np.arange(counters.shape[0])[:, None], indices].min(axis=0)
+
+
+def _np_median_query(counters, indices, signs):
+    return np.median(signs * counters[np.arange(counters.shape[0])[:, None], indices], axis=0)
+
+
+def _np_scan_slots(flat, row_nonzero, width, depth, start, stop):
+    """
+    Scan the absolute scan steps [start, stop) in one pass per sweep over the counters:
+    copy A[i][0] to A[i][1] and reset A[i][0] for every scanned counter.
+    """
+    m = len(flat)
+    for sweep_start in range(start, min(stop, start + 2 * m), m):
+        first = sweep_start % m
+        n = min(stop - sweep_start, m)
+        segments = [(first, min(first + n, m))]
+        if first + n > m:
+            segments.append((0, first + n - m))
+        for a, b in segments:
+            occupied_before = flat[a:b].any(axis=1)
+            flat[a:b, 1] = flat[a:b, 0]
+            flat[a:b, 0] = 0
+            delta = (flat[a:b, 1] != 0).astype(np.int64) - occupied_before
+            if a // width == (b - 1) // width:
+                row_nonzero[a // width] += int(delta.sum())
+            else:
+                row_nonzero += np.bincount(np.arange(a, b) // width, weights=delta,
+                                           minlength=depth).astype(np.int64)
+
+
+def _np_sliding_add(counters, row_nonzero, indices, counts, total, window_size, max_value):
+    """
+    Add each item in closed form, in time independent of its count: scan the slots its
+    arrivals pass in one step, then replay its own cells. The cells of an item are computed
+    in int64 and saturated at `max_value`, which gives the same values as saturating
+    every increment.
+    """
+    depth, width = counters.shape[:2]
+    m = depth * width
+    flat = counters.reshape(m, 2)
+    rows = np.arange(depth)
+    t = total
+    for cols, count in zip(indices.T, counts.tolist()):
+        if count <= 0:
+            continue
+        start, stop = t * m // window_size, (t + count) * m // window_size
+        before = counters[rows, cols].astype(np.int64)
+        _np_scan_slots(flat, row_nonzero, width, depth, start, stop)
+        # The scan before arrival k moves the increments of arrivals before k to A[i][1];
+        # arrivals k..count stay in A[i][0].
+        values = before.copy()
+        values[:, 0] += count
+        slots = rows * width + cols
+        last = stop - 1 - (stop - 1 - slots) % m
+        for i in (np.flatnonzero(last >= start) if stop > start else ()):
+            k_last = -(-(last[i] + 1) * window_size // m) - t
+            previous = last[i] - m
+            if previous >= start:
+                values[i, 1] = k_last - (-(-(previous + 1) * window_size // m) - t)
+            else:
+                values[i, 1] = before[i, 0] + k_last - 1
+            values[i, 0] = count - k_last + 1
+        np.minimum(values, max_value, out=values)
+        row_nonzero += values.any(axis=1).astype(np.int64) - counters[rows, cols].any(axis=1)
+        counters[rows, cols] = values
+        t += count
+
+
+PYTHON_KERNELS = Kernels(
+    "python",
+    multiply_shift_indices=_py_multiply_shift_indices,
+    double_hash_indices=_py_double_hash_indices,
+    add=_py_add,
+    conservative_add=_py_conservative_add,
+    min_query=_py_min_query,
+    median_query=_py_median_query,
+    sliding_add=_py_sliding_add,
+)
+
+NUMPY_KERNELS = Kernels(
+    "numpy",
+    multiply_shift_indices=_np_multiply_shift_indices,
+    double_hash_indices=_np_double_hash_indices,
+    add=_np_add,
+    conservative_add=_np_conservative_add,
+    min_query=_np_min_query,
+    median_query=_np_median_query,
+    sliding_add=_np_sliding_add,
+)
+
+
+# --- numba ------------------------------------------------------------------------------
+
+def _make_numba_kernels():
+    """
+    Compile the loops with numba. Raises ImportError when numba is not installed.
+    """
+    import numba
+
+    jit = functools.partial(numba.njit, cache=True, nogil=True)
+    one, shift32 = np.uint64(1), np.uint64(32)
+
+    @jit
+    def mix64(z):
+        z = z + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+    @jit
+    def multiply_shift_indices(keys, a, b, width):
+        depth, n = len(a), len(keys)
+        indices = np.empty((depth, n), dtype=np.intp)
+        w = np.uint64(width)
+        for j in range(n):
+            for i in range(depth):
+                indices[i, j] = (((a[i] * keys[j] + b[i]) >> shift32) * w) >> shift32
+        return indices
+
+    @jit
+    def double_hash_indices(keys, depth, width):
+        n = len(keys)
+        indices = np.empty((depth, n), dtype=np.intp)
+        w = np.uint64(width)
+        for j in range(n):
+            h1 = keys[j]
+            h2 = mix64(h1) | one
+            for i in range(depth):
+                indices[i, j] = (h1 + np.uint64(i) * h2) % w
+        return indices
+
+    @jit
+    def add(counters, rows, cols, deltas):
+        for k in range(len(rows)):
+            counters[rows[k], cols[k]] += deltas[k]
+
+    @jit
+    def conservative_add(counters, indices, counts):
+        depth, n = indices.shape
+        for j in range(n):
+            target = counters[0, indices[0, j]]
+            for i in range(1, depth):
+                target = min(target, counters[i, indices[i, j]])
+            target += counts[j]
+            for i in range(depth):
+                if counters[i, indices[i, j]] < target:
+                    counters[i, indices[i, j]] = target
+
+    @jit
+    def min_query(counters, indices):
+        depth, n = indices.shape
+        result = np.empty(n, dtype=counters.dtype)
+        for j in range(n):
+            value = counters[0, indices[0, j]]
+            for i in range(1, depth):
+                value = min(value, counters[i, indices[i, j]])
+            result[j] = value
+        return result
+
+    @jit
+    def median_query(counters, indices, signs):
+        depth, n = indices.shape
+        result = np.empty(n, dtype=np.float64)
+        values = np.empty(depth, dtype=np.int64)
+        middle = depth // 2
+        for j in range(n):
+            for i in range(depth):
+                values[i] = signs[i, j] * counters[i, indices[i, j]]
+            values.sort()
+            if depth % 2:
+                result[j] = values[middle]
+            else:
+                result[j] = (np.float64(values[middle - 1]) + np.float64(values[middle])) * 0.5
+        return result
+
+    @jit
+    def sliding_add(counters, row_nonzero, indices, counts, total, window_size, max_value):
+        depth, width = counters.shape[0], counters.shape[1]
+        m = depth * width
+        flat = counters.reshape(m, 2)
+        t = total
+        for j in range(indices.shape[1]):
+            for _ in range(counts[j]):
+                for step in range(t * m // window_size, (t + 1) * m // window_size):
+                    slot = step % m
+                    was_occupied = flat[slot, 0] != 0 or flat[slot, 1] != 0
+                    flat[slot, 1] = flat[slot, 0]
+                    flat[slot, 0] = 0
+                    if was_occupied and flat[slot, 1] == 0:
+                        row_nonzero[slot // width] -= 1
+                t += 1
+                for i in range(depth):
+                    slot = i * width + indices[i, j]
+                    if flat[slot, 0] == 0 and flat[slot, 1] == 0:
+                        row_nonzero[i] += 1
+                    if flat[slot, 0] < max_value:
+                        flat[slot, 0] += 1
+
+    def numba_multiply_shift_indices(keys, a, b, width):
+        return multiply_shift_indices(np.ascontiguousarray(keys, dtype=np.uint64), a, b, width)
+
+    def numba_double_hash_indices(keys, depth, width):
+        return double_hash_indices(np.ascontiguousarray(keys, dtype=np.uint64), depth, width)
+
+    def numba_median_query(counters, indices, signs):
+        return median_query(counters, indices, np.asarray(signs, dtype=np.int64))
+
+    def numba_sliding_add(counters, row_nonzero, indices, counts, total, window_size, max_value):
+        # The compiled loop takes time proportional to the counts; large counts use the
+        # closed form of the numpy kernel, which does not.
+        if len(counts) and counts.max() > LARGE_COUNT:
+            return _np_sliding_add(counters, row_nonzero, indices, counts, total, window_size, max_value)
+        return sliding_add(counters, row_nonzero, indices, np.asarray(counts, dtype=np.int64), total, window_size,
+                           int(max_value))
+
+    return Kernels(
+        "numba",
+        multiply_shift_indices=numba_multiply_shift_indices,
+        double_hash_indices=numba_double_hash_indices,
+        add=add,
+        conservative_add=conservative_add,
+        min_query=min_query,
+        median_query=numba_median_query,
+        sliding_add=numba_sliding_add,
+    )
+
+
+# --- selection --------------------------------------------------------------------------
+
+def _random_case(rng, depth=4, width=16, n=300):
+    counters = rng.integers(0, 5, size=(depth, width), dtype=np.int64)
+    indices = rng.integers(0, width, size=(depth, n)).astype(np.intp)
+    counts = rng.integers(1, 4, size=n, dtype=np.int64)
+    return counters, indices, counts
+
+
+def check_kernels(kernels, reference=PYTHON_KERNELS, seed=0):
+    """
+    Run every kernel of `kernels` and of `reference` on the same random inputs and raise
+    AssertionError unless all results are bit-identical.
+    """
+    rng = np.random.default_rng(seed)
+
+    def same(name, *results):
+        first, second = results
+        if not (np.array_equal(first, second) and np.asarray(first).dtype == np.asarray(second).dtype):
+            raise AssertionError(f"{kernels.name} kernel '{name}' differs from {reference.name}.")
+
+    keys = rng.integers(0, 2 ** 64, size=200, dtype=np.uint64)
+    a, b = rng.integers(0, 2 ** 64, size=(2, 4), dtype=np.uint64)
+    a |= np.uint64(1)
+    same("multiply_shift_indices", kernels.multiply_shift_indices(keys, a, b, 1000),
+         reference.multiply_shift_indices(keys, a, b, 1000))
+    same("double_hash_indices", kernels.double_hash_indices(keys, 5, 1000),
+         reference.double_hash_indices(keys, 5, 1000))
+
+    for depth in (3, 4):
+        counters, indices, counts = _random_case(rng, depth=depth)
+        rows = np.repeat(np.arange(depth), indices.shape[1])
+        signs = 1 - 2 * rng.integers(0, 2, size=indices.shape, dtype=np.int64)
+        results = []
+        for candidate in (kernels, reference):
+            added, conservative = counters.copy(), counters.copy()
+            candidate.add(added, rows, indices.ravel(), np.tile(counts, depth) * signs.ravel())
+            candidate.conservative_add(conservative, indices, counts)
+            results.append((added, conservative, candidate.min_query(counters, indices),
+                            candidate.median_query(counters, indices, signs)))
+        for name, first, second in zip(("add", "conservative_add", "min_query", "median_query"), *results):
+            same(name, first, second)
+
+    for window_size, dtype in ((7, np.int64), (64, np.int64), (500, np.int64), (500, np.uint8)):
+        counters, indices, counts = _random_case(rng, depth=3, width=8, n=200)
+        counters = np.stack([counters[:, :8], np.zeros((3, 8), dtype=np.int64)], axis=2).astype(dtype)
+        max_value = 20 if dtype == np.uint8 else np.iinfo(dtype).max
+        results = []
+        for candidate in (kernels, reference):
+            sliding = counters.copy()
+            row_nonzero = np.count_nonzero(sliding.any(axis=2), axis=1).astype(np.int64)
+            candidate.sliding_add(sliding, row_nonzero, indices, counts, 11, window_size, max_value)
+            results.append((sliding, row_nonzero))
+        same("sliding_add", results[0][0], results[1][0])
+        same("sliding_add row occupancy", results[0][1], results[1][1])
+
+
+@functools.lru_cache(maxsize=None)
+def _numba_kernels():
+    """
+    Return the verified numba kernels, or None when numba is missing or they fail the check.
+    """
+    try:
+        kernels = _make_numba_kernels()
+        check_kernels(kernels)
+    except ImportError:
+        return None
+    except Exception as error:
+        warnings.warn(f"numba kernels disabled, using numpy: {error}")
+        return None
+    return kernels
+
+
+KERNEL_BACKENDS = ("python", "numpy", "numba")
+
+_default = AUTO
+
+
+def set_default_kernels(name):
+    """
+    Set the backend used by sketches and hash families that do not ask for one.
+    """
+    global _default
+    if name != AUTO and name not in KERNEL_BACKENDS:
+        raise ValueError(f"Unknown kernel backend: {name}")
+    _default = name
+
+
+def get_kernels(name=None):
+    """
+    Return the kernels of backend `name` ("python", "numpy", "numba" or "auto"; None means
+    the default set with `set_default_kernels`). "auto" picks numba when it is installed
+    and passes `check_kernels`, numpy otherwise. Asking for numba without it falls back
+    to numpy with a warning.
+    """
+    if isinstance(name, Kernels):
+        return name
+    name = _default if name is None else name
+    if name == "python":
+        return PYTHON_KERNELS
+    if name == "numpy":
+        return NUMPY_KERNELS
+    if name not in (AUTO, "numba"):
+        raise ValueError(f"Unknown kernel backend: {name}")
+    kernels = _numba_kernels()
+    if kernels is None:
+        if name == "numba":
+            warnings.warn("numba is not available; using the numpy kernels.")
+        return NUMPY_KERNELS
+    return kernels
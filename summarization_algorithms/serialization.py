@@ -0,0 +1,210 @@
+"""
+serialization.py
+Versioned binary snapshot format for sketches.
+
+File layout:
+    magic "CMSK" (4s) | version (H) | reserved (H) | header length (I) | JSON header | arrays
+
+The JSON header holds the algorithm, width, depth, counter dtype, hash family and seed,
+totalCount, the distinct-count precision, the top-k capacity and candidates (items tagged
+with their type: str, bytes, int or float), any extra scalar state of the sketch and, for
+every stored array, its dtype, shape, offset and size. The HyperLogLog of a sketch that
+counts distinct items is stored as arrays named "distinct_*", always read into memory. Besides the state arrays, a sketch stores small summaries derived
+from them (per-row occupancy, row sums), flagged "summary" in the header, so loading does
+not have to scan the counters to rebuild them; files without them are still read and the
+summaries recomputed. Arrays are stored raw, in C order, starting on 64-byte boundaries,
+so an uncompressed file is opened with `np.memmap` and only the pages that are touched
+are read. With `compression="zlib"` or `"zstd"` (needs the `zstandard` package) every
+array is compressed separately and decompressed into memory on load.
+
+Usage:
+    cms.save("cms.sketch")
+    cms = CountMinSketch.load("cms.sketch")
+"""
+import base64
+import importlib
+import json
+import struct
+import zlib
+import numbers
+import numpy as np
+from summarization_algorithms.hash_family import get_hash_family
+
+MAGIC = b"CMSK"
+DISTINCT_PREFIX = "distinct_"
+VERSION = 1
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<4sHHI")
+
+SKETCH_MODULES = {
+    "CountMinSketch": "summarization_algorithms.count_min_sketch",
+    "ConservativeCountMinSketch": "summarization_algorithms.conservative_count_min_sketch",
+    "CountMeanMinSketch": "summarization_algorithms.count_mean_min_sketch",
+    "CountSketch": "summarization_algorithms.count_sketch",
+    "SlidingCountMinSketch": "summarization_algorithms.sliding_count_min_sketch",
+    "ExpCountMinSketch": "summarization_algorithms.exp_count_min_sketch",
+    "ForwardDecayCountMinSketch": "summarization_algorithms.forward_decay_count_min_sketch",
+    "DyadicCountMinSketch": "summarization_algorithms.dyadic_count_min_sketch",
+}
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _compressor(compression):
+    if compression is None:
+        return None, None
+    if compression == "zlib":
+        return zlib.compress, zlib.decompress
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd compression needs the 'zstandard' package.")
+        return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+    raise ValueError(f"Unknown compression: {compression}")
+
+
+def _encode_item(item):
+    """
+    Return a heavy-hitter candidate as a JSON-serializable [type, value] pair.
+    """
+    if isinstance(item, str):
+        return ["str", item]
+    if isinstance(item, bytes):
+        return ["bytes", base64.b64encode(item).decode("ascii")]
+    if isinstance(item, numbers.Integral) and not isinstance(item, bool):
+        return ["int", int(item)]
+    if isinstance(item, numbers.Real) and not isinstance(item, bool):
+        return ["float", float(item)]
+    raise ValueError(f"Cannot save heavy-hitter candidates of type {type(item).__name__}.")
+
+
+def _decode_item(pair):
+    kind, value = pair
+    if kind == "bytes":
+        return base64.b64decode(value)
+    return {"str": str, "int": int, "float": float}[kind](value)
+
+
+def _encode_estimate(estimate):
+    return int(estimate) if isinstance(estimate, numbers.Integral) else float(estimate)
+
+
+def save_sketch(sketch, path, compression=None):
+    """
+    Write `sketch` to `path`, optionally compressing the arrays ("zlib" or "zstd").
+    """
+    compress, _ = _compressor(compression)
+    arrays = sketch._state_arrays()
+    summaries = sketch._summary_arrays()
+    distinct = {}
+    if sketch.distinct is not None:
+        distinct = {DISTINCT_PREFIX + name: array for name, array in sketch.distinct.state_arrays().items()}
+    arrays = dict(arrays, **summaries, **distinct)
+    payloads = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    if compress is not None:
+        payloads = {name: compress(array.tobytes()) for name, array in payloads.items()}
+
+    header = {
+        "algorithm": sketch.__class__.__name__,
+        "width": sketch.width,
+        "depth": sketch.depth,
+        "counter_dtype": sketch.counter_dtype.str,
+        "overflow": sketch.overflow,
+        "hash_family": sketch.hash_family.name,
+        "hash_seed": sketch.hash_family.seed,
+        "total_count": int(sketch.totalCount),
+        "distinct_precision": sketch.distinct.precision if sketch.distinct is not None else 0,
+        "top_k": sketch.heavy_hitters.capacity if sketch.heavy_hitters is not None else 0,
+        "heavy_hitters": [[_encode_item(item), _encode_estimate(estimate)]
+                          for item, estimate in sketch.heavy_hitters.items()] if sketch.heavy_hitters is not None else [],
+        "state": sketch._state_scalars(),
+        "compression": compression,
+        "arrays": [],
+    }
+    for name, array in arrays.items():
+        header["arrays"].append({"name": name, "dtype": array.dtype.str, "shape": list(array.shape),
+                                 "offset": 0, "nbytes": len(payloads[name]) if compress else array.nbytes,
+                                 "summary": name in summaries})
+
+    # Array offsets are written in the header, so its length depends on them: move the
+    # data start forward until the header fits in front of it.
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = _align(_PREAMBLE.size + len(header_bytes))
+    while True:
+        offset = data_start
+        for entry in header["arrays"]:
+            entry["offset"] = offset
+            offset = _align(offset + entry["nbytes"])
+        header_bytes = json.dumps(header).encode("utf-8")
+        if _PREAMBLE.size + len(header_bytes) <= data_start:
+            break
+        data_start = _align(_PREAMBLE.size + len(header_bytes))
+
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, VERSION, 0, len(header_bytes)))
+        f.write(header_bytes)
+        for entry in header["arrays"]:
+            f.write(bytes(entry["offset"] - f.tell()))
+            f.write(payloads[entry["name"]])
+
+
+def read_header(path):
+    """
+    Return the JSON header of a sketch file.
+    """
+    with open(path, "rb") as f:
+        magic, version, _, header_length = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"'{path}' is not a sketch file.")
+        if version != VERSION:
+            raise ValueError(f"Unsupported sketch file version {version} in '{path}'.")
+        return json.loads(f.read(header_length).decode("utf-8"))
+
+
+def load_sketch(path, mmap_mode="c"):
+    """
+    Load a sketch written by `save_sketch`.
+
+    Args:
+        path: File to read.
+        mmap_mode: np.memmap mode for uncompressed arrays: "c" (copy-on-write, the default;
+            updates stay in memory), "r" (read-only), "r+" (updates go to the file), or None
+            to read the arrays into memory.
+    """
+    header = read_header(path)
+    module = importlib.import_module(SKETCH_MODULES[header["algorithm"]])
+    sketch_class = getattr(module, header["algorithm"])
+    sketch = sketch_class(width=header["width"], depth=header["depth"],
+                          hash_family=get_hash_family(header["hash_family"], header["hash_seed"]),
+                          counter_dtype=header["counter_dtype"], overflow=header["overflow"],
+                          distinct_precision=header.get("distinct_precision", 0), top_k=header.get("top_k", 0))
+
+    _, decompress = _compressor(header["compression"])
+    arrays = {}
+    for entry in header["arrays"]:
+        dtype, shape = np.dtype(entry["dtype"]), tuple(entry["shape"])
+        if decompress is not None:
+            with open(path, "rb") as f:
+                f.seek(entry["offset"])
+                data = decompress(f.read(entry["nbytes"]))
+            arrays[entry["name"]] = np.frombuffer(data, dtype=dtype).reshape(shape).copy()
+        elif mmap_mode is None or entry.get("summary") or entry["name"].startswith(DISTINCT_PREFIX):
+            # Summaries and the HyperLogLog are small and updated in place, so they are
+            # always read into memory.
+            arrays[entry["name"]] = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)),
+                                                offset=entry["offset"]).reshape(shape)
+        else:
+            arrays[entry["name"]] = np.memmap(path, dtype=dtype, mode=mmap_mode, offset=entry["offset"], shape=shape)
+
+    distinct = {name[len(DISTINCT_PREFIX):]: arrays.pop(name) for name in list(arrays)
+                if name.startswith(DISTINCT_PREFIX)}
+    sketch._restore_state(arrays, header["state"])
+    if sketch.distinct is not None:
+        sketch.distinct.restore_state(distinct)
+    for item, estimate in header.get("heavy_hitters", []):
+        sketch.heavy_hitters.update(_decode_item(item), estimate)
+    sketch.totalCount = header["total_count"]
+    return sketch
@@ -0,0 +1,157 @@
+"""
+shared_counters.py
+Counter arrays allocated in `multiprocessing.shared_memory`.
+
+A sketch created with `shared_memory=True` (or a segment name) keeps its counters in a
+shared memory segment laid out as a 64-byte header followed by the raw counter array.
+Other processes (evaluators, the dashboard, a query server) attach read-only by name and
+get a numpy view of the live counters without copying or serializing anything.
+
+Header layout (little endian):
+    magic (4s) | version (H) | ndim (H) | dtype (8s) | shape (3Q) | totalCount (q) | sequence (Q)
+
+The sequence number is a seqlock: every update of the sketch (its counter writes and its
+new totalCount) runs in one write section, which makes the sequence odd before the first
+write and even again after the last. The counters themselves are not locked; `read`
+copies the counters and totalCount and retries while the sequence is odd or has changed,
+so it never returns a half-applied update.
+
+Usage:
+    reader = SharedCounters.attach(cms.shared_memory_name)
+    counters, total_count = reader.read()
+    reader.close()
+"""
+import secrets
+import struct
+import time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+MAGIC = b"CMSH"
+VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<4sHH8s3QqQ")
+_STATE = struct.Struct("<qQ")
+_STATE_OFFSET = _HEADER.size - _STATE.size
+_TOTAL = struct.Struct("<q")
+_SEQUENCE = struct.Struct("<Q")
+_SEQUENCE_OFFSET = _STATE_OFFSET + _TOTAL.size
+
+
+class SharedCounters:
+    """
+    A counter array with a small header, stored in a shared memory segment.
+    The writer uses the object as a context manager around every update (a write section);
+    sections nest, and only the outermost one moves the sequence number.
+    """
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self.owner = owner
+        self._write_depth = 0
+        magic, version, ndim, dtype, d0, d1, d2, _, self._sequence = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Shared memory segment '{shm.name}' does not hold sketch counters.")
+        self.dtype = np.dtype(dtype.rstrip(b"\0").decode("ascii"))
+        self.shape = (d0, d1, d2)[:ndim]
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf, offset=HEADER_SIZE)
+        if not owner:
+            self.array.flags.writeable = False
+
+    @classmethod
+    def create(cls, shape, dtype, name=None):
+        """
+        Allocate a zeroed segment for a counter array of `shape` and `dtype`.
+        A random name is generated when `name` is None.
+        """
+        dtype = np.dtype(dtype)
+        name = name or f"cms_{secrets.token_hex(6)}"
+        size = HEADER_SIZE + int(np.prod(shape)) * dtype.itemsize
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        padded = tuple(shape) + (0,) * (3 - len(shape))
+        _HEADER.pack_into(shm.buf, 0, MAGIC, VERSION, len(shape), dtype.str.encode("ascii"), *padded, 0, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name):
+        """
+        Attach read-only to an existing segment.
+        The reader does not take ownership: the segment is not removed when it exits.
+        """
+        try:
+            shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 registers every attached segment with the resource tracker,
+            # which would remove it when the reader exits.
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args, **kwargs: None
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        return cls(shm, owner=False)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def depth(self):
+        return self.shape[0]
+
+    @property
+    def width(self):
+        return self.shape[1]
+
+    @property
+    def total_count(self):
+        return _STATE.unpack_from(self._shm.buf, _STATE_OFFSET)[0]
+
+    @property
+    def sequence(self):
+        return _STATE.unpack_from(self._shm.buf, _STATE_OFFSET)[1]
+
+    def __enter__(self):
+        if not self._write_depth:
+            self._sequence += 1
+            _SEQUENCE.pack_into(self._shm.buf, _SEQUENCE_OFFSET, self._sequence)
+        self._write_depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._write_depth -= 1
+        if not self._write_depth:
+            self._sequence += 1
+            _SEQUENCE.pack_into(self._shm.buf, _SEQUENCE_OFFSET, self._sequence)
+
+    def publish(self, total_count):
+        """
+        Write a new totalCount (writer only), in a write section of its own unless one is open.
+        """
+        with self:
+            _TOTAL.pack_into(self._shm.buf, _STATE_OFFSET, total_count)
+
+    def read(self):
+        """
+        Return a consistent copy of the counters and totalCount, retrying while the writer
+        is inside a write section or finished one during the copy.
+        """
+        while True:
+            sequence = self.sequence
+            if sequence % 2 == 0:
+                counters = self.array.copy()
+                total_count, after = _STATE.unpack_from(self._shm.buf, _STATE_OFFSET)
+                if after == sequence:
+                    return counters, total_count
+            time.sleep(0)
+
+    def close(self, unlink=None):
+        """
+        Detach from the segment. The owner also removes it unless `unlink` is False.
+        Views of `array` held elsewhere must be released first.
+        """
+        self.array = None
+        self._shm.close()
+        if unlink is None:
+            unlink = self.owner
+        if unlink:
+            self._shm.unlink()
@@ -0,0 +1,140 @@
+"""
+sizing.py
+Choose sketch dimensions from error bounds or from a memory budget.
+
+    - from_error_bounds(epsilon, delta, algorithm): width and depth from the classic
+      Count-Min bounds (see CountMinSketchBase.dimensions_for_error): with probability at
+      least 1 - delta every estimate is within epsilon * N of the true count.
+    - from_memory_budget(budget, algorithm, sample): the depth/width split that fits in
+      `budget` bytes and has the lowest average error on a calibration sample of the stream.
+      Every candidate depth gets the widest sketch that fits, is filled with the sample and
+      is scored against the exact counts of the sample.
+
+Both pick the narrowest counter dtype that can hold `stream_length` arrivals when it is
+given, which leaves more counters for the same budget.
+
+Usage:
+    cms = from_error_bounds(0.001, 0.01, "ConservativeCountMinSketch")
+    cms = from_memory_budget(1 << 20, "CountMinSketch", sample=first_items, stream_length=10 ** 7)
+"""
+import functools
+import importlib
+from collections import Counter
+import numpy as np
+from summarization_algorithms.serialization import SKETCH_MODULES
+
+DEFAULT_DEPTHS = range(1, 9)
+DEFAULT_SAMPLE_SIZE = 5000
+
+UNSIGNED_COUNTER_DTYPES = tuple(np.dtype(t) for t in (np.uint8, np.uint16, np.uint32, np.int64))
+SIGNED_COUNTER_DTYPES = tuple(np.dtype(t) for t in (np.int8, np.int16, np.int32, np.int64))
+
+
+def sketch_class(algorithm):
+    """
+    Return the sketch class registered under `algorithm`.
+    """
+    try:
+        module = importlib.import_module(SKETCH_MODULES[algorithm])
+    except KeyError:
+        raise ValueError(f"Unknown algorithm: {algorithm}")
+    return getattr(module, algorithm)
+
+
+def counter_dtype_for(stream_length, signed=False):
+    """
+    Return the narrowest counter dtype that can count `stream_length` arrivals
+    (int64 when the length is unknown).
+    """
+    if stream_length is None:
+        return np.dtype(np.int64)
+    for dtype in SIGNED_COUNTER_DTYPES if signed else UNSIGNED_COUNTER_DTYPES:
+        if np.iinfo(dtype).max >= stream_length:
+            return dtype
+    return np.dtype(np.int64)
+
+
+def from_error_bounds(epsilon, delta, algorithm="CountMinSketch", stream_length=None, **kwargs):
+    """
+    Build `algorithm` with the dimensions given by its error bounds (see
+    CountMinSketchBase.from_error_bounds). Other keyword arguments go to the constructor.
+    """
+    return sketch_class(algorithm).from_error_bounds(epsilon, delta, stream_length=stream_length, **kwargs)
+
+
+def default_sample(size=DEFAULT_SAMPLE_SIZE, seed=0):
+    """
+    Return a Zipf(1.3) integer sample, the shape of the synthetic stream, for calibrating
+    without a sample of the real stream.
+    """
+    return np.random.default_rng(seed).zipf(1.3, size=size).tolist()
+
+
+def _fitting_width(factory, depth, budget):
+    """
+    Return the largest width whose sketch built by `factory` fits in `budget` bytes, or 0.
+    Memory is assumed to grow linearly with the number of counters, as it does for every sketch.
+    """
+    probe_width = 64
+    probe = factory(probe_width, depth).get_memory_usage()
+    base = factory(1, depth).get_memory_usage()
+    per_column = max((probe - base) / (probe_width - 1), 1e-9)
+    width = int((budget - base) // per_column) + 1 if budget >= base else 0
+    while width > 0 and factory(width, depth).get_memory_usage() > budget:
+        width -= max(1, width // 100)
+    return max(width, 0)
+
+
+def calibrate_dimensions(budget, factory, sample=None, stream_length=None, depths=DEFAULT_DEPTHS):
+    """
+    Return (width, depth, error) of the sketch that fits in `budget` bytes with the lowest
+    average absolute error on `sample`; ties go to the shallower sketch, which is faster.
+
+    Args:
+        budget: Memory budget in bytes, as measured by `get_memory_usage`.
+        factory: Callable (width, depth) -> empty sketch.
+        sample: Items of the stream used for calibration (a synthetic Zipf sample by default).
+        stream_length: Expected length of the whole stream. When it is longer than the
+            sample, candidates are calibrated at a width scaled down by the same factor, so
+            each counter sees about as many arrivals as it will on the real stream.
+        depths: Candidate depths.
+
+    The error is measured against the exact counts of the whole sample, so for windowed
+    and decayed sketches the sample should be shorter than the window or half-life.
+    """
+    sample = list(sample) if sample is not None else default_sample()
+    if not sample:
+        raise ValueError("The calibration sample is empty.")
+    truth = Counter(sample)
+    items = list(truth)
+    exact = np.array([truth[item] for item in items], dtype=np.float64)
+    scale = len(sample) / stream_length if stream_length and stream_length > len(sample) else 1.0
+
+    best = None
+    for depth in depths:
+        width = _fitting_width(factory, depth, budget)
+        if width < 1:
+            continue
+        sketch = factory(max(1, int(width * scale)), depth)
+        sketch.add_many(sample)
+        error = float(np.abs(np.asarray(sketch.query_many(items), dtype=np.float64) - exact).mean())
+        sketch.close_shared_memory()
+        if best is None or error < best[2]:
+            best = (width, depth, error)
+    if best is None:
+        raise ValueError(f"A budget of {budget} bytes does not fit a single counter row.")
+    return best
+
+
+def from_memory_budget(budget, algorithm="CountMinSketch", sample=None, stream_length=None,
+                       depths=DEFAULT_DEPTHS, **kwargs):
+    """
+    Build the `algorithm` sketch that fits in `budget` bytes and has the lowest error on
+    the calibration `sample` (see `calibrate_dimensions`). The counter dtype is chosen from
+    `stream_length` unless given; other keyword arguments go to the constructor.
+    """
+    cls = sketch_class(algorithm)
+    kwargs.setdefault("counter_dtype", counter_dtype_for(stream_length, signed=cls.signed_counters))
+    factory = functools.partial(cls, **kwargs)
+    width, depth, _ = calibrate_dimensions(budget, factory, sample, stream_length, depths)
+    return factory(width, depth)
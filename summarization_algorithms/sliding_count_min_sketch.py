@@ -1,57 +1,68 @@
 import numpy as np
-import hashlib
-from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
+from summarization_algorithms.count_min_sketch_base import CountMinSketchBase, WIDER_DTYPES
 
 
 class SlidingCountMinSketch(CountMinSketchBase):
-    def __init__(self, width, depth):
-        super().__init__(width, depth)
+    def __init__(self, width, depth, window_size=None, **kwargs):
+        """
+        Initialize the sketch over a window of the last `window_size` arrivals
+        (defaults to width * depth). The scanner visits all width * depth counters once
+        per window, i.e. `scan_rate` counters per arrival.
+        """
+        super().__init__(width, depth, **kwargs)
         self.total_slots = width * depth  # m
-        self.window_size = self.total_slots  # N
-        self.mN = 1  # how many buckets scanned per arrival
-        self.counters = np.zeros((depth, width, 2), dtype=int)  # Two fields per counter: A[i][0] and A[i][1]
+        self.window_size = window_size or self.total_slots  # N
+        self.counters = self._allocate_counters((depth, width, 2))  # Two fields per counter: A[i][0] and A[i][1]
         self.scan_pointer = 0  # flat index in total_slots
 
-    def _hash(self, item, i):
+    @property
+    def scan_rate(self):
         """
-        Return the i-th hash value for an item using SHA-256.
+        Number of counters scanned per arrival (m / N, may be fractional).
         """
-        h = hashlib.sha256((str(item) + str(i)).encode('utf-8'))
-        return int(h.hexdigest(), 16) % self.width
+        return self.total_slots / self.window_size
 
-    def _scan_step(self):
+    def _scanned(self, t):
         """
-        Perform a scan step over the sliding window:
-        - Copy current counter (A[i][0]) to backup (A[i][1]).
-        - Reset current counter to 0.
-        - Advance scan pointer.
+        Return how many scan steps have been made after t arrivals: floor(t * m / N).
         """
-        for _ in range(self.mN):
-            d = self.scan_pointer // self.width
-            w = self.scan_pointer % self.width
-
-            # Scanning operation:
-            # - delete A[i][1] (just reset it)
-            # - copy A[i][0] to A[i][1]
-            # - set A[i][0] to 0
-
-            self.counters[d][w][1] = self.counters[d][w][0]
-            self.counters[d][w][0] = 0
+        return t * self.total_slots // self.window_size
 
-            self.scan_pointer = (self.scan_pointer + 1) % self.total_slots
+    def _add_batch(self, indices, counts):
+        """
+        Add items hashed to the (depth, n) `indices` in stream order, interleaved with the
+        scan, through the `sliding_add` kernel (see kernels.py). The kernel works on the
+        counters in place, whatever their dtype: narrow counters are widened first when the
+        batch could overflow them, or saturate in the kernel.
+        """
+        self._check_writable()
+        if self.counters.dtype != np.int64 and self.overflow == "widen" and indices.size:
+            # No cell can grow by more than the batch adds, nor start above its current value.
+            high = int(self.counters[np.arange(self.depth)[:, None], indices, 0].max()) + int(counts[counts > 0].sum())
+            while high > np.iinfo(self.counters.dtype).max and self.counters.dtype in WIDER_DTYPES:
+                self._widen_counters(WIDER_DTYPES[self.counters.dtype])
+        with self._write_section():
+            self.kernels.sliding_add(self.counters, self._row_nonzero, indices, counts, self.totalCount,
+                                     self.window_size, np.iinfo(self.counters.dtype).max)
+            self.totalCount += int(counts[counts > 0].sum())
+        self.scan_pointer = self._scanned(self.totalCount) % self.total_slots
 
     def add(self, item, count=1):
         """
         Add an item (possibly multiple times) to the sketch.
-        Advances the scan pointer before each insertion to maintain window.
-        """
-        for _ in range(count):
-            # Advance scan pointer before updating
-            self._scan_step()
-            for i in range(self.depth):
-                pos = self._hash(item, i)
-                self.counters[i][pos][0] += 1
-            self.totalCount += 1
+        The scan advances before each arrival to maintain the window.
+        """
+        indices = np.asarray(self._hash_update(item), dtype=np.intp).reshape(self.depth, 1)
+        self._add_batch(indices, np.array([count], dtype=np.int64))
+        self.update_heavy_hitters((item,))
+
+    def add_many(self, items, counts=None):
+        """
+        Add a batch of items in stream order, hashing the whole batch at once.
+        """
+        indices = self._hash_many_update(items)
+        self._add_batch(indices, self._batch_counts(counts, indices.shape[1]))
+        self.update_heavy_hitters(items)
 
     def query(self, item):
         """
@@ -59,25 +70,32 @@ class SlidingCountMinSketch(CountMinSketchBase):
         Combines both active and backup counters.
         """
         est = float('inf')
-        for i in range(self.depth):
-            pos = self._hash(item, i)
-            val = self.counters[i][pos][0] + self.counters[i][pos][1]
+        for i, pos in enumerate(self._hash(item)):
+            val = int(self.counters[i][pos][0]) + int(self.counters[i][pos][1])
             est = min(est, val)
         return est
 
+    def _cells_occupied(self, cells):
+        return self.counters[cells].any(axis=-1)
+
+    def _occupied_cells(self):
+        return self.counters.any(axis=2)
+
+    def _cell_values(self):
+        return self.counters.sum(axis=2)
+
+    def _state_scalars(self):
+        return {"scan_pointer": self.scan_pointer, "window_size": self.window_size}
+
     def reset(self):
         """Reset the sketch to an empty state."""
-        self.counters.fill(0)
-        self.scan_pointer = 0
-        self.totalCount = 0
+        with self._write_section():
+            self._clear_counters()
+            self.scan_pointer = 0
+            self.totalCount = 0
 
     def get_load_factor(self):
         """
         Return the load factor: maximum number of non-zero counters in any row, divided by width.
         """
-        max_nonzero = 0
-        for d in range(self.depth):
-            row = self.counters[d]
-            nonzero_count = sum(1 for cell in row if cell.any())
-            max_nonzero = max(max_nonzero, nonzero_count)
-        return max_nonzero / self.width
+        return int(self._row_nonzero.max()) / self.width
@@ -25,6 +25,7 @@ class TestAccuracyEvaluation(unittest.TestCase):
             return self.ground_truth.get(item, 0)
 
         mock_cms_perfect.query.side_effect = perfect_query_side_effect
+        mock_cms_perfect.query_many.side_effect = lambda items: [perfect_query_side_effect(item) for item in items]
 
         result = evaluate_accuracy(mock_cms_perfect, self.ground_truth)
 
@@ -49,6 +50,7 @@ class TestAccuracyEvaluation(unittest.TestCase):
             return cms_estimates.get(item, 0)
 
         mock_cms_small_overestimation.query.side_effect = small_overestimation_query_side_effect
+        mock_cms_small_overestimation.query_many.side_effect = lambda items: [small_overestimation_query_side_effect(item) for item in items]
 
         result = evaluate_accuracy(mock_cms_small_overestimation, self.ground_truth)
 
@@ -74,6 +76,7 @@ class TestAccuracyEvaluation(unittest.TestCase):
             return cms_estimates.get(item, 0)
 
         mock_cms_large_overestimation.query.side_effect = large_overestimation_query_side_effect
+        mock_cms_large_overestimation.query_many.side_effect = lambda items: [large_overestimation_query_side_effect(item) for item in items]
 
         result = evaluate_accuracy(mock_cms_large_overestimation, self.ground_truth)
 
@@ -83,6 +86,19 @@ class TestAccuracyEvaluation(unittest.TestCase):
         self.assertAlmostEqual(result['max_error_percentage'], 2/3*100, places=4)  # (cherry 66.6% error)
         self.assertEqual(result['exact_match_percentage'], 0)  # No exact matches
 
+    def test_accuracy_with_top_k(self):
+        """
+        Test the top-k precision and recall of the reported heavy hitters.
+        """
+        mock_cms = MagicMock()
+        mock_cms.query_many.side_effect = lambda items: [self.ground_truth[item] for item in items]
+        mock_cms.get_top_k.return_value = [('ginger', 40), ('banana', 20)]  # cherry is missed
+
+        result = evaluate_accuracy(mock_cms, self.ground_truth, top_k=2)
+
+        self.assertEqual(result['top_k_precision'], 0.5)  # ginger is in the top 2, banana is not
+        self.assertEqual(result['top_k_recall'], 0.5)
+
 
 if __name__ == '__main__':
     unittest.main()
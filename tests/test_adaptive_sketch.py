@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from collections import Counter
+import numpy as np
+from summarization_algorithms.adaptive_sketch import AdaptiveSketch
+from summarization_algorithms.count_min_sketch import CountMinSketch
+from summarization_algorithms.sliding_count_min_sketch import SlidingCountMinSketch
+
+
+class TestAdaptiveSketch(unittest.TestCase):
+    def setUp(self):
+        self.items = np.random.default_rng(17).zipf(1.3, size=4000).tolist()
+        self.truth = Counter(self.items)
+
+    def test_exact_until_budget(self):
+        """
+        Test that counts are exact before migration and match a plain sketch after it.
+        """
+        sketch = AdaptiveSketch(width=200, depth=3, max_distinct=100, memory_budget=10 ** 9)
+        reference = CountMinSketch(width=200, depth=3)
+        seen = Counter()
+        for item in self.items:
+            sketch.add(item)
+            reference.add(item)
+            seen[item] += 1
+            if len(seen) <= 100:
+                self.assertEqual(sketch.phase, "exact")
+                self.assertEqual(sketch.query(item), seen[item])
+        self.assertEqual(sketch.phase, "sketch")
+        np.testing.assert_array_equal(sketch.sketch.counters, reference.counters)
+        self.assertEqual(sketch.totalCount, len(self.items))
+
+    def test_batches_and_memory_budget(self):
+        """
+        Test that batches migrate once the exact counts outgrow the memory budget.
+        """
+        sketch = AdaptiveSketch(width=500, depth=2)
+        sketch.add_many(self.items[:20])
+        self.assertEqual(sketch.phase, "exact")
+        np.testing.assert_array_equal(sketch.query_many(self.items[:20]),
+                                      [Counter(self.items[:20])[item] for item in self.items[:20]])
+        self.assertLess(sketch.get_memory_usage(), 500 * 2 * 8)
+
+        sketch.add_many(self.items[20:])
+        self.assertEqual(sketch.phase, "sketch")
+        self.assertEqual(sketch.get_memory_usage(), 500 * 2 * 8)
+        reference = CountMinSketch(width=500, depth=2)
+        reference.add_many(self.items)
+        np.testing.assert_array_equal(sketch.sketch.counters, reference.counters)
+
+        sketch.reset()
+        self.assertEqual(sketch.phase, "exact")
+        self.assertEqual(sketch.query(self.items[0]), 0)
+
+    def test_merge_and_snapshot(self):
+        left = AdaptiveSketch(width=500, depth=3, max_distinct=1000, memory_budget=10 ** 9)
+        right = AdaptiveSketch(width=500, depth=3, max_distinct=1000, memory_budget=10 ** 9)
+        left.add_many(self.items[:100])
+        right.add_many(self.items[100:200])
+        snapshot = left.snapshot()
+        left.merge(right)
+        self.assertEqual(left.phase, "exact")
+        self.assertEqual(left.query(self.items[0]), Counter(self.items[:200])[self.items[0]])
+        self.assertEqual(snapshot.query(self.items[0]), Counter(self.items[:100])[self.items[0]])
+        with self.assertRaises(RuntimeError):
+            snapshot.add(1)
+
+        plain = CountMinSketch(width=500, depth=3)
+        plain.add_many(self.items[200:])
+        left.merge(plain)
+        self.assertEqual(left.phase, "sketch")
+        self.assertGreaterEqual(left.query(1), self.truth[1])
+
+    def test_save_in_both_phases(self):
+        """
+        Test that the exact phase saves the sketch it would migrate to, without migrating.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sketch.bin")
+            sketch = AdaptiveSketch(width=200, depth=3, max_distinct=100, memory_budget=10 ** 9)
+            reference = CountMinSketch(width=200, depth=3)
+            for part, phase in ((self.items[:50], "exact"), (self.items[50:], "sketch")):
+                sketch.add_many(part)
+                reference.add_many(part)
+                sketch.save(path)
+                loaded = CountMinSketch.load(path)
+                np.testing.assert_array_equal(loaded.counters, reference.counters)
+                self.assertEqual(loaded.totalCount, reference.totalCount)
+                self.assertEqual(sketch.phase, phase)
+
+    def test_rejects_order_dependent_sketch(self):
+        sketch = AdaptiveSketch(width=10, depth=2, max_distinct=1, memory_budget=10 ** 9,
+                                sketch_factory=lambda: SlidingCountMinSketch(width=10, depth=2))
+        sketch.add("a")
+        with self.assertRaises(ValueError):
+            sketch.add("b")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from collections import Counter
+from unittest import mock
+from input_stream.async_stream_simulator import AsyncStreamSimulator, parse_source
+from simulation import simulation
+from summarization_algorithms.count_min_sketch import CountMinSketch
+
+
+def produce(address, lines, family=socket.AF_INET):
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.connect(address)
+        connection.sendall(b"".join(line + b"\n" for line in lines))
+
+
+def produce_concurrently(address, producers, family=socket.AF_INET):
+    """
+    Send `producers` lists of tokens over as many concurrent connections.
+    """
+    threads = [threading.Thread(target=produce, args=(address, lines, family)) for lines in producers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def producer_tokens(count=5, length=3000):
+    return [[f"p{p}-{i % 97}".encode() for i in range(length)] for p in range(count)]
+
+
+def wait_until(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out waiting for the source.")
+        time.sleep(0.01)
+
+
+class TestAsyncStreamSimulator(unittest.TestCase):
+    def run_loopback(self, source, producers, family=socket.AF_INET, consume=None):
+        """
+        Start `source`, send `producers` over concurrent loopback connections from another
+        thread, stop the source once it has accepted them all and return the consumed tokens.
+        """
+        source.start()
+
+        def run_producers():
+            produce_concurrently(source.address, producers, family)
+            wait_until(lambda: source.connections == len(producers))
+            source.stop()
+
+        thread = threading.Thread(target=run_producers)
+        thread.start()
+        tokens = consume(source) if consume else [t for batch in source.simulate_batches() for t in batch.tolist()]
+        thread.join()
+        return tokens
+
+    def test_tcp_loopback(self):
+        producers = producer_tokens()
+        source = AsyncStreamSimulator("tcp://127.0.0.1:0", micro_batch_size=256)
+        tokens = self.run_loopback(source, producers)
+        self.assertEqual(Counter(tokens), Counter(t for lines in producers for t in lines))
+        stats = source.stream_stats()
+        self.assertEqual(stats["connections"], 5)
+        self.assertEqual(stats["received"], 15000)
+        self.assertEqual(stats["delivered"], 15000)
+        self.assertEqual(stats["dropped"], 0)
+        self.assertGreaterEqual(stats["max_lag"], stats["mean_lag"])
+
+    def test_backpressure_blocks_without_dropping(self):
+        """
+        Test that a slow consumer with a small buffer blocks the connections instead of losing items.
+        """
+        producers = producer_tokens(count=3, length=2000)
+        source = AsyncStreamSimulator("tcp://127.0.0.1:0", max_buffered_items=64, micro_batch_size=32)
+
+        def slow_consumer(source):
+            tokens = []
+            for batch in source.simulate_batches():
+                tokens.extend(batch.tolist())
+                time.sleep(0.0005)
+            return tokens
+
+        tokens = self.run_loopback(source, producers, consume=slow_consumer)
+        self.assertEqual(len(tokens), 6000)
+        stats = source.stream_stats()
+        self.assertGreater(stats["blocked"], 0)
+        self.assertEqual(stats["dropped"], 0)
+
+    def test_drop_policy(self):
+        producers = producer_tokens(count=2, length=5000)
+        source = AsyncStreamSimulator("tcp://127.0.0.1:0", max_buffered_items=100, micro_batch_size=50,
+                                      overflow="drop")
+        source.start()
+        produce_concurrently(source.address, producers)
+        wait_until(lambda: source.received == 10000)
+        source.stop()
+        tokens = [t for batch in source.simulate_batches() for t in batch.tolist()]
+        stats = source.stream_stats()
+        self.assertGreater(stats["dropped"], 0)
+        self.assertEqual(len(tokens) + stats["dropped"], 10000)
+        self.assertEqual(stats["blocked"], 0)
+
+    def test_tokens_split_across_reads(self):
+        source = AsyncStreamSimulator("tcp://127.0.0.1:0")
+        source.start()
+
+        def run_producer():
+            with socket.create_connection(source.address) as connection:
+                for part in (b"ab", b"c de", b"f\ng", b"h"):
+                    connection.sendall(part)
+                    time.sleep(0.02)
+            source.stop()
+
+        thread = threading.Thread(target=run_producer)
+        thread.start()
+        sketch = CountMinSketch(64, 3)
+        for batch in source.simulate_batches():
+            sketch.add_many(batch)
+        thread.join()
+        self.assertEqual(sketch.totalCount, 3)
+        self.assertEqual([sketch.query(token) for token in ("abc", "def", "gh")], [1, 1, 1])
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix domain sockets are not available")
+    def test_unix_socket(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stream.sock")
+            producers = producer_tokens(count=3, length=500)
+            source = AsyncStreamSimulator(f"unix://{path}")
+            tokens = self.run_loopback(source, producers, family=socket.AF_UNIX,
+                                       consume=lambda source: list(source.simulate_stream()))
+            self.assertEqual(Counter(tokens), Counter(t for lines in producers for t in lines))
+            self.assertFalse(os.path.exists(path))
+
+    @unittest.skipUnless(hasattr(os, "mkfifo"), "FIFOs are not available")
+    def test_fifo(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stream.fifo")
+            os.mkfifo(path)
+
+            def write():
+                with open(path, "wb") as fifo:
+                    for i in range(2000):
+                        fifo.write(b"%d\n" % (i % 10))
+
+            thread = threading.Thread(target=write)
+            thread.start()
+            tokens = list(AsyncStreamSimulator(f"fifo://{path}").simulate_stream())
+            thread.join()
+            self.assertEqual(Counter(tokens), Counter({b"%d" % i: 200 for i in range(10)}))
+
+    def test_stdin(self):
+        read_end, write_end = os.pipe()
+        with open(write_end, "wb") as pipe:
+            pipe.write(b"x y\nz\n")
+        stdin = io.TextIOWrapper(open(read_end, "rb"))
+        with mock.patch.object(sys, "stdin", stdin):
+            source = AsyncStreamSimulator("stdin")
+            self.assertEqual(list(source.simulate_stream()), [b"x", b"y", b"z"])
+        stdin.close()
+        self.assertEqual(source.stream_stats()["items"], 3)
+
+    def test_budget_calibration_does_not_open_source(self):
+        config = {"algorithm": "CountMinSketch", "memory_budget": 4096, "stream_source": "tcp://127.0.0.1:0"}
+        with mock.patch.object(simulation, "get_stream_simulator", side_effect=AssertionError("opened")):
+            width, depth = simulation.get_dimensions_for_budget(config, {})
+        self.assertLessEqual(width * depth * 8, 4096)
+
+    def test_parse_source(self):
+        self.assertEqual(parse_source("tcp://localhost:9000"), ("tcp", ("localhost", 9000)))
+        self.assertEqual(parse_source("unix:///tmp/s.sock"), ("unix", "/tmp/s.sock"))
+        self.assertEqual(parse_source("fifo:///tmp/f"), ("fifo", "/tmp/f"))
+        self.assertEqual(parse_source("-"), ("stdin", None))
+        for source in ("tcp://localhost", "udp://localhost:1", "unix://"):
+            with self.assertRaises(ValueError):
+                parse_source(source)
+        with self.assertRaises(ValueError):
+            AsyncStreamSimulator("stdin", overflow="spill")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+import numpy as np
+from input_stream import dataset_cache
+from input_stream.dataset_cache import cache_paths, load_dataset_cache
+from input_stream.dataset_stream_simulator import DatasetStreamSimulator
+
+
+class TestDatasetCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(25)
+        self.txt_path = self.write("kosarak.txt", "\n".join(
+            " ".join(str(v) for v in rng.zipf(1.3, size=rng.integers(1, 10)) % 3000) for _ in range(3000)))
+        self.csv_path = self.write("tweets.csv", "id,Tweet\n1,héllo wörld hello\n2,\n3,wörld again\n")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def simulator(self, path, field=None, **kwargs):
+        return DatasetStreamSimulator(path, field, max_throughput=True, **kwargs)
+
+    def test_cached_stream_matches_parsed_stream(self):
+        """
+        Test that once built, the cache is used automatically and yields the same tokens.
+        """
+        for path, field in ((self.txt_path, None), (self.csv_path, "Tweet")):
+            with self.subTest(path=os.path.basename(path)):
+                parsed = list(self.simulator(path, field).simulate_stream())
+                self.assertIsNone(self.simulator(path, field).load_cache())
+                cache = self.simulator(path, field).build_cache()
+                self.assertEqual(len(cache), len(parsed))
+                self.assertEqual(len(cache.vocabulary), len(set(parsed)))
+                self.assertIsInstance(cache.ids, np.memmap)
+
+                simulator = self.simulator(path, field)
+                with mock.patch.object(DatasetStreamSimulator, "_tokens", side_effect=AssertionError("parsed")):
+                    self.assertEqual(list(simulator.simulate_stream()), parsed)
+                    batches = list(simulator.simulate_batches(100))
+                self.assertEqual(np.concatenate(batches).tolist(), parsed)
+                self.assertEqual(list(self.simulator(path, field, dataset_cache=False).simulate_stream()), parsed)
+
+    def test_integer_ids(self):
+        """
+        Test that asking for IDs builds the cache and yields dense first-appearance IDs.
+        """
+        simulator = self.simulator(self.csv_path, "Tweet", cache_keys="ids")
+        self.assertEqual(list(simulator.simulate_stream()), [0, 1, 2, 1, 3])
+        batches = list(simulator.simulate_batches(2))
+        self.assertEqual([batch.dtype for batch in batches], [np.int64] * 3)
+        self.assertEqual(simulator.load_cache().vocabulary.tolist(), ["héllo", "wörld", "hello", "again"])
+        with self.assertRaises(ValueError):
+            self.simulator(self.csv_path, "Tweet", cache_keys="hashes")
+
+    def test_key_changes_invalidate(self):
+        """
+        Test that the field, the tokenizer, the tokenizer version and edits to the file
+        each select a different cache.
+        """
+        self.simulator(self.csv_path, "Tweet").build_cache()
+        self.assertIsNotNone(load_dataset_cache(self.csv_path, "Tweet", "csv"))
+        self.assertIsNone(load_dataset_cache(self.csv_path, "id", "csv"))
+        self.assertIsNone(load_dataset_cache(self.csv_path, "Tweet", "lines"))
+        with mock.patch.object(dataset_cache, "TOKENIZER_VERSION", dataset_cache.TOKENIZER_VERSION + 1):
+            self.assertIsNone(load_dataset_cache(self.csv_path, "Tweet", "csv"))
+        stat = os.stat(self.csv_path)
+        os.utime(self.csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(load_dataset_cache(self.csv_path, "Tweet", "csv"))
+
+    def test_concurrent_builds(self):
+        """
+        Test that builds of the same cache running together all succeed and leave one
+        complete cache and no temporary files.
+        """
+        expected = list(self.simulator(self.txt_path, dataset_cache=False).simulate_stream())
+        results, errors = [], []
+
+        def build():
+            try:
+                results.append(self.simulator(self.txt_path).build_cache())
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=build) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertTrue(all(len(cache) == len(expected) for cache in results))
+        cache_dir = os.path.dirname(cache_paths(self.txt_path, None, "mmap")[0])
+        self.assertFalse([name for name in os.listdir(cache_dir) if name.endswith(".tmp")])
+        self.assertEqual(list(self.simulator(self.txt_path).simulate_stream()), expected)
+
+    def test_failed_build_leaves_nothing(self):
+        def tokens():
+            yield b"a"
+            raise OSError("read error")
+
+        with self.assertRaises(OSError):
+            dataset_cache.build_dataset_cache(self.csv_path, "Tweet", tokens(), "csv")
+        self.assertEqual(os.listdir(os.path.join(self.directory.name, dataset_cache.CACHE_DIR_NAME)), [])
+
+    def test_incomplete_cache_is_ignored(self):
+        simulator = self.simulator(self.txt_path)
+        simulator.build_cache()
+        os.remove(cache_paths(self.txt_path, None, "mmap")[2])
+        self.assertIsNone(simulator.load_cache())
+        self.assertEqual(len(list(simulator.simulate_stream())), len(list(simulator.simulate_stream())))
+
+
+if __name__ == '__main__':
+    unittest.main()
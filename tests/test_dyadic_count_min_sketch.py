@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from evaluation.range_queries import evaluate_range_queries
+from simulation.simulation import check_integer_stream
+from summarization_algorithms.dyadic_count_min_sketch import DyadicCountMinSketch
+
+
+class TestDyadicCountMinSketch(unittest.TestCase):
+    def setUp(self):
+        self.items = np.random.default_rng(16).zipf(1.3, size=5000) % 1024
+        self.truth = {int(v): int(c) for v, c in zip(*np.unique(self.items, return_counts=True))}
+
+    def test_range_queries_are_exact_without_collisions(self):
+        """
+        Test that with more counters than distinct prefixes, range counts and quantiles are exact.
+        """
+        sketch = DyadicCountMinSketch(width=4096, depth=4, universe_bits=10)
+        sketch.add_many(self.items.tolist())
+        for low, high in [(0, 1023), (1, 1), (3, 17), (100, 900), (1000, 5000), (50, 10)]:
+            expected = int(((self.items >= low) & (self.items <= high)).sum())
+            self.assertEqual(sketch.range_query(low, high), expected)
+        for q in (0.1, 0.5, 0.9, 1.0):
+            self.assertEqual(sketch.quantile(q), int(np.quantile(self.items, q, method="inverted_cdf")))
+        self.assertEqual(sketch.rank(1023), len(self.items))
+
+    def test_range_queries_overestimate(self):
+        """
+        Test that with collisions the range counts never underestimate, for single and batch adds.
+        """
+        single = DyadicCountMinSketch(width=64, depth=3, universe_bits=10)
+        for item in self.items[:1000].tolist():
+            single.add(item)
+        batched = DyadicCountMinSketch(width=64, depth=3, universe_bits=10)
+        batched.add_many(self.items[:1000])
+        for level, other in zip(single.levels, batched.levels):
+            np.testing.assert_array_equal(level.counters, other.counters)
+        for low, high in [(0, 10), (5, 500), (200, 1023)]:
+            expected = int(((self.items[:1000] >= low) & (self.items[:1000] <= high)).sum())
+            self.assertGreaterEqual(batched.range_query(low, high), expected)
+
+    def test_merge_snapshot_and_save(self):
+        left = DyadicCountMinSketch(width=256, depth=3, universe_bits=10)
+        right = DyadicCountMinSketch(width=256, depth=3, universe_bits=10)
+        left.add_many(self.items[:2500])
+        right.add_many(self.items[2500:])
+        snapshot = left.snapshot()
+        left.merge(right)
+        self.assertEqual(left.range_query(0, 1023), len(self.items))
+        self.assertEqual(snapshot.range_query(0, 1023), 2500)
+        with self.assertRaises((RuntimeError, ValueError)):
+            snapshot.add(1)
+
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            left.save(path)
+            loaded = DyadicCountMinSketch.load(path)
+            self.assertEqual(loaded.range_query(3, 700), left.range_query(3, 700))
+        finally:
+            os.remove(path)
+
+    def test_rejects_negative_values(self):
+        with self.assertRaises(ValueError):
+            DyadicCountMinSketch(width=8, depth=2, universe_bits=4).add(-1)
+
+    def test_rejects_text_items(self):
+        """
+        Test that text streams fail with a clear message rather than an int() parse error,
+        and that integer objects (e.g. cached token IDs) are accepted.
+        """
+        sketch = DyadicCountMinSketch(width=8, depth=2, universe_bits=4)
+        for call in (lambda: sketch.add("hello"), lambda: sketch.add("12"),
+                     lambda: sketch.add_many(["hello", "world"]), lambda: sketch.add_many([b"hello"]),
+                     lambda: sketch.query_many(["hello"]), lambda: sketch.add_many([1.5])):
+            with self.assertRaisesRegex(ValueError, "cache_keys"):
+                call()
+        sketch.add_many(np.array([1, 2, 2], dtype=object))
+        self.assertEqual(sketch.query(2), 2)
+        with self.assertRaisesRegex(ValueError, "integers"):
+            evaluate_range_queries(sketch, {"hello": 1})
+        with self.assertRaises(ValueError):
+            check_integer_stream({"algorithm": "DyadicCountMinSketch", "dataset_name": "FIFA.csv"})
+        check_integer_stream({"algorithm": "DyadicCountMinSketch", "dataset_name": "FIFA.csv", "cache_keys": "ids"})
+        check_integer_stream({"algorithm": "DyadicCountMinSketch", "dataset_name": "synthetic"})
+        check_integer_stream({"algorithm": "CountMinSketch", "dataset_name": "FIFA.csv"})
+
+    def test_range_query_evaluation(self):
+        sketch = DyadicCountMinSketch(width=4096, depth=4, universe_bits=10)
+        sketch.add_many(self.items)
+        result = evaluate_range_queries(sketch, self.truth, num_queries=50)
+        self.assertEqual(result['range_avg_error'], 0)
+        self.assertGreater(result['range_avg_query_time'], 0)
+        self.assertIsNone(evaluate_range_queries(object(), self.truth))
+
+
+if __name__ == '__main__':
+    unittest.main()
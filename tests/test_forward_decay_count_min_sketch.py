@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from evaluation.accuracy import evaluate_accuracy
+from ground_truth.decayed_truth import DecayedTruth
+from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
+from summarization_algorithms.forward_decay_count_min_sketch import ForwardDecayCountMinSketch
+
+
+class TestForwardDecayCountMinSketch(unittest.TestCase):
+    def setUp(self):
+        self.items = (np.random.default_rng(17).zipf(1.3, size=20000) % 500).tolist()
+
+    def test_matches_decayed_truth_without_collisions(self):
+        """
+        Test that with more counters than distinct items the estimates equal the decayed
+        truth, across many renormalizations.
+        """
+        sketch = ForwardDecayCountMinSketch(width=8192, depth=3, half_life=50)
+        truth = DecayedTruth(half_life=50)
+        for item in self.items:
+            sketch.add(item)
+            truth.add(item)
+        self.assertGreater(sketch.landmark, 0)
+        expected = truth.get_all()
+        np.testing.assert_allclose(sketch.query_many(list(expected)), list(expected.values()), rtol=1e-9)
+        self.assertAlmostEqual(sketch.query(self.items[-1]), truth.query(self.items[-1]), places=9)
+        accuracy = evaluate_accuracy(sketch, expected)
+        self.assertLess(accuracy["avg_error"], 1e-9)
+
+    def test_counts_halve_every_half_life(self):
+        sketch = ForwardDecayCountMinSketch(width=64, depth=2, half_life=100)
+        sketch.add("a", 10)
+        before = sketch.query("a")
+        sketch.add_many(["b"] * 100)
+        self.assertAlmostEqual(sketch.query("a"), before / 2, places=9)
+        sketch.add_many(["b"] * 200)
+        self.assertAlmostEqual(sketch.query("a"), before / 8, places=9)
+
+    def test_add_many_matches_add(self):
+        """
+        Test that batch adds, with counts and across renormalizations, match one add per arrival.
+        """
+        counts = np.random.default_rng(1).integers(1, 30, size=len(self.items[:3000]))
+        single = ForwardDecayCountMinSketch(width=128, depth=3, half_life=20)
+        for item, count in zip(self.items[:3000], counts.tolist()):
+            single.add(item, count)
+        batched = ForwardDecayCountMinSketch(width=128, depth=3, half_life=20)
+        batched.add_many(self.items[:1000], counts[:1000])
+        batched.add_many(self.items[1000:3000], counts[1000:3000])
+        self.assertEqual(single.totalCount, batched.totalCount)
+        np.testing.assert_allclose(single.counters * single._scale(), batched.counters * batched._scale(),
+                                   rtol=1e-9, atol=1e-300)
+        np.testing.assert_array_equal(single.get_row_occupancy(), batched.get_row_occupancy())
+
+    def test_large_count_does_not_overflow(self):
+        sketch = ForwardDecayCountMinSketch(width=16, depth=2, half_life=10)
+        sketch.add("a", 10 ** 6)
+        self.assertTrue(np.isfinite(sketch.counters).all())
+        self.assertAlmostEqual(sketch.query("a"), 1 / (1 - 2 ** -0.1), places=6)
+
+    def test_save_and_load(self):
+        sketch = ForwardDecayCountMinSketch(width=256, depth=3, half_life=30)
+        sketch.add_many(self.items[:5000])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sketch.bin")
+            sketch.save(path)
+            loaded = CountMinSketchBase.load(path)
+            self.assertIsInstance(loaded, ForwardDecayCountMinSketch)
+            self.assertEqual((loaded.half_life, loaded.landmark), (sketch.half_life, sketch.landmark))
+            np.testing.assert_array_equal(loaded.query_many(self.items[:100]), sketch.query_many(self.items[:100]))
+
+    def test_reset(self):
+        sketch = ForwardDecayCountMinSketch(width=32, depth=2, half_life=5)
+        sketch.add_many(self.items[:500])
+        sketch.reset()
+        self.assertEqual((sketch.totalCount, sketch.landmark, sketch.get_load_factor()), (0, 0, 0.0))
+        self.assertEqual(sketch.query(self.items[0]), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
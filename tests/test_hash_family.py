@@ -0,0 +1,56 @@
+import hashlib
+import unittest
+import numpy as np
+from summarization_algorithms.hash_family import (SHA256HashFamily, DoubleHashFamily,
+                                                  MultiplyShiftHashFamily, get_hash_family)
+
+
+FAMILIES = [SHA256HashFamily, DoubleHashFamily, MultiplyShiftHashFamily]
+
+
+class TestHashFamilies(unittest.TestCase):
+    def setUp(self):
+        self.items = list(range(-10, 300)) + ["apple", "banana", "ünïcode"]
+
+    def test_sha256_matches_original_hashing(self):
+        """
+        Test that the default family reproduces the per-row SHA-256 the sketches used before.
+        """
+        family = SHA256HashFamily()
+        for item in ["apple", 42, "ünïcode"]:
+            expected = [int(hashlib.sha256((str(item) + str(i)).encode('utf-8')).hexdigest(), 16) % 1000
+                        for i in range(5)]
+            self.assertEqual(family.indices(item, 5, 1000), expected)
+
+    def test_batch_matches_single(self):
+        """
+        Test that the vectorized batch path gives the same indices and signs as single items.
+        """
+        for family_class in FAMILIES:
+            with self.subTest(family=family_class.__name__):
+                family = family_class(seed=3)
+                indices, signs = family.indices_and_signs_many(self.items, 4, 513)
+                for j, item in enumerate(self.items):
+                    expected_indices, expected_signs = family.indices_and_signs(item, 4, 513)
+                    self.assertEqual(indices[:, j].tolist(), expected_indices)
+                    self.assertEqual(signs[:, j].tolist(), expected_signs)
+                np.testing.assert_array_equal(family.indices_many(np.arange(-10, 300), 4, 513),
+                                              indices[:, :310])
+
+    def test_bytes_and_str_keys_agree(self):
+        """
+        Test that a bytes token hashes to the same positions as its decoded string.
+        """
+        for family_class in FAMILIES:
+            family = family_class()
+            self.assertEqual(family.indices(b"token", 5, 100), family.indices("token", 5, 100))
+
+    def test_get_hash_family(self):
+        self.assertEqual(get_hash_family("double", seed=1), DoubleHashFamily(seed=1))
+        self.assertNotEqual(get_hash_family("double", seed=1), DoubleHashFamily(seed=2))
+        with self.assertRaises(ValueError):
+            get_hash_family("md5")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+from collections import Counter
+import numpy as np
+from evaluation.accuracy import evaluate_top_k
+from summarization_algorithms.count_min_sketch import CountMinSketch
+from summarization_algorithms.count_sketch import CountSketch
+from summarization_algorithms.conservative_count_min_sketch import ConservativeCountMinSketch
+from summarization_algorithms.heavy_hitters import TopKTracker
+
+
+class TestTopKTracker(unittest.TestCase):
+    def test_keeps_largest_estimates(self):
+        """
+        Test that random updates leave the tracker holding the k largest final estimates.
+        """
+        rng = np.random.default_rng(14)
+        tracker = TopKTracker(5)
+        estimates = {}
+        for _ in range(2000):
+            item = int(rng.integers(0, 50))
+            estimates[item] = estimates.get(item, 0) + int(rng.integers(1, 4))
+            tracker.update(item, estimates[item])
+        expected = sorted(estimates.values(), reverse=True)[:5]
+        self.assertEqual([estimate for _, estimate in tracker.top_k()], expected)
+        self.assertEqual(tracker.min_estimate(), expected[-1])
+        self.assertEqual(len(tracker), 5)
+
+    def test_rejects_empty_capacity(self):
+        with self.assertRaises(ValueError):
+            TopKTracker(0)
+
+
+class TestSketchHeavyHitters(unittest.TestCase):
+    def setUp(self):
+        self.items = np.random.default_rng(15).zipf(1.3, size=5000).tolist()
+        self.truth = Counter(self.items)
+
+    def test_top_k_matches_stream(self):
+        """
+        Test that single and batch adds find the true heavy hitters of a skewed stream.
+        """
+        for sketch_class in (CountMinSketch, ConservativeCountMinSketch, CountSketch):
+            with self.subTest(sketch=sketch_class.__name__):
+                single = sketch_class(width=500, depth=4, top_k=10)
+                for item in self.items:
+                    single.add(item)
+                batched = sketch_class(width=500, depth=4, top_k=10)
+                for start in range(0, len(self.items), 1000):
+                    batched.add_many(self.items[start:start + 1000])
+                for sketch in (single, batched):
+                    scores = evaluate_top_k(sketch.get_top_k(), self.truth, 10)
+                    self.assertGreaterEqual(scores['top_k_recall'], 0.9)
+                    self.assertGreaterEqual(scores['top_k_precision'], 0.9)
+
+    def test_merge_reset_and_snapshot(self):
+        left = CountMinSketch(width=500, depth=4, top_k=5)
+        right = CountMinSketch(width=500, depth=4, top_k=5)
+        left.add_many(self.items[:2500])
+        right.add_many(self.items[2500:])
+        snapshot = left.snapshot()
+        left.merge(right)
+        self.assertEqual({item for item, _ in left.get_top_k()},
+                         {item for item, _ in self.truth.most_common(5)})
+        self.assertNotEqual(snapshot.get_top_k(), left.get_top_k())
+        left.reset()
+        self.assertEqual(left.get_top_k(), [])
+
+    def test_requires_top_k(self):
+        with self.assertRaises(ValueError):
+            CountMinSketch(width=10, depth=2).get_top_k()
+
+
+if __name__ == '__main__':
+    unittest.main()
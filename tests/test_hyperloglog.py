@@ -0,0 +1,123 @@
+import unittest
+import numpy as np
+from evaluation.distinct_count import evaluate_distinct_count
+from summarization_algorithms.count_min_sketch import CountMinSketch
+from summarization_algorithms.count_sketch import CountSketch
+from summarization_algorithms.dyadic_count_min_sketch import DyadicCountMinSketch
+from summarization_algorithms.hash_family import get_hash_family
+from summarization_algorithms.hyperloglog import HyperLogLog
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def keys(self, n, seed=18):
+        return np.random.default_rng(seed).integers(0, 2 ** 63, size=n, dtype=np.uint64)
+
+    def test_estimates_within_error(self):
+        """
+        Test that sparse and dense estimates stay within a few standard errors (1.04 / sqrt(m)).
+        """
+        for n in (1, 100, 2000, 50000, 300000):
+            with self.subTest(n=n):
+                hll = HyperLogLog(precision=12)
+                keys = self.keys(n)
+                for part in np.array_split(keys, 5):
+                    hll.add_keys(part)
+                hll.add_keys(keys[:n // 3])
+                self.assertLess(abs(hll.estimate() - n) / n, 3 * 1.04 / 64)
+        self.assertEqual(HyperLogLog().estimate(), 0)
+
+    def test_switches_to_dense(self):
+        hll = HyperLogLog(precision=10)
+        hll.add_keys(self.keys(50))
+        self.assertTrue(hll.is_sparse)
+        self.assertLess(hll.get_memory_usage(), 1024)
+        hll.add_keys(self.keys(5000))
+        hll.estimate()
+        self.assertFalse(hll.is_sparse)
+        self.assertEqual(hll.get_memory_usage(), 1024)
+
+    def test_merge_equals_union(self):
+        """
+        Test that merging sparse and dense estimators gives the registers of the union.
+        """
+        keys = self.keys(20000)
+        for split in (100, 10000):
+            with self.subTest(split=split):
+                left, right, union = HyperLogLog(10), HyperLogLog(10), HyperLogLog(10)
+                left.add_keys(keys[:split])
+                right.add_keys(keys[split // 2:])
+                union.add_keys(keys)
+                left.merge(right)
+                left.estimate()
+                union.estimate()
+                np.testing.assert_array_equal(left.registers, union.registers)
+        small, other = HyperLogLog(10), HyperLogLog(10)
+        small.add_keys(keys[:10])
+        other.add_keys(keys[5:30])
+        self.assertAlmostEqual(small.merge(other).estimate(), 30, delta=0.01)
+        with self.assertRaises(ValueError):
+            HyperLogLog(10).merge(HyperLogLog(11))
+
+    def test_merge_empty(self):
+        empty = HyperLogLog(12).merge(HyperLogLog(12))
+        self.assertTrue(empty.is_sparse)
+        self.assertEqual(empty.estimate(), 0)
+        filled = HyperLogLog(12)
+        filled.add_keys(self.keys(100))
+        self.assertAlmostEqual(filled.merge(HyperLogLog(12)).estimate(), 100, delta=0.5)
+        self.assertAlmostEqual(HyperLogLog(12).merge(filled).estimate(), 100, delta=0.5)
+
+
+class TestSketchDistinctCount(unittest.TestCase):
+    def setUp(self):
+        self.items = [f"key{i}" for i in np.random.default_rng(19).zipf(1.2, size=20000) % 8000]
+        self.distinct = len(set(self.items))
+
+    def test_distinct_count_does_not_change_counters(self):
+        """
+        Test that tracking distinct items leaves the counters unchanged, for every hash family
+        and for single, batch and signed updates.
+        """
+        for family in ("sha256", "double", "multiply_shift"):
+            for sketch_class in (CountMinSketch, CountSketch):
+                with self.subTest(family=family, sketch=sketch_class.__name__):
+                    tracked = sketch_class(512, 4, hash_family=get_hash_family(family), distinct_precision=12)
+                    plain = sketch_class(512, 4, hash_family=get_hash_family(family))
+                    for sketch in (tracked, plain):
+                        sketch.add_many(self.items[:15000])
+                        for item in self.items[15000:15500]:
+                            sketch.add(item)
+                    np.testing.assert_array_equal(tracked.counters, plain.counters)
+                    distinct = len(set(self.items[:15500]))
+                    self.assertLess(abs(tracked.distinct_count() - distinct) / distinct, 0.05)
+        with self.assertRaises(ValueError):
+            CountMinSketch(16, 2).distinct_count()
+
+    def test_merge_reset_and_snapshot(self):
+        family = get_hash_family("double")
+        left = CountMinSketch(512, 4, hash_family=family, distinct_precision=12)
+        right = CountMinSketch(512, 4, hash_family=family, distinct_precision=12)
+        left.add_many(self.items[:10000])
+        right.add_many(self.items[10000:])
+        snapshot = left.snapshot()
+        left.merge(right)
+        self.assertLess(abs(left.distinct_count() - self.distinct) / self.distinct, 0.05)
+        self.assertLess(snapshot.distinct_count(), left.distinct_count())
+        left.reset()
+        self.assertEqual(left.distinct_count(), 0)
+
+    def test_dyadic_and_evaluation(self):
+        values = np.random.default_rng(20).integers(0, 5000, size=10000)
+        sketch = DyadicCountMinSketch(256, 3, universe_bits=13, hash_family=get_hash_family("multiply_shift"),
+                                      distinct_precision=12)
+        sketch.add_many(values)
+        true_count = len(np.unique(values))
+        result = evaluate_distinct_count(sketch, true_count)
+        self.assertEqual(result["distinct_count"], true_count)
+        self.assertLess(result["distinct_relative_error"], 0.05)
+        self.assertNotIn("distinct_count", evaluate_distinct_count(sketch))
+        self.assertIsNone(evaluate_distinct_count(CountMinSketch(16, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import importlib.util
+import pickle
+import unittest
+import warnings
+from unittest import mock
+import numpy as np
+from summarization_algorithms import kernels
+from summarization_algorithms.conservative_count_min_sketch import ConservativeCountMinSketch
+from summarization_algorithms.count_min_sketch import CountMinSketch
+from summarization_algorithms.count_sketch import CountSketch
+from summarization_algorithms.dyadic_count_min_sketch import DyadicCountMinSketch
+from summarization_algorithms.hash_family import get_hash_family
+from summarization_algorithms.sliding_count_min_sketch import SlidingCountMinSketch
+
+HAS_NUMBA = importlib.util.find_spec("numba") is not None
+BACKENDS = ("python", "numpy") + (("numba",) if HAS_NUMBA else ())
+
+
+class TestKernelBackends(unittest.TestCase):
+    def test_numpy_matches_python(self):
+        for seed in range(3):
+            kernels.check_kernels(kernels.NUMPY_KERNELS, seed=seed)
+
+    @unittest.skipUnless(HAS_NUMBA, "numba is not installed")
+    def test_numba_matches_python(self):
+        self.assertEqual(kernels.get_kernels("numba").name, "numba")
+        for seed in range(3):
+            kernels.check_kernels(kernels.get_kernels("numba"), seed=seed)
+
+    def test_check_detects_differences(self):
+        broken = kernels.Kernels("broken", **dict(kernels.NUMPY_KERNELS.functions,
+                                                  min_query=lambda counters, indices: indices[0]))
+        with self.assertRaises(AssertionError):
+            kernels.check_kernels(broken)
+
+    def test_selection_and_fallback(self):
+        self.assertIs(kernels.get_kernels("python"), kernels.PYTHON_KERNELS)
+        with self.assertRaises(ValueError):
+            kernels.get_kernels("fortran")
+        with self.assertRaises(ValueError):
+            kernels.set_default_kernels("fortran")
+        with mock.patch.object(kernels, "_numba_kernels", return_value=None):
+            self.assertIs(kernels.get_kernels("auto"), kernels.NUMPY_KERNELS)
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                self.assertIs(kernels.get_kernels("numba"), kernels.NUMPY_KERNELS)
+            self.assertTrue(caught)
+
+
+class TestSketchKernels(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(20)
+        self.items = (rng.zipf(1.3, size=1500) % 400).tolist()
+        self.counts = rng.integers(1, 4, size=len(self.items))
+        self.family = get_hash_family("multiply_shift")
+
+    def assert_same_across_backends(self, build, feed, query=None):
+        results = []
+        for backend in BACKENDS:
+            sketch = build(backend)
+            feed(sketch)
+            results.append((sketch.counters.copy(), sketch._row_nonzero.copy(),
+                            query(sketch) if query is not None else None))
+        for backend, (counters, occupancy, answers) in zip(BACKENDS[1:], results[1:]):
+            with self.subTest(backend=backend):
+                np.testing.assert_array_equal(counters, results[0][0])
+                self.assertEqual(counters.dtype, results[0][0].dtype)
+                np.testing.assert_array_equal(occupancy, results[0][1])
+                if answers is not None:
+                    np.testing.assert_array_equal(answers, results[0][2])
+
+    def test_conservative(self):
+        for dtype, overflow in (("int64", "widen"), ("uint8", "saturate"), ("uint8", "widen")):
+            with self.subTest(dtype=dtype, overflow=overflow):
+                self.assert_same_across_backends(
+                    lambda backend: ConservativeCountMinSketch(64, 4, hash_family=self.family, kernels=backend,
+                                                               counter_dtype=dtype, overflow=overflow),
+                    lambda sketch: sketch.add_many(self.items, self.counts),
+                    lambda sketch: sketch.query_many(self.items[:100]))
+
+    def test_conservative_matches_single_adds(self):
+        batched = ConservativeCountMinSketch(64, 4, hash_family=self.family, counter_dtype="uint8",
+                                             overflow="saturate")
+        single = ConservativeCountMinSketch(64, 4, hash_family=self.family, counter_dtype="uint8",
+                                            overflow="saturate")
+        batched.add_many(self.items, self.counts)
+        for item, count in zip(self.items, self.counts.tolist()):
+            single.add(item, count)
+        np.testing.assert_array_equal(batched.counters, single.counters)
+        np.testing.assert_array_equal(batched._row_nonzero, single._row_nonzero)
+
+    def test_sliding(self):
+        for dtype, window_size in (("int64", 300), ("uint8", 50), ("int64", 5000)):
+            with self.subTest(dtype=dtype, window_size=window_size):
+                def feed(sketch):
+                    sketch.add_many(self.items[:1000], self.counts[:1000])
+                    for item in self.items[1000:1100]:
+                        sketch.add(item)
+                    sketch.add(self.items[0], 500)
+                self.assert_same_across_backends(
+                    lambda backend: SlidingCountMinSketch(32, 3, window_size=window_size, hash_family=self.family,
+                                                          kernels=backend, counter_dtype=dtype, overflow="saturate"),
+                    feed, lambda sketch: sketch.query_many(self.items[:100]))
+
+    def test_count_sketch_and_linear_adds(self):
+        for sketch_class in (CountSketch, CountMinSketch):
+            with self.subTest(sketch=sketch_class.__name__):
+                self.assert_same_across_backends(
+                    lambda backend: sketch_class(64, 5, hash_family=self.family, kernels=backend),
+                    lambda sketch: sketch.add_many(self.items, self.counts),
+                    lambda sketch: sketch.query_many(self.items[:100]))
+
+    def test_hashing_uses_sketch_backend(self):
+        """
+        Test that the hash families compute batch positions with the sketch's backend,
+        not the default one.
+        """
+        for family in ("double", "multiply_shift"):
+            for build in (lambda: CountMinSketch(64, 4, hash_family=get_hash_family(family), kernels="python"),
+                          lambda: CountMinSketch(64, 4, hash_family=get_hash_family(family), kernels="python",
+                                                 distinct_precision=8),
+                          lambda: DyadicCountMinSketch(64, 4, universe_bits=9, hash_family=get_hash_family(family),
+                                                       kernels="python")):
+                sketch = build()
+                with self.subTest(family=family, sketch=sketch.__class__.__name__), \
+                        mock.patch.object(kernels, "get_kernels", side_effect=AssertionError("default backend")):
+                    sketch.add_many(self.items, self.counts)
+                    sketch.query_many(self.items[:100])
+
+    def test_pickle_keeps_backend(self):
+        sketch = CountMinSketch(16, 2, kernels="python")
+        self.assertIs(pickle.loads(pickle.dumps(sketch)).kernels, kernels.PYTHON_KERNELS)
+        self.assertIs(sketch.snapshot().kernels, kernels.PYTHON_KERNELS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from input_stream.dataset_stream_simulator import DatasetStreamSimulator
+from input_stream.mmap_tokenizer import iter_token_chunks, iter_tokens
+from summarization_algorithms.count_min_sketch import CountMinSketch
+
+
+class TestMmapTokenizer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(24)
+        lines = [" ".join(str(v) for v in rng.zipf(1.3, size=rng.integers(0, 12))) for _ in range(2000)]
+        self.text = "\n".join(lines) + "\r\n  \t12 \x0b 7\x0c\n345"
+        self.path = self.write("kosarak.txt", self.text)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w", newline="") as f:
+            f.write(text)
+        return path
+
+    def test_tokens_match_str_split(self):
+        """
+        Test that no token is cut at chunk boundaries, whatever the chunk size.
+        """
+        expected = [token.encode() for token in self.text.split()]
+        for chunk_size in (1, 3, 7, 64, 1000, 1 << 22):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(list(iter_tokens(self.path, chunk_size)), expected)
+        self.assertTrue(all(len(chunk) for chunk in iter_token_chunks(self.path, 5)))
+
+    def test_empty_and_blank_files(self):
+        self.assertEqual(list(iter_tokens(self.write("empty.txt", ""))), [])
+        self.assertEqual(list(iter_tokens(self.write("blank.txt", " \n\n\t "))), [])
+        with self.assertRaises(ValueError):
+            list(iter_tokens(self.path, 0))
+
+    def test_simulator_yields_bytes(self):
+        mmap_reader = DatasetStreamSimulator(self.path, None, max_throughput=True)
+        lines_reader = DatasetStreamSimulator(self.path, None, max_throughput=True, txt_tokenizer="lines")
+        tokens = list(mmap_reader.simulate_stream())
+        self.assertTrue(all(isinstance(token, bytes) for token in tokens))
+        self.assertEqual([token.decode() for token in tokens], list(lines_reader.simulate_stream()))
+        batches = list(mmap_reader.simulate_batches(1000))
+        self.assertTrue(all(len(batch) == 1000 for batch in batches[:-1]))
+        self.assertEqual(np.concatenate(batches).tolist(), tokens)
+        with self.assertRaises(ValueError):
+            DatasetStreamSimulator(self.path, None, txt_tokenizer="regex")
+
+    def test_bytes_tokens_hash_like_str(self):
+        tokens = list(iter_tokens(self.path))
+        from_bytes, from_str = CountMinSketch(256, 4), CountMinSketch(256, 4)
+        from_bytes.add_many(tokens)
+        from_str.add_many([token.decode() for token in tokens])
+        np.testing.assert_array_equal(from_bytes.counters, from_str.counters)
+
+
+if __name__ == '__main__':
+    unittest.main()
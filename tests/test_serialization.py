@@ -0,0 +1,141 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from summarization_algorithms.count_mean_min_sketch import CountMeanMinSketch
+from summarization_algorithms.count_min_sketch import CountMinSketch
+from summarization_algorithms.count_min_sketch_base import CountMinSketchBase
+from summarization_algorithms.count_sketch import CountSketch
+from summarization_algorithms.sliding_count_min_sketch import SlidingCountMinSketch
+from summarization_algorithms.dyadic_count_min_sketch import DyadicCountMinSketch
+from summarization_algorithms.exp_count_min_sketch import ExpCountMinSketch
+from summarization_algorithms.hash_family import MultiplyShiftHashFamily
+from summarization_algorithms.serialization import read_header
+
+
+class TestSerialization(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "sketch.bin")
+        self.items = np.random.default_rng(5).zipf(1.4, size=500).tolist()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        """
+        Test that a saved sketch loads with the same configuration, counters and estimates.
+        """
+        for compression in (None, "zlib"):
+            with self.subTest(compression=compression):
+                sketch = CountSketch(width=40, depth=3, counter_dtype=np.int32, overflow="saturate",
+                                     hash_family=MultiplyShiftHashFamily(seed=9))
+                sketch.add_many(self.items)
+                sketch.save(self.path, compression=compression)
+
+                loaded = CountSketch.load(self.path)
+                np.testing.assert_array_equal(loaded.counters, sketch.counters)
+                self.assertEqual(loaded.counters.dtype, np.int32)
+                self.assertEqual(loaded.hash_family, sketch.hash_family)
+                self.assertEqual(loaded.totalCount, sketch.totalCount)
+                np.testing.assert_array_equal(loaded.query_many(self.items), sketch.query_many(self.items))
+
+    def test_memory_mapped_load(self):
+        """
+        Test that uncompressed counters are memory-mapped and copy-on-write by default.
+        """
+        sketch = CountMinSketch(width=40, depth=3)
+        sketch.add_many(self.items)
+        sketch.save(self.path)
+
+        loaded = CountMinSketch.load(self.path)
+        self.assertIsInstance(loaded.counters, np.memmap)
+        loaded.add("new item", 5)
+        np.testing.assert_array_equal(CountMinSketch.load(self.path).counters, sketch.counters)
+        self.assertEqual(read_header(self.path)["algorithm"], "CountMinSketch")
+
+    def test_load_does_not_scan_counters(self):
+        """
+        Test that the occupancy and row sums are loaded from the file, not recomputed from
+        the memory-mapped counters, and still recomputed for files saved without them.
+        """
+        for sketch in (CountMinSketch(width=40, depth=3, counter_dtype=np.uint8, overflow="saturate"),
+                       CountMeanMinSketch(width=40, depth=3), DyadicCountMinSketch(width=40, depth=3, universe_bits=6)):
+            with self.subTest(sketch=sketch.__class__.__name__):
+                sketch.add_many([item % 64 for item in self.items])
+                sketch.save(self.path)
+                with mock.patch.object(CountMinSketchBase, "_occupied_cells", side_effect=AssertionError("scanned")), \
+                        mock.patch.object(CountMeanMinSketch, "_recount_row_sums", side_effect=AssertionError("scanned")):
+                    loaded = sketch.__class__.load(self.path)
+                np.testing.assert_array_equal(loaded.get_row_occupancy(), sketch.get_row_occupancy())
+                np.testing.assert_array_equal(loaded.query_many(self.items[:50]), sketch.query_many(self.items[:50]))
+
+                with mock.patch.object(sketch.__class__, "_summary_arrays", return_value={}):
+                    sketch.save(self.path)
+                self.assertFalse(any(entry["summary"] for entry in read_header(self.path)["arrays"]))
+                loaded = sketch.__class__.load(self.path)
+                np.testing.assert_array_equal(loaded.get_row_occupancy(), sketch.get_row_occupancy())
+                np.testing.assert_array_equal(loaded.query_many(self.items[:50]), sketch.query_many(self.items[:50]))
+        loaded.add_many([1, 2, 3])
+
+    def test_distinct_count_round_trip(self):
+        """
+        Test that the HyperLogLog is saved and restored, both sparse and dense.
+        """
+        for sketch_class, size in ((CountMinSketch, 50), (CountMinSketch, 5000), (DyadicCountMinSketch, 500)):
+            for compression in (None, "zlib"):
+                with self.subTest(sketch=sketch_class.__name__, size=size, compression=compression):
+                    sketch = sketch_class(width=40, depth=3, distinct_precision=8)
+                    sketch.add_many(list(range(size)))
+                    sketch.save(self.path, compression=compression)
+                    self.assertEqual(read_header(self.path)["distinct_precision"], 8)
+
+                    loaded = sketch_class.load(self.path)
+                    self.assertEqual(loaded.distinct.is_sparse, sketch.distinct.is_sparse)
+                    self.assertEqual(loaded.distinct_count(), sketch.distinct_count())
+                    loaded.add_many(list(range(size, 2 * size)))
+                    sketch.add_many(list(range(size, 2 * size)))
+                    self.assertEqual(loaded.distinct_count(), sketch.distinct_count())
+
+    def test_heavy_hitters_round_trip(self):
+        """
+        Test that the top-k capacity and candidates are restored with their item types.
+        """
+        items = ["a"] * 5 + [b"z"] * 4 + [7] * 3 + [2.5] * 2 + [b"\xff"]
+        sketch = CountMinSketch(width=1000, depth=3, top_k=5)
+        for item in items:
+            sketch.add(item)
+        sketch.save(self.path)
+
+        loaded = CountMinSketch.load(self.path)
+        self.assertEqual(loaded.heavy_hitters.capacity, 5)
+        self.assertEqual(loaded.get_top_k(), sketch.get_top_k())
+        self.assertEqual([type(item) for item, _ in loaded.get_top_k()], [str, bytes, int, float, bytes])
+
+        sketch = CountMinSketch(width=1000, depth=3, top_k=5)
+        sketch.add(object())
+        with self.assertRaises(ValueError):
+            sketch.save(self.path)
+
+    def test_extra_state_and_type_check(self):
+        sketch = SlidingCountMinSketch(width=10, depth=2)
+        for item in self.items[:25]:
+            sketch.add(item)
+        sketch.save(self.path)
+        self.assertEqual(SlidingCountMinSketch.load(self.path).scan_pointer, sketch.scan_pointer)
+        with self.assertRaises(TypeError):
+            CountMinSketch.load(self.path)
+
+    def test_exp_count_min_round_trip(self):
+        sketch = ExpCountMinSketch(width=10, depth=2, window_size=50, counter_size=16)
+        for item in self.items[:120]:
+            sketch.add(item)
+        sketch.save(self.path)
+        loaded = ExpCountMinSketch.load(self.path)
+        self.assertEqual(loaded.window_size, 50)
+        self.assertEqual([loaded.query(i) for i in self.items[:20]], [sketch.query(i) for i in self.items[:20]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import functools
+import unittest
+import numpy as np
+from ground_truth.truth import Truth
+from simulation.sharded_ingestion import ShardedIngestor
+from simulation.simulation import check_sharded_ingestion
+from summarization_algorithms.count_min_sketch import CountMinSketch
+from summarization_algorithms.count_sketch import CountSketch
+from summarization_algorithms.dyadic_count_min_sketch import DyadicCountMinSketch
+from summarization_algorithms.hash_family import get_hash_family
+from summarization_algorithms.sliding_count_min_sketch import SlidingCountMinSketch
+
+
+class TestShardedIngestion(unittest.TestCase):
+    def test_sharded_matches_single_process(self):
+        """
+        Test that ingesting checkpoints through worker processes gives the same sketch and truth.
+        """
+        items = np.random.default_rng(3).zipf(1.3, size=3000).tolist()
+        for sketch_class in (CountMinSketch, CountSketch):
+            with self.subTest(sketch=sketch_class.__name__):
+                factory = functools.partial(sketch_class, width=64, depth=3)
+                single, sharded = factory(), factory()
+                truth = Truth()
+                single.add_many(items)
+
+                with ShardedIngestor(factory, workers=3) as ingestor:
+                    for start in range(0, len(items), 1000):
+                        ingestor.ingest(items[start:start + 1000], truth)
+                    ingestor.sync(sharded)
+
+                np.testing.assert_array_equal(single.counters, sharded.counters)
+                self.assertEqual(single.totalCount, sharded.totalCount)
+                self.assertEqual(truth.get_all(), {item: items.count(item) for item in set(items)})
+
+    def test_distinct_count_and_heavy_hitters(self):
+        """
+        Test that the workers' distinct-count registers and the heavy hitters reach the global sketch.
+        """
+        items = np.random.default_rng(4).zipf(1.3, size=6000) % 2000
+        factory = functools.partial(CountMinSketch, width=4096, depth=3, hash_family=get_hash_family("double"),
+                                    distinct_precision=12)
+        single, sharded = factory(), factory(top_k=5)
+        single.add_many(items)
+        with ShardedIngestor(factory, workers=3) as ingestor:
+            ingestor.sync(sharded)
+            self.assertEqual(sharded.distinct_count(), 0)
+            for start in range(0, len(items), 1500):
+                ingestor.ingest(items[start:start + 1500], Truth())
+                self.assertEqual(sharded.totalCount, start)
+                ingestor.sync(sharded)
+        np.testing.assert_array_equal(single.counters, sharded.counters)
+        self.assertEqual(sharded.distinct_count(), single.distinct_count())
+        distinct = len(np.unique(items))
+        self.assertLess(abs(sharded.distinct_count() - distinct) / distinct, 0.05)
+        self.assertEqual([item for item, _ in sharded.get_top_k()][:3], [1, 2, 3])
+
+    def test_worker_errors_surface_at_sync(self):
+        factory = functools.partial(DyadicCountMinSketch, width=8, depth=2, universe_bits=8)
+        with ShardedIngestor(factory, workers=2) as ingestor:
+            ingestor.ingest(["a", "b"], Truth())
+            with self.assertRaises(RuntimeError):
+                ingestor.sync(factory())
+
+    def test_rejects_non_mergeable_sketch(self):
+        with self.assertRaises(ValueError):
+            ShardedIngestor(functools.partial(SlidingCountMinSketch, width=8, depth=2), workers=2)
+        for algorithm in ("SlidingCountMinSketch", "ExpCountMinSketch", "ForwardDecayCountMinSketch"):
+            with self.assertRaises(ValueError):
+                check_sharded_ingestion({"algorithm": algorithm})
+        for algorithm in ("CountMinSketch", "ConservativeCountMinSketch", "CountMeanMinSketch", "CountSketch",
+                          "DyadicCountMinSketch"):
+            check_sharded_ingestion({"algorithm": algorithm})
+
+
+if __name__ == '__main__':
+    unittest.main()
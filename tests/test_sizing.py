@@ -0,0 +1,73 @@
+import functools
+import unittest
+import numpy as np
+from summarization_algorithms.count_min_sketch import CountMinSketch
+from summarization_algorithms.count_sketch import CountSketch
+from summarization_algorithms.hash_family import get_hash_family
+from summarization_algorithms.sizing import (calibrate_dimensions, counter_dtype_for, from_error_bounds,
+                                             from_memory_budget)
+
+
+class TestErrorBounds(unittest.TestCase):
+    def test_count_min_dimensions(self):
+        sketch = from_error_bounds(0.01, 0.01, "ConservativeCountMinSketch", stream_length=70000)
+        self.assertEqual((sketch.width, sketch.depth), (272, 5))
+        self.assertEqual(sketch.counter_dtype, np.uint32)
+        self.assertEqual(CountMinSketch.from_error_bounds(0.5, 0.5).counter_dtype, np.int64)
+
+    def test_count_sketch_dimensions(self):
+        sketch = CountSketch.from_error_bounds(0.1, 0.05, stream_length=1000)
+        self.assertEqual((sketch.width, sketch.depth), (300, 3))
+        self.assertEqual(sketch.counter_dtype, np.int16)
+
+    def test_invalid_bounds(self):
+        for epsilon, delta in ((0, 0.1), (0.1, 1), (2, 0.5)):
+            with self.assertRaises(ValueError):
+                CountMinSketch.dimensions_for_error(epsilon, delta)
+        with self.assertRaises(ValueError):
+            from_error_bounds(0.1, 0.1, "NoSuchSketch")
+
+    def test_counter_dtype_for(self):
+        self.assertEqual(counter_dtype_for(255), np.uint8)
+        self.assertEqual(counter_dtype_for(256), np.uint16)
+        self.assertEqual(counter_dtype_for(200, signed=True), np.int16)
+        self.assertEqual(counter_dtype_for(1 << 40), np.int64)
+        self.assertEqual(counter_dtype_for(None), np.int64)
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def setUp(self):
+        self.sample = np.random.default_rng(21).zipf(1.3, size=3000).tolist()
+        self.family = get_hash_family("multiply_shift")
+
+    def test_fits_budget_and_minimizes_error(self):
+        """
+        Test that the chosen sketch fits the budget and no other candidate depth has a lower error.
+        """
+        budget = 4096
+        factory = functools.partial(CountMinSketch, hash_family=self.family, counter_dtype="uint16")
+        width, depth, error = calibrate_dimensions(budget, factory, self.sample, depths=range(1, 6))
+        self.assertEqual(width, budget // (2 * depth))
+        truth = {item: self.sample.count(item) for item in set(self.sample)}
+        for other_depth in range(1, 6):
+            other = factory(budget // (2 * other_depth), other_depth)
+            other.add_many(self.sample)
+            other_error = np.mean([abs(other.query(item) - count) for item, count in truth.items()])
+            self.assertLessEqual(error, other_error + 1e-9)
+
+    def test_from_memory_budget(self):
+        for algorithm in ("CountMinSketch", "CountSketch", "DyadicCountMinSketch", "SlidingCountMinSketch"):
+            with self.subTest(algorithm=algorithm):
+                options = {"universe_bits": 12} if algorithm == "DyadicCountMinSketch" else {}
+                sketch = from_memory_budget(10000, algorithm, sample=self.sample[:1000], stream_length=50000,
+                                            depths=range(1, 5), hash_family=self.family, **options)
+                self.assertEqual(sketch.__class__.__name__, algorithm)
+                self.assertLessEqual(sketch.get_memory_usage(), 10000)
+                self.assertGreater(sketch.get_memory_usage(), 9000)
+                self.assertEqual(sketch.counter_dtype, np.int32 if algorithm == "CountSketch" else np.uint16)
+        with self.assertRaises(ValueError):
+            from_memory_budget(4, "SlidingCountMinSketch", sample=self.sample, hash_family=self.family)
+
+
+if __name__ == '__main__':
+    unittest.main()
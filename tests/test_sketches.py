@@ -0,0 +1,479 @@
+import threading
+import unittest
+from unittest import mock
+import numpy as np
+from summarization_algorithms.count_min_sketch import CountMinSketch
+from summarization_algorithms.conservative_count_min_sketch import ConservativeCountMinSketch
+from summarization_algorithms.count_mean_min_sketch import CountMeanMinSketch
+from summarization_algorithms.count_sketch import CountSketch
+from summarization_algorithms.sliding_count_min_sketch import SlidingCountMinSketch
+from summarization_algorithms.exp_count_min_sketch import ExpCountMinSketch
+from summarization_algorithms.dyadic_count_min_sketch import DyadicCountMinSketch
+from summarization_algorithms.forward_decay_count_min_sketch import ForwardDecayCountMinSketch
+from summarization_algorithms.hash_cache import LRUHashCache, ClockHashCache
+from summarization_algorithms.hash_family import DoubleHashFamily, MultiplyShiftHashFamily, SHA256HashFamily
+from summarization_algorithms.shared_counters import SharedCounters
+
+
+SKETCH_CLASSES = [CountMinSketch, ConservativeCountMinSketch, CountMeanMinSketch, CountSketch]
+
+
+class TestBatchOperations(unittest.TestCase):
+    def setUp(self):
+        """
+        Setup a small skewed stream with repeated items.
+        """
+        rng = np.random.default_rng(42)
+        self.items = rng.zipf(1.5, size=500).tolist()
+        self.counts = rng.integers(1, 5, size=500).tolist()
+        self.distinct = sorted(set(self.items))
+
+    def test_add_many_matches_add(self):
+        """
+        Test that a batch update leaves the same counters as item-by-item updates.
+        """
+        for sketch_class in SKETCH_CLASSES:
+            with self.subTest(sketch=sketch_class.__name__):
+                single = sketch_class(width=50, depth=4)
+                batch = sketch_class(width=50, depth=4)
+                for item, count in zip(self.items, self.counts):
+                    single.add(item, count)
+                batch.add_many(self.items, self.counts)
+
+                np.testing.assert_array_equal(single.counters, batch.counters)
+                self.assertEqual(single.totalCount, batch.totalCount)
+
+    def test_query_many_matches_query(self):
+        """
+        Test that batch queries return the same estimates as single queries.
+        """
+        for sketch_class in SKETCH_CLASSES:
+            with self.subTest(sketch=sketch_class.__name__):
+                sketch = sketch_class(width=50, depth=4)
+                sketch.add_many(self.items)
+                expected = [sketch.query(item) for item in self.distinct]
+                np.testing.assert_allclose(sketch.query_many(self.distinct), expected)
+
+
+class TestHashCache(unittest.TestCase):
+    def test_cached_sketch_matches_uncached(self):
+        """
+        Test that caching hash positions does not change counters or estimates.
+        """
+        items = np.random.default_rng(1).zipf(1.5, size=400).tolist()
+        for sketch_class in SKETCH_CLASSES:
+            for policy in ("lru", "clock"):
+                with self.subTest(sketch=sketch_class.__name__, policy=policy):
+                    plain = sketch_class(width=40, depth=3)
+                    cached = sketch_class(width=40, depth=3, cache_size=16, cache_policy=policy)
+                    for item in items[:200]:
+                        plain.add(item)
+                        cached.add(item)
+                    plain.add_many(items[200:])
+                    cached.add_many(items[200:])
+
+                    np.testing.assert_array_equal(plain.counters, cached.counters)
+                    np.testing.assert_allclose(plain.query_many(items), cached.query_many(items))
+                    stats = cached.cache_stats()
+                    self.assertGreater(stats["cache_hits"], 0)
+                    self.assertLessEqual(stats["cache_size"], 16)
+
+    def test_cached_sketch_matches_uncached_with_mixed_types(self):
+        """
+        Test that items that compare equal but hash differently do not share a cache slot.
+        """
+        items = [1, 1.0, True, "1", b"1", 0.0, -0.0, np.int64(1)] * 3
+        for family_class in (SHA256HashFamily, DoubleHashFamily, MultiplyShiftHashFamily):
+            for sketch_class in SKETCH_CLASSES:
+                with self.subTest(family=family_class.__name__, sketch=sketch_class.__name__):
+                    plain = sketch_class(width=1000, depth=3, hash_family=family_class())
+                    cached = sketch_class(width=1000, depth=3, hash_family=family_class(), cache_size=16)
+                    for item in items:
+                        plain.add(item)
+                        cached.add(item)
+                    plain.add_many(items)
+                    cached.add_many(items)
+
+                    np.testing.assert_array_equal(plain.counters, cached.counters)
+                    self.assertEqual([plain.query(item) for item in items],
+                                     [cached.query(item) for item in items])
+                    np.testing.assert_allclose(plain.query_many(items), cached.query_many(items))
+
+    def test_lru_evicts_least_recently_used(self):
+        cache = LRUHashCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_clock_gives_second_chance(self):
+        cache = ClockHashCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+
+
+class TestCounterDtypes(unittest.TestCase):
+    def test_saturate_caps_counters(self):
+        """
+        Test that saturating counters stop at the maximum of their type.
+        """
+        sketch = CountMinSketch(width=10, depth=3, counter_dtype=np.uint8, overflow="saturate")
+        sketch.add_many(["hot"] * 300)
+        sketch.add("hot", 10)
+        self.assertEqual(sketch.counters.dtype, np.uint8)
+        self.assertEqual(sketch.query("hot"), 255)
+
+    def test_widen_promotes_counters(self):
+        """
+        Test that auto-widening counters keep exact values after overflowing.
+        """
+        for sketch_class in SKETCH_CLASSES:
+            with self.subTest(sketch=sketch_class.__name__):
+                dtype = np.int8 if sketch_class is CountSketch else np.uint8
+                narrow = sketch_class(width=10, depth=3, counter_dtype=dtype, overflow="widen")
+                wide = sketch_class(width=10, depth=3)
+                for sketch in (narrow, wide):
+                    sketch.add_many(["hot"] * 200 + ["cold"] * 3)
+                    sketch.add("hot", 100)
+                self.assertEqual(narrow.counters.dtype, np.dtype(np.int16 if sketch_class is CountSketch else np.uint16))
+                np.testing.assert_array_equal(narrow.counters, wide.counters)
+                self.assertLess(narrow.get_memory_usage(), wide.get_memory_usage())
+
+    def test_count_sketch_rejects_unsigned(self):
+        with self.assertRaises(ValueError):
+            CountSketch(width=10, depth=3, counter_dtype=np.uint16)
+
+
+class TestMerge(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.items = rng.zipf(1.4, size=600).tolist()
+
+    def test_merge_equals_single_sketch(self):
+        """
+        Test that merging sketches of two halves of a stream equals sketching the whole stream.
+        """
+        for sketch_class in (CountMinSketch, CountMeanMinSketch, CountSketch):
+            with self.subTest(sketch=sketch_class.__name__):
+                whole = sketch_class(width=30, depth=4)
+                first = sketch_class(width=30, depth=4)
+                second = sketch_class(width=30, depth=4)
+                whole.add_many(self.items)
+                first.add_many(self.items[:300])
+                second.add_many(self.items[300:])
+
+                first += second
+                np.testing.assert_array_equal(first.counters, whole.counters)
+                self.assertEqual(first.totalCount, whole.totalCount)
+
+                difference = whole - second
+                np.testing.assert_array_equal(difference.counters, whole.counters - second.counters)
+                self.assertEqual(difference.totalCount, 300)
+
+    def test_conservative_merge_never_underestimates(self):
+        first = ConservativeCountMinSketch(width=30, depth=4)
+        second = ConservativeCountMinSketch(width=30, depth=4)
+        first.add_many(self.items[:300])
+        second.add_many(self.items[300:])
+        first.merge(second)
+        for item in set(self.items):
+            self.assertGreaterEqual(first.query(item), self.items.count(item))
+        with self.assertRaises(NotImplementedError):
+            first.subtract(second)
+
+    def test_incompatible_sketches_raise(self):
+        sketch = CountMinSketch(width=30, depth=4)
+        with self.assertRaises(ValueError):
+            sketch.merge(CountMinSketch(width=31, depth=4))
+        with self.assertRaises(ValueError):
+            sketch.merge(CountMinSketch(width=30, depth=4, counter_dtype=np.uint32))
+        with self.assertRaises(ValueError):
+            sketch.merge(CountMinSketch(width=30, depth=4, hash_family=DoubleHashFamily()))
+        with self.assertRaises(TypeError):
+            sketch.merge(CountMeanMinSketch(width=30, depth=4))
+
+
+class TestSharedMemory(unittest.TestCase):
+    def test_reader_sees_live_counters(self):
+        """
+        Test that an attached reader sees the writer's counters and header without copying.
+        """
+        sketch = CountMinSketch(width=20, depth=3, shared_memory=True)
+        reader = SharedCounters.attach(sketch.shared_memory_name)
+        try:
+            sketch.add_many(["a", "b", "a"])
+            sequence = reader.sequence
+            sketch.add("c", 4)
+
+            np.testing.assert_array_equal(reader.array, sketch.counters)
+            self.assertEqual(reader.total_count, 7)
+            self.assertGreater(reader.sequence, sequence)
+            self.assertEqual((reader.depth, reader.width, reader.dtype), (3, 20, np.dtype(np.int64)))
+            with self.assertRaises(ValueError):
+                reader.array[0, 0] = 1
+        finally:
+            reader.close()
+            sketch.close_shared_memory()
+        self.assertEqual(sketch.query("c"), 4)
+
+    def test_unsupported_sketches_reject_shared_memory(self):
+        for sketch_class in (ExpCountMinSketch, DyadicCountMinSketch):
+            with self.subTest(sketch=sketch_class.__name__):
+                with self.assertRaises(ValueError):
+                    sketch_class(width=20, depth=3, shared_memory=True)
+
+    def test_every_update_is_one_write_section(self):
+        """
+        Test that every update writes its counters and totalCount inside a single seqlock
+        write section: the sequence is odd while totalCount is published and moves by two.
+        """
+        for sketch_class in SKETCH_CLASSES + [SlidingCountMinSketch, ForwardDecayCountMinSketch]:
+            with self.subTest(sketch=sketch_class.__name__):
+                sketch = sketch_class(width=20, depth=3, shared_memory=True)
+                reader = SharedCounters.attach(sketch.shared_memory_name)
+                publish = SharedCounters.publish
+                odd = []
+
+                def checked_publish(shared, total_count):
+                    odd.append(reader.sequence % 2 == 1)
+                    publish(shared, total_count)
+                try:
+                    with mock.patch.object(SharedCounters, "publish", checked_publish):
+                        for update in (lambda: sketch.add("a", 2), lambda: sketch.add_many(["a", "b", "c"]),
+                                       lambda: sketch.merge(sketch_class(width=20, depth=3))
+                                       if sketch.mergeable else sketch.add("b"),
+                                       sketch.reset):
+                            sequence = reader.sequence
+                            update()
+                            self.assertEqual(reader.sequence, sequence + 2)
+                    self.assertTrue(odd and all(odd))
+                    counters, total_count = reader.read()
+                    np.testing.assert_array_equal(counters, sketch.counters)
+                    self.assertEqual(total_count, sketch.totalCount)
+                finally:
+                    reader.close()
+                    sketch.close_shared_memory()
+
+    def test_read_waits_for_open_write_section(self):
+        """
+        Test that a reader does not return counters while the writer is inside a write section.
+        """
+        sketch = CountMinSketch(width=20, depth=3, shared_memory=True)
+        reader = SharedCounters.attach(sketch.shared_memory_name)
+        results = []
+        try:
+            with sketch._write_section():
+                sketch.counters[0, 0] = 5
+                thread = threading.Thread(target=lambda: results.append(reader.read()))
+                thread.start()
+                thread.join(0.2)
+                self.assertTrue(thread.is_alive())
+                sketch.totalCount = 5
+            thread.join()
+            counters, total_count = results[0]
+            self.assertEqual((int(counters[0, 0]), total_count), (5, 5))
+        finally:
+            reader.close()
+            sketch.close_shared_memory()
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_snapshot_is_frozen_and_independent(self):
+        """
+        Test that a snapshot keeps the estimates of the moment it was taken and rejects updates.
+        """
+        for sketch_class in SKETCH_CLASSES + [SlidingCountMinSketch]:
+            with self.subTest(sketch=sketch_class.__name__):
+                sketch = sketch_class(width=30, depth=3)
+                for item in ["a", "b", "a", "c"]:
+                    sketch.add(item)
+                expected = sketch.query("a")
+                snapshot = sketch.snapshot()
+                sketch.add("a", 5)
+
+                self.assertEqual(snapshot.query("a"), expected)
+                self.assertEqual(snapshot.totalCount, 4)
+                with self.assertRaises((RuntimeError, ValueError)):
+                    snapshot.add("a")
+
+    def test_exp_count_min_snapshot(self):
+        sketch = ExpCountMinSketch(width=30, depth=3, window_size=100, counter_size=16)
+        for item in ["a", "b", "a", "c", "a"]:
+            sketch.add(item)
+        snapshot = sketch.snapshot()
+        expected = sketch.query("a")
+        sketch.add("a")
+        self.assertEqual(snapshot.query("a"), expected)
+        with self.assertRaises((RuntimeError, ValueError)):
+            snapshot.add("a")
+
+
+class TestOccupancy(unittest.TestCase):
+    def test_tracked_occupancy_matches_full_scan(self):
+        """
+        Test that the incrementally tracked row occupancy equals a scan of the counters,
+        including cells of a Count Sketch that return to zero.
+        """
+        items = np.random.default_rng(11).zipf(1.3, size=800).tolist()
+        for sketch_class in SKETCH_CLASSES + [SlidingCountMinSketch]:
+            for dtype in (np.int64, np.int16):
+                with self.subTest(sketch=sketch_class.__name__, dtype=dtype):
+                    sketch = sketch_class(width=25, depth=3, counter_dtype=dtype)
+                    for item in items[:100]:
+                        sketch.add(item)
+                    sketch.add_many(items[100:])
+                    if sketch_class is CountSketch:
+                        sketch.add_many(items[:300], [-1] * 300)
+                    occupied = self._occupied(sketch)
+                    np.testing.assert_array_equal(sketch.get_row_occupancy(), occupied.sum(axis=1) / 25)
+                    self.assertEqual(sketch.get_load_factor(), occupied.sum(axis=1).max() / 25)
+                    self.assertEqual(sketch.get_occupancy_histogram().sum(), 25 * 3)
+
+                    sketch.reset()
+                    self.assertEqual(sketch.get_load_factor(), 0)
+
+    def _occupied(self, sketch):
+        if sketch.counters.ndim == 3:
+            return sketch.counters.any(axis=2)
+        return sketch.counters != 0
+
+
+class TestCountMeanMinRowSums(unittest.TestCase):
+    def test_queries_match_full_row_scan(self):
+        """
+        Test that the running row sums stay equal to the counter row sums through adds,
+        saturation, merges and resets, and that queries match the full-scan estimate.
+        """
+        items = np.random.default_rng(12).zipf(1.3, size=2000).tolist()
+        for dtype, overflow in ((np.int64, "widen"), (np.uint8, "widen"), (np.uint8, "saturate")):
+            with self.subTest(dtype=dtype, overflow=overflow):
+                sketch = CountMeanMinSketch(width=20, depth=5, counter_dtype=dtype, overflow=overflow)
+                for item in items[:200]:
+                    sketch.add(item, 3)
+                sketch.add_many(items[200:])
+                np.testing.assert_array_equal(sketch.row_sums, sketch.counters.sum(axis=1))
+
+                rows = np.arange(5)[:, None]
+                raw = sketch.counters[rows, sketch._hash_many(items[:50])].astype(np.int64)
+                noise = (sketch.counters.sum(axis=1, dtype=np.int64)[:, None] - raw) / 19
+                expected = np.maximum(0, np.minimum(np.median(raw - noise, axis=0), raw.min(axis=0)))
+                np.testing.assert_allclose(sketch.query_many(items[:50]), expected)
+                np.testing.assert_allclose([sketch.query(item) for item in items[:50]], expected)
+
+                other = CountMeanMinSketch(width=20, depth=5, counter_dtype=dtype, overflow=overflow)
+                other.add_many(items[:100])
+                sketch.merge(other)
+                np.testing.assert_array_equal(sketch.row_sums, sketch.counters.sum(axis=1))
+                sketch.reset()
+                self.assertEqual(sketch.row_sums.sum(), 0)
+
+
+class TestSlidingWindow(unittest.TestCase):
+    def _reference(self, width, depth, window_size, positions_and_counts):
+        """
+        Scan counter by counter, arrival by arrival: after t arrivals, floor(t * m / N)
+        counters have been scanned.
+        """
+        m = width * depth
+        counters = np.zeros((depth, width, 2), dtype=np.int64)
+        t = 0
+        for positions, count in positions_and_counts:
+            for _ in range(count):
+                for a in range(t * m // window_size, (t + 1) * m // window_size):
+                    d, w = divmod(a % m, width)
+                    counters[d, w, 1] = counters[d, w, 0]
+                    counters[d, w, 0] = 0
+                counters[np.arange(depth), positions, 0] += 1
+                t += 1
+        return counters
+
+    def test_matches_arrival_by_arrival_scan(self):
+        """
+        Test that sliced scanning with counts matches scanning one arrival at a time, for
+        windows shorter and longer than the number of counters.
+        """
+        rng = np.random.default_rng(13)
+        items = rng.zipf(1.3, size=400).tolist()
+        counts = rng.integers(1, 30, size=400).tolist()
+        for window_size in (7, 21, 50, 1000):
+            with self.subTest(window_size=window_size):
+                sketch = SlidingCountMinSketch(width=7, depth=3, window_size=window_size)
+                for item, count in zip(items[:200], counts[:200]):
+                    sketch.add(item, count)
+                sketch.add_many(items[200:], counts[200:])
+                expected = self._reference(7, 3, window_size,
+                                           [(sketch._hash(item), count) for item, count in zip(items, counts)])
+                np.testing.assert_array_equal(sketch.counters, expected)
+                np.testing.assert_array_equal(sketch._row_nonzero, expected.any(axis=2).sum(axis=1))
+
+    def test_narrow_counters_update_in_place(self):
+        """
+        Test that narrow counters are updated in place, saturating or widening like int64
+        counters clipped to, or promoted past, the narrow range.
+        """
+        rng = np.random.default_rng(14)
+        items = rng.zipf(1.3, size=300).tolist()
+        counts = rng.integers(1, 30, size=300).tolist()
+        reference = SlidingCountMinSketch(width=7, depth=3, window_size=1000)
+        saturating = SlidingCountMinSketch(width=7, depth=3, window_size=1000, counter_dtype=np.uint8,
+                                           overflow="saturate")
+        widening = SlidingCountMinSketch(width=7, depth=3, window_size=1000, counter_dtype=np.uint8)
+        counters = saturating.counters
+        for sketch in (reference, saturating, widening):
+            for item, count in zip(items[:100], counts[:100]):
+                sketch.add(item, count)
+            sketch.add_many(items[100:], counts[100:])
+        self.assertIs(saturating.counters, counters)
+        self.assertEqual(saturating.counters.dtype, np.uint8)
+        np.testing.assert_array_equal(saturating.counters, np.minimum(reference.counters, 255))
+        np.testing.assert_array_equal(saturating._row_nonzero, reference._row_nonzero)
+        self.assertEqual(widening.counters.dtype, np.uint16)
+        np.testing.assert_array_equal(widening.counters, reference.counters)
+
+    def test_window_is_independent_of_size(self):
+        sketch = SlidingCountMinSketch(width=10, depth=2, window_size=1000)
+        self.assertEqual(sketch.scan_rate, 20 / 1000)
+        sketch.add("a", 900)
+        self.assertEqual(sketch.query("a"), 900)
+        sketch.add("b", 3000)
+        self.assertEqual(sketch.query("a"), 0)
+
+
+class TestExpCountMinSketch(unittest.TestCase):
+    def test_histograms_bound_window_estimates(self):
+        """
+        Test that every cell keeps at most two buckets per size and that estimates stay within
+        the exponential histogram bounds of the true window count.
+        """
+        sketch = ExpCountMinSketch(width=1, depth=2, window_size=200, counter_size=32)
+        for t in range(1000):
+            sketch.add("a")
+            for i in range(2):
+                head, length = sketch.head[i, 0], sketch.length[i, 0]
+                exponents = sketch.exponent[i, 0, (head + np.arange(length)) % sketch.slots]
+                self.assertTrue(np.all(np.diff(exponents) >= 0))
+                self.assertLessEqual(np.bincount(exponents).max(), 2)
+            true_count = min(t + 1, 200)
+            self.assertLessEqual(abs(sketch.query("a") - true_count), true_count / 2)
+
+    def test_expired_cells_and_memory(self):
+        sketch = ExpCountMinSketch(width=50, depth=3, window_size=10, counter_size=16)
+        sketch.add("a")
+        for i in range(20):
+            sketch.add(f"item{i}")
+        self.assertEqual(sketch.query("a"), 0)
+        self.assertGreater(sketch.get_load_factor(), 0)
+        self.assertEqual(sketch.get_memory_usage(), sum(a.nbytes for a in sketch._state_arrays().values()))
+        sketch.reset()
+        self.assertEqual(sketch.get_load_factor(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
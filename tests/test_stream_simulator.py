@@ -0,0 +1,163 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from ground_truth.truth import Truth
+from input_stream.dataset_stream_simulator import DatasetStreamSimulator
+from input_stream.random_stream_simulator import RandomStreamSimulator
+from input_stream.rate_limiter import RateMeter, TokenBucket
+from input_stream.stream_simulator_base import StreamSimulator
+from simulation.simulation import buffer_items, ingest_batch, split_at_checkpoints
+from summarization_algorithms.count_min_sketch import CountMinSketch
+from summarization_algorithms.hash_family import get_hash_family
+
+
+class FakeClock:
+    """
+    Clock whose time only moves when something sleeps or the test advances it.
+    """
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_paces_micro_batches(self):
+        clock = FakeClock()
+        bucket = TokenBucket(1000, capacity=100, clock=clock, sleep=clock.sleep)
+        self.assertEqual(bucket.acquire(100), 0.0)
+        for _ in range(10):
+            bucket.acquire(100)
+        self.assertAlmostEqual(clock.now, 1.0)
+        self.assertEqual(len(clock.sleeps), 10)
+
+    def test_burst_is_capped(self):
+        """
+        Test that an idle bucket saves at most `capacity` tokens.
+        """
+        clock = FakeClock()
+        bucket = TokenBucket(1000, capacity=50, clock=clock, sleep=clock.sleep)
+        bucket.acquire(50)
+        clock.now += 10.0
+        self.assertEqual(bucket.acquire(50), 0.0)
+        self.assertAlmostEqual(bucket.acquire(100), 0.1)
+        with self.assertRaises(ValueError):
+            TokenBucket(0)
+
+    def test_meter_reports_rate_and_lag(self):
+        clock = FakeClock()
+        meter = RateMeter(rate=100, clock=clock)
+        meter.record(100)
+        clock.now = 3.0
+        stats = meter.stats()
+        self.assertAlmostEqual(stats["achieved_rate"], 100 / 3)
+        self.assertAlmostEqual(stats["lag"], 2.0)
+        self.assertEqual(RateMeter(clock=clock).lag(), 0.0)
+
+
+class TestStreamPacing(unittest.TestCase):
+    def test_max_throughput_does_not_sleep(self):
+        simulator = RandomStreamSimulator(stream_size=20000, max_throughput=True)
+        with mock.patch("time.sleep", side_effect=AssertionError("slept")):
+            items = list(simulator.simulate_stream())
+        self.assertEqual(len(items), 20000)
+        stats = simulator.stream_stats()
+        self.assertEqual(stats["items"], 20000)
+        self.assertIsNone(stats["target_rate"])
+        self.assertEqual(stats["lag"], 0.0)
+        self.assertTrue(RandomStreamSimulator(sleep_time=0).max_throughput)
+
+    def test_rate_limited_stream(self):
+        """
+        Test that a rate-limited stream releases items in micro-batches close to the target rate.
+        """
+        simulator = RandomStreamSimulator(stream_size=3000, rate=20000, micro_batch_size=100, burst=100)
+        self.assertEqual(len(list(simulator.simulate_stream())), 3000)
+        stats = simulator.stream_stats()
+        self.assertGreater(stats["elapsed"], 0.14)
+        self.assertLess(stats["achieved_rate"], 22000)
+        self.assertGreater(stats["sleep_time"], 0.0)
+
+    def test_rate_from_sleep_time(self):
+        simulator = RandomStreamSimulator(sleep_time=0.0001)
+        self.assertAlmostEqual(simulator.rate, 10000)
+        self.assertEqual(simulator.micro_batch_size, 10)
+        with self.assertRaises(ValueError):
+            RandomStreamSimulator(rate=-1)
+
+    def test_dataset_stream(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tokens.txt")
+            with open(path, "w") as f:
+                f.write("1 2 3\n4 5\n\n6\n")
+            simulator = DatasetStreamSimulator(path, None, max_throughput=True, micro_batch_size=4)
+            self.assertEqual(list(simulator.simulate_stream()), [b"1", b"2", b"3", b"4", b"5", b"6"])
+            self.assertEqual(simulator.stream_stats()["items"], 6)
+
+
+class ListStreamSimulator(StreamSimulator):
+    def __init__(self, items, **kwargs):
+        super().__init__(**kwargs)
+        self.items = items
+
+    def simulate_stream(self):
+        return self._pace(self.items)
+
+
+class TestSimulateBatches(unittest.TestCase):
+    def test_random_batches_are_integer_arrays(self):
+        np.random.seed(22)
+        simulator = RandomStreamSimulator(stream_size=10000, max_throughput=True)
+        batches = list(simulator.simulate_batches(3000))
+        self.assertEqual([len(batch) for batch in batches], [3000, 3000, 3000, 1000])
+        self.assertTrue(all(batch.dtype.kind == "i" for batch in batches))
+        self.assertEqual(simulator.stream_stats()["items"], 10000)
+        np.random.seed(22)
+        np.testing.assert_array_equal(np.concatenate(batches), list(simulator.simulate_stream()))
+
+    def test_dataset_batches_match_stream(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tweets.csv")
+            with open(path, "w") as f:
+                f.write("id,Tweet\n1,a b c\n2,\n3,b d e f\n")
+            simulator = DatasetStreamSimulator(path, "Tweet", max_throughput=True)
+            batches = list(simulator.simulate_batches(4))
+            self.assertEqual([batch.dtype for batch in batches], [object, object])
+            self.assertEqual(np.concatenate(batches).tolist(), list(simulator.simulate_stream()))
+
+    def test_default_batches(self):
+        simulator = ListStreamSimulator([("a", 1), "b", 3], max_throughput=True)
+        batches = list(simulator.simulate_batches(2))
+        self.assertEqual([batch.tolist() for batch in batches], [[("a", 1), "b"], [3]])
+
+    def test_checkpoints_land_on_eval_interval(self):
+        """
+        Test that a batched run checkpoints at the same item counts, with the same sketch and
+        ground truth, as buffering single items up to each checkpoint.
+        """
+        items = np.random.default_rng(23).zipf(1.3, size=10500)
+        family = get_hash_family("multiply_shift")
+        results = []
+        for batches in (buffer_items(items.tolist(), 2000), (items[i:i + 700] for i in range(0, len(items), 700))):
+            sketch, truth, checkpoints = CountMinSketch(128, 3, hash_family=family), Truth(), []
+            for part, at_checkpoint in split_at_checkpoints(batches, 2000):
+                ingest_batch(sketch, truth, part)
+                if at_checkpoint:
+                    checkpoints.append(sketch.totalCount)
+            results.append((sketch.counters, truth.get_all(), checkpoints))
+        self.assertEqual(results[1][2], [2000, 4000, 6000, 8000, 10000])
+        np.testing.assert_array_equal(results[0][0], results[1][0])
+        self.assertEqual(results[0][1], results[1][1])
+        self.assertEqual(results[0][2], results[1][2])
+
+
+if __name__ == '__main__':
+    unittest.main()
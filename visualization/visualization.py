@@ -10,7 +10,7 @@ def load_results(filepath):
 
 def plot_metric(results, metric, ylabel, title, save_path):
     processed_items = [entry["processed_items"] for entry in results]
-    values = [entry[metric] for entry in results]
+    values = [entry.get(metric, 0.0) for entry in results]
 
     plt.figure(figsize=(8, 5))
     plt.plot(processed_items, values, marker="o", linestyle="-", markersize=3, label=metric)
@@ -66,6 +66,8 @@ def visualize(results_file, output_dir):
                 f"{output_dir}/avg_query_time.png")
     plot_metric(results, "memory_usage", "Memory Usage (bytes)", "Memory Usage vs. Processed Items",
                 f"{output_dir}/memory_usage.png")
+    plot_metric(results, "snapshot_time", "Snapshot Time (seconds)", "Snapshot Time vs. Processed Items",
+                f"{output_dir}/snapshot_time.png")
     plot_percentile_category(results, "overestimation", f"{output_dir}/overestimation_percentiles.png")
     plot_percentile_category(results, "underestimation", f"{output_dir}/underestimation_percentiles.png")
     plot_percentile_category(results, "combined", f"{output_dir}/combined_percentiles.png")